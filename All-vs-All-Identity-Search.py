@@ -0,0 +1,392 @@
+# SCRIPT: identity_search.py
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import checkpoint
+import pipeline_telemetry
+
+# --- CONFIGURATION ---
+# The master FASTA file written by convert-to-fasta.py.
+INPUT_FASTA_FILE: str = "all_sequences.fasta"
+# Written in the 12-column BLAST tabular layout read by less-than-25-similarity.py.
+SIMILAR_PAIRS_OUTPUT: str = "similar_pairs.tsv"
+
+# MinHash / LSH candidate search. Two sequences become a candidate pair when all
+# LSH_ROWS_PER_BAND MinHash values of at least one band agree; the k-mer set
+# Jaccard similarity at which that happens with probability 1/2 is roughly
+# (1 / LSH_BANDS) ** (1 / LSH_ROWS_PER_BAND), here ~0.14. Residue 5-mers keep
+# unrelated sequences far below that (Jaccard below 0.001 at 1200 aa): about 0.002%
+# of random 1200 aa pairs become candidates, against 37% with 3-mers, while
+# pairs at 90% identity almost always do.
+MINHASH_KMER_SIZE: int = 5
+LSH_BANDS: int = 48
+LSH_ROWS_PER_BAND: int = 2
+# Buckets larger than this (low-complexity k-mers shared by many sequences) are ignored.
+LSH_MAX_BUCKET_SIZE: int = 200
+MINHASH_SEED: int = 42
+
+# Banded Smith-Waterman with BLOSUM62 and BLAST's default gap costs (a gap of
+# length L costs GAP_OPEN + GAP_EXTEND * L).
+GAP_OPEN: int = 11
+GAP_EXTEND: int = 1
+ALIGNMENT_BAND_WIDTH: int = 32
+ALIGNMENT_BATCH_SIZE: int = 64
+ALIGNMENT_WORKERS: int = os.cpu_count() or 1
+PAIRS_PER_TASK: int = 2048
+# Karlin-Altschul parameters of BLOSUM62 with 11/1 gap costs, and the reporting cutoff.
+KARLIN_LAMBDA: float = 0.267
+KARLIN_K: float = 0.041
+EVALUE_THRESHOLD: float = 10.0
+# -------------------------------------------------------------------
+
+ALPHABET: str = "ARNDCQEGHILKMFPSTWYVBZX*"
+BLOSUM62 = np.array([
+    [ 4, -1, -2, -2,  0, -1, -1,  0, -2, -1, -1, -1, -1, -2, -1,  1,  0, -3, -2,  0, -2, -1,  0, -4],
+    [-1,  5,  0, -2, -3,  1,  0, -2,  0, -3, -2,  2, -1, -3, -2, -1, -1, -3, -2, -3, -1,  0, -1, -4],
+    [-2,  0,  6,  1, -3,  0,  0,  0,  1, -3, -3,  0, -2, -3, -2,  1,  0, -4, -2, -3,  3,  0, -1, -4],
+    [-2, -2,  1,  6, -3,  0,  2, -1, -1, -3, -4, -1, -3, -3, -1,  0, -1, -4, -3, -3,  4,  1, -1, -4],
+    [ 0, -3, -3, -3,  9, -3, -4, -3, -3, -1, -1, -3, -1, -2, -3, -1, -1, -2, -2, -1, -3, -3, -2, -4],
+    [-1,  1,  0,  0, -3,  5,  2, -2,  0, -3, -2,  1,  0, -3, -1,  0, -1, -2, -1, -2,  0,  3, -1, -4],
+    [-1,  0,  0,  2, -4,  2,  5, -2,  0, -3, -3,  1, -2, -3, -1,  0, -1, -3, -2, -2,  1,  4, -1, -4],
+    [ 0, -2,  0, -1, -3, -2, -2,  6, -2, -4, -4, -2, -3, -3, -2,  0, -2, -2, -3, -3, -1, -2, -1, -4],
+    [-2,  0,  1, -1, -3,  0,  0, -2,  8, -3, -3, -1, -2, -1, -2, -1, -2, -2,  2, -3,  0,  0, -1, -4],
+    [-1, -3, -3, -3, -1, -3, -3, -4, -3,  4,  2, -3,  1,  0, -3, -2, -1, -3, -1,  3, -3, -3, -1, -4],
+    [-1, -2, -3, -4, -1, -2, -3, -4, -3,  2,  4, -2,  2,  0, -3, -2, -1, -2, -1,  1, -4, -3, -1, -4],
+    [-1,  2,  0, -1, -3,  1,  1, -2, -1, -3, -2,  5, -1, -3, -1,  0, -1, -3, -2, -2,  0,  1, -1, -4],
+    [-1, -1, -2, -3, -1,  0, -2, -3, -2,  1,  2, -1,  5,  0, -2, -1, -1, -1, -1,  1, -3, -1, -1, -4],
+    [-2, -3, -3, -3, -2, -3, -3, -3, -1,  0,  0, -3,  0,  6, -4, -2, -2,  1,  3, -1, -3, -3, -1, -4],
+    [-1, -2, -2, -1, -3, -1, -1, -2, -2, -3, -3, -1, -2, -4,  7, -1, -1, -4, -3, -2, -2, -1, -2, -4],
+    [ 1, -1,  1,  0, -1,  0,  0,  0, -1, -2, -2,  0, -1, -2, -1,  4,  1, -3, -2, -2,  0,  0,  0, -4],
+    [ 0, -1,  0, -1, -1, -1, -1, -2, -2, -1, -1, -1, -1, -2, -1,  1,  5, -2, -2,  0, -1, -1,  0, -4],
+    [-3, -3, -4, -4, -2, -2, -3, -2, -2, -3, -2, -3, -1,  1, -4, -3, -2, 11,  2, -3, -4, -3, -2, -4],
+    [-2, -2, -2, -3, -2, -1, -2, -3,  2, -1, -1, -2, -1,  3, -3, -2, -2,  2,  7, -1, -3, -2, -1, -4],
+    [ 0, -3, -3, -3, -1, -2, -2, -3, -3,  3,  1, -2,  1, -1, -2, -2,  0, -3, -1,  4, -3, -2, -1, -4],
+    [-2, -1,  3,  4, -3,  0,  1, -1,  0, -3, -4,  0, -3, -3, -2,  0, -1, -4, -3, -3,  4,  1, -1, -4],
+    [-1,  0,  0,  1, -3,  3,  4, -2,  0, -3, -3,  1, -1, -3, -1,  0, -1, -3, -2, -2,  1,  4, -1, -4],
+    [ 0, -1, -1, -1, -2, -1, -1, -1, -1, -1, -1, -1, -1, -1, -2,  0,  0, -2, -1, -1, -1, -1, -1, -4],
+    [-4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4, -4,  1]
+], dtype=np.int32)
+UNKNOWN_RESIDUE_INDEX: int = ALPHABET.index("X")
+# Out-of-band / out-of-matrix cells; far below any score, but safe from int32 overflow.
+NEG_SCORE: int = -(1 << 28)
+
+# H pointer codes (bits 0-1) and the gap-opening flags of E (bit 2) and F (bit 3).
+PTR_DIAG_START, PTR_DIAG, PTR_F, PTR_E = 0, 1, 2, 3
+E_OPEN_BIT, F_OPEN_BIT = 4, 8
+
+def read_fasta(filepath: str) -> tuple:
+    ids = []
+    sequences = []
+    chunks = []
+    with open(filepath, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                if ids:
+                    sequences.append("".join(chunks))
+                ids.append(line[1:].split()[0])
+                chunks = []
+            elif line:
+                chunks.append(line)
+    if ids:
+        sequences.append("".join(chunks))
+    return ids, sequences
+
+def encode_sequence(sequence: str) -> np.ndarray:
+    lookup = np.full(256, UNKNOWN_RESIDUE_INDEX, dtype=np.int8)
+    for i, residue in enumerate(ALPHABET):
+        lookup[ord(residue)] = i
+    return lookup[np.frombuffer(sequence.upper().encode("ascii", errors="replace"), dtype=np.uint8)]
+
+def kmer_codes(encoded: np.ndarray, k: int) -> np.ndarray:
+    """Integer code of every overlapping k-mer, in sequence order."""
+    if len(encoded) < k:
+        return np.empty(0, dtype=np.uint64)
+    codes = np.zeros(len(encoded) - k + 1, dtype=np.uint64)
+    for offset in range(k):
+        codes = codes * np.uint64(len(ALPHABET)) + encoded[offset : len(encoded) - k + 1 + offset].astype(np.uint64)
+    return codes
+
+def minhash_signatures(encoded_sequences: list, k: int, num_hashes: int, seed: int) -> np.ndarray:
+    """
+    One row of `num_hashes` MinHash values per sequence, using multiply-shift
+    hashes of the distinct k-mer codes. Sequences shorter than k get an all-max row.
+    """
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2**63, size=num_hashes, dtype=np.uint64) | np.uint64(1)
+    increments = rng.integers(0, 2**63, size=num_hashes, dtype=np.uint64)
+    signatures = np.full((len(encoded_sequences), num_hashes), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for row, encoded in enumerate(encoded_sequences):
+        codes = np.unique(kmer_codes(encoded, k))
+        if len(codes) == 0:
+            continue
+        hashed = (multipliers[:, None] * codes[None, :] + increments[:, None]) >> np.uint64(32)
+        signatures[row] = hashed.min(axis=1)
+    return signatures
+
+def lsh_candidate_pairs(signatures: np.ndarray, bands: int, rows_per_band: int, max_bucket_size: int) -> np.ndarray:
+    """Pairs (i < j) that share all MinHash values of at least one band, as an (n, 2) array."""
+    valid = (signatures != np.iinfo(np.uint32).max).any(axis=1)
+    sequence_index = np.flatnonzero(valid)
+    found = []
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[sequence_index, band * rows_per_band:(band + 1) * rows_per_band])
+        _, bucket, bucket_sizes = np.unique(keys.view(np.dtype((np.void, keys.dtype.itemsize * rows_per_band))).ravel(),
+                                            return_inverse=True, return_counts=True)
+        order = np.argsort(bucket, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(bucket_sizes)))
+        for b in np.flatnonzero((bucket_sizes > 1) & (bucket_sizes <= max_bucket_size)):
+            members = sequence_index[order[starts[b]:starts[b + 1]]]
+            first, second = np.triu_indices(len(members), k=1)
+            found.append(np.stack((members[first], members[second]), axis=1))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(found), axis=1).astype(np.int64)
+    return np.unique(pairs, axis=0)
+
+def best_diagonal(codes_a: np.ndarray, codes_b: np.ndarray) -> int:
+    """The offset j - i shared by the most identical k-mers (0 if none are shared)."""
+    if len(codes_a) == 0 or len(codes_b) == 0:
+        return 0
+    order_b = np.argsort(codes_b, kind="stable")
+    sorted_b = codes_b[order_b]
+    lo = np.searchsorted(sorted_b, codes_a, side="left")
+    counts = np.searchsorted(sorted_b, codes_a, side="right") - lo
+    total = int(counts.sum())
+    if total == 0:
+        return 0
+    a_positions = np.repeat(np.arange(len(codes_a)), counts)
+    within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    b_positions = order_b[np.repeat(lo, counts) + within]
+    diagonals = b_positions - a_positions + len(codes_a)
+    return int(np.bincount(diagonals).argmax()) - len(codes_a)
+
+def shift_right(values: np.ndarray) -> np.ndarray:
+    shifted = np.empty_like(values)
+    shifted[:, 0] = NEG_SCORE
+    shifted[:, 1:] = values[:, :-1]
+    return shifted
+
+def shift_left(values: np.ndarray) -> np.ndarray:
+    shifted = np.empty_like(values)
+    shifted[:, -1] = NEG_SCORE
+    shifted[:, :-1] = values[:, 1:]
+    return shifted
+
+def banded_local_alignment_batch(queries: list, subjects: list, diagonals: list, band_width: int) -> list:
+    """
+    Affine-gap Smith-Waterman restricted to |(j - i) - diagonal| <= band_width,
+    computed row by row for a whole batch of pairs at once. Each row is stored in
+    band coordinates t = j - i - diagonal + band_width. The horizontal gap state
+    of a row is a running maximum (np.maximum.accumulate) instead of a loop over
+    columns. Returns one (score, end_i, end_t, pointers) tuple per pair.
+    """
+    batch = len(queries)
+    width = 2 * band_width + 1
+    query_lengths = np.array([len(q) for q in queries])
+    subject_lengths = np.array([len(s) for s in subjects])
+    diagonals = np.asarray(diagonals)
+    max_rows = int(query_lengths.max())
+
+    query_matrix = np.full((batch, max_rows), UNKNOWN_RESIDUE_INDEX, dtype=np.int64)
+    subject_matrix = np.full((batch, int(subject_lengths.max()) + 2), UNKNOWN_RESIDUE_INDEX, dtype=np.int64)
+    for p in range(batch):
+        query_matrix[p, :len(queries[p])] = queries[p]
+        subject_matrix[p, 1:len(subjects[p]) + 1] = subjects[p]
+
+    t_index = np.arange(width)
+    gap_steps = GAP_EXTEND * t_index
+    pair_index = np.arange(batch)[:, None]
+    pointers = np.zeros((batch, max_rows + 1, width), dtype=np.uint8)
+    previous_h = np.full((batch, width), NEG_SCORE, dtype=np.int32)
+    previous_f = np.full((batch, width), NEG_SCORE, dtype=np.int32)
+    best_score = np.zeros(batch, dtype=np.int32)
+    best_row = np.zeros(batch, dtype=np.int64)
+    best_t = np.zeros(batch, dtype=np.int64)
+
+    for i in range(1, max_rows + 1):
+        columns = i + diagonals[:, None] + t_index[None, :] - band_width
+        valid = (columns >= 1) & (columns <= subject_lengths[:, None]) & (i <= query_lengths[:, None])
+        scores = BLOSUM62[query_matrix[:, i - 1][:, None], subject_matrix[pair_index, np.clip(columns, 0, subject_matrix.shape[1] - 1)]]
+
+        up_h = shift_left(previous_h)
+        up_f = shift_left(previous_f)
+        f_open_score = up_h - GAP_OPEN - GAP_EXTEND
+        f_extend_score = up_f - GAP_EXTEND
+        f = np.where(valid, np.maximum(f_open_score, f_extend_score), NEG_SCORE)
+        diag = np.maximum(previous_h, 0) + scores
+        t_best = np.where(valid, np.maximum(np.maximum(diag, f), 0), NEG_SCORE)
+        e = shift_right(np.maximum.accumulate(t_best + gap_steps, axis=1)) - gap_steps - GAP_OPEN
+        e = np.where(valid, e, NEG_SCORE)
+        h = np.where(valid, np.maximum(t_best, e), NEG_SCORE).astype(np.int32)
+
+        h_code = np.where(h == diag, np.where(previous_h > 0, PTR_DIAG, PTR_DIAG_START), np.where(h == f, PTR_F, PTR_E))
+        e_open = (shift_right(h) - GAP_OPEN - GAP_EXTEND) >= (shift_right(e) - GAP_EXTEND)
+        pointers[:, i] = h_code + E_OPEN_BIT * e_open + F_OPEN_BIT * (f_open_score >= f_extend_score)
+
+        row_best_t = h.argmax(axis=1)
+        row_best = h[np.arange(batch), row_best_t]
+        improved = row_best > best_score
+        best_score = np.where(improved, row_best, best_score)
+        best_row = np.where(improved, i, best_row)
+        best_t = np.where(improved, row_best_t, best_t)
+
+        previous_h = h
+        previous_f = f.astype(np.int32)
+
+    return [(int(best_score[p]), int(best_row[p]), int(best_t[p]), pointers[p]) for p in range(batch)]
+
+def trace_alignment(query: np.ndarray, subject: np.ndarray, diagonal: int, band_width: int,
+                    end_i: int, end_t: int, pointers: np.ndarray) -> dict:
+    """Walks the pointers back from the best cell and counts the alignment columns (1-based coordinates)."""
+    i, t = end_i, end_t
+    state = PTR_DIAG
+    length = identities = gap_columns = gap_opens = 0
+    previous_state = None
+    while True:
+        code = pointers[i, t]
+        if state == PTR_DIAG:
+            h_code = code & 3
+            if h_code == PTR_F or h_code == PTR_E:
+                state = h_code
+                continue
+            j = i + diagonal + t - band_width
+            length += 1
+            identities += int(query[i - 1] == subject[j - 1])
+            previous_state = PTR_DIAG
+            if h_code == PTR_DIAG_START:
+                break
+            i -= 1
+            continue
+
+        length += 1
+        gap_columns += 1
+        if previous_state != state:
+            gap_opens += 1
+        previous_state = state
+        if state == PTR_F:
+            if code & F_OPEN_BIT:
+                state = PTR_DIAG
+            i -= 1
+            t += 1
+        else:
+            if code & E_OPEN_BIT:
+                state = PTR_DIAG
+            t -= 1
+    return {
+        "length": length,
+        "identities": identities,
+        "mismatches": length - identities - gap_columns,
+        "gap_opens": gap_opens,
+        "query_start": i,
+        "query_end": end_i,
+        "subject_start": i + diagonal + t - band_width,
+        "subject_end": end_i + diagonal + end_t - band_width
+    }
+
+_worker_sequences = None
+_worker_kmer_codes = None
+_worker_database_residues = 0
+
+def init_worker(encoded_sequences: list, database_residues: int):
+    global _worker_sequences, _worker_kmer_codes, _worker_database_residues
+    _worker_sequences = encoded_sequences
+    _worker_kmer_codes = [kmer_codes(s, MINHASH_KMER_SIZE) for s in encoded_sequences]
+    _worker_database_residues = database_residues
+
+def align_candidate_pairs(pairs: np.ndarray) -> list:
+    """
+    Aligns a chunk of candidate pairs and returns ((query, subject), fields) for
+    every alignment with E-value <= EVALUE_THRESHOLD, in input order. `fields` are
+    columns 3-12 of the BLAST tabular layout. The shorter sequence of each pair is
+    put on the rows, which are the loop dimension; batches hold pairs of similar length.
+    """
+    jobs = []
+    for query_index, subject_index in pairs.tolist():
+        rows, columns = (query_index, subject_index)
+        if len(_worker_sequences[rows]) > len(_worker_sequences[columns]):
+            rows, columns = columns, rows
+        diagonal = best_diagonal(_worker_kmer_codes[rows], _worker_kmer_codes[columns])
+        jobs.append((query_index, subject_index, rows, columns, diagonal))
+    jobs.sort(key=lambda job: len(_worker_sequences[job[2]]))
+
+    hits = {}
+    for start in range(0, len(jobs), ALIGNMENT_BATCH_SIZE):
+        batch = jobs[start:start + ALIGNMENT_BATCH_SIZE]
+        results = banded_local_alignment_batch([_worker_sequences[job[2]] for job in batch],
+                                               [_worker_sequences[job[3]] for job in batch],
+                                               [job[4] for job in batch], ALIGNMENT_BAND_WIDTH)
+        for (query_index, subject_index, rows, columns, diagonal), (score, end_i, end_t, pointers) in zip(batch, results):
+            if score <= 0:
+                continue
+            bitscore = (KARLIN_LAMBDA * score - math.log(KARLIN_K)) / math.log(2)
+            evalue = len(_worker_sequences[query_index]) * _worker_database_residues * 2.0 ** -bitscore
+            if evalue > EVALUE_THRESHOLD:
+                continue
+            aligned = trace_alignment(_worker_sequences[rows], _worker_sequences[columns], diagonal,
+                                      ALIGNMENT_BAND_WIDTH, end_i, end_t, pointers)
+            row_span = (aligned["query_start"], aligned["query_end"])
+            column_span = (aligned["subject_start"], aligned["subject_end"])
+            query_span, subject_span = (row_span, column_span) if rows == query_index else (column_span, row_span)
+            hits[(query_index, subject_index)] = [
+                f"{100.0 * aligned['identities'] / aligned['length']:.3f}", aligned["length"], aligned["mismatches"],
+                aligned["gap_opens"], *query_span, *subject_span, f"{evalue:.2e}", f"{bitscore:.1f}"
+            ]
+    return [(pair, hits[pair]) for pair in map(tuple, pairs.tolist()) if pair in hits]
+
+if __name__ == "__main__":
+    pipeline_telemetry.configure("identity_search")
+
+    if not os.path.exists(INPUT_FASTA_FILE):
+        print(f"!!! ERROR: FASTA file '{INPUT_FASTA_FILE}' not found.")
+        print("    Please run convert-to-fasta.py first.")
+        pipeline_telemetry.finish()
+        exit()
+
+    with pipeline_telemetry.stage("read_fasta"), pipeline_telemetry.track_file(INPUT_FASTA_FILE):
+        ids, sequences = read_fasta(INPUT_FASTA_FILE)
+        encoded_sequences = [encode_sequence(sequence) for sequence in sequences]
+        database_residues = sum(len(sequence) for sequence in sequences)
+        pipeline_telemetry.add("factors", len(sequences))
+        pipeline_telemetry.add("residues", database_residues)
+    print(f"Read {len(sequences)} sequences ({database_residues} residues) from '{INPUT_FASTA_FILE}'.")
+
+    with pipeline_telemetry.stage("minhash"):
+        signatures = minhash_signatures(encoded_sequences, MINHASH_KMER_SIZE, LSH_BANDS * LSH_ROWS_PER_BAND, MINHASH_SEED)
+
+    with pipeline_telemetry.stage("lsh"):
+        candidates = lsh_candidate_pairs(signatures, LSH_BANDS, LSH_ROWS_PER_BAND, LSH_MAX_BUCKET_SIZE)
+    all_pairs = len(sequences) * (len(sequences) - 1) // 2
+    print(f"LSH ({LSH_BANDS} bands x {LSH_ROWS_PER_BAND} rows, Jaccard threshold ~{(1 / LSH_BANDS) ** (1 / LSH_ROWS_PER_BAND):.2f}) "
+          f"selected {len(candidates)} of {all_pairs} pairs for alignment.")
+
+    hits_written = 0
+    with pipeline_telemetry.stage("align"):
+        chunks = [candidates[start:start + PAIRS_PER_TASK] for start in range(0, len(candidates), PAIRS_PER_TASK)]
+        with checkpoint.atomic_write(SIMILAR_PAIRS_OUTPUT) as out_file:
+            if ALIGNMENT_WORKERS > 1 and len(chunks) > 1:
+                executor = ProcessPoolExecutor(max_workers=ALIGNMENT_WORKERS, initializer=init_worker,
+                                               initargs=(encoded_sequences, database_residues))
+                results = executor.map(align_candidate_pairs, chunks)
+            else:
+                executor = None
+                init_worker(encoded_sequences, database_residues)
+                results = map(align_candidate_pairs, chunks)
+            try:
+                for chunk_hits in results:
+                    for (query_index, subject_index), fields in chunk_hits:
+                        out_file.write("\t".join([ids[query_index], ids[subject_index]] + [str(field) for field in fields]) + "\n")
+                        hits_written += 1
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+        pipeline_telemetry.record_written(SIMILAR_PAIRS_OUTPUT)
+
+    print(f"Wrote {hits_written} alignments with E-value <= {EVALUE_THRESHOLD} to '{SIMILAR_PAIRS_OUTPUT}'.")
+    print("\n" + "*" * 50)
+    print("All-vs-all identity search is complete.")
+    print("*" * 50)
+    pipeline_telemetry.finish()
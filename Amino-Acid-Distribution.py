@@ -3,6 +3,8 @@ import collections
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+import pipeline_telemetry
+
 ANALYSIS_BASE_DIR: str = "output"
 TARGET_WINDOW_SIZE: int = 3
 MINIMUM_OCCURRENCE_COUNT: int = 3
@@ -59,10 +61,12 @@ def analyze_file_for_frequent_triplets(filepath: str, output_dir: str):
     
     except Exception as e:
         print(f"!!! Could not read or process file {filepath}: {e}")
+        pipeline_telemetry.record_error(filepath, e)
         return
 
     if not pattern_counts:
         print(f"--- No valid data found in {os.path.basename(filepath)}. Skipping.")
+        pipeline_telemetry.record_skipped(filepath, "no pattern counts")
         return
 
     aa_distribution = collections.Counter()
@@ -76,17 +80,21 @@ def analyze_file_for_frequent_triplets(filepath: str, output_dir: str):
 
     if not frequent_patterns_found:
         print(f"--- No patterns with count >= {MINIMUM_OCCURRENCE_COUNT} found in {os.path.basename(filepath)}. Skipping.")
+        pipeline_telemetry.record_skipped(filepath, "no frequent patterns")
         return
 
     base_name, _ = os.path.splitext(os.path.basename(filepath))
     histogram_filename = f"{base_name}_histogram.png"
     full_output_path = os.path.join(output_dir, histogram_filename)
     
-    create_amino_acid_histogram(aa_distribution, os.path.basename(filepath), full_output_path)
+    with pipeline_telemetry.stage("plot"):
+        create_amino_acid_histogram(aa_distribution, os.path.basename(filepath), full_output_path)
+    pipeline_telemetry.record_written(full_output_path)
     print(f"--- Generated histogram for {os.path.basename(filepath)}")
 
 if __name__ == "__main__":
-    
+    pipeline_telemetry.configure("amino_acid_histograms")
+
     target_dir = os.path.join(ANALYSIS_BASE_DIR, str(TARGET_WINDOW_SIZE))
     
     if not os.path.isdir(target_dir):
@@ -97,12 +105,15 @@ if __name__ == "__main__":
     os.makedirs(HISTOGRAM_OUTPUT_DIR, exist_ok=True)
     print(f"Histograms will be saved in the '{HISTOGRAM_OUTPUT_DIR}' directory.\n")
 
-    for dirpath, _, filenames in os.walk(target_dir):
-        for filename in filenames:
-            if filename.endswith(".txt"):
-                full_filepath = os.path.join(dirpath, filename)
-                analyze_file_for_frequent_triplets(full_filepath, HISTOGRAM_OUTPUT_DIR)
+    with pipeline_telemetry.stage("histograms"):
+        for dirpath, _, filenames in os.walk(target_dir):
+            for filename in filenames:
+                if filename.endswith(".txt"):
+                    full_filepath = os.path.join(dirpath, filename)
+                    with pipeline_telemetry.track_file(full_filepath):
+                        analyze_file_for_frequent_triplets(full_filepath, HISTOGRAM_OUTPUT_DIR)
 
     print("\n\n" + "*" * 50)
     print("Histogram generation is complete.")
-    print("*" * 50)
\ No newline at end of file
+    print("*" * 50)
+    pipeline_telemetry.finish()
\ No newline at end of file
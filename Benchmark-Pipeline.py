@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import runpy
+import shutil
+import argparse
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+
+import pipeline_scripts
+import synthetic_dataset
+import pipeline_telemetry
+
+BENCHMARK_RESULTS_FILE: str = "benchmark_results.json"
+# Relative slowdown (throughput) or growth (peak RSS) against the baseline that fails the run.
+REGRESSION_TOLERANCE: float = 0.25
+
+BENCHMARK_SCALES = {
+    "small": {
+        "dataset": {"superclasses": 2, "classes_per_superclass": 1, "families_per_class": 2,
+                    "subfamilies_per_family": 2, "factors_per_file": 2},
+        "blast_sequences": 50
+    },
+    "medium": {
+        "dataset": {"superclasses": 4, "classes_per_superclass": 2, "families_per_class": 2,
+                    "subfamilies_per_family": 2, "factors_per_file": 3, "gaps_per_factor": 2},
+        "blast_sequences": 200
+    },
+    "large": {
+        "dataset": {"superclasses": 8, "classes_per_superclass": 3, "families_per_class": 3,
+                    "subfamilies_per_family": 3, "factors_per_file": 4, "gaps_per_factor": 2},
+        "blast_sequences": 1000
+    }
+}
+
+REGION_JOBS = [
+    {"input_dir": "DBD-Region", "output_dir": "DBD-region-Window-Output",
+     "output_subdir": "DBD_normalized_scores", "region_name": "DBDs"},
+    {"input_dir": "Non-DBD-Region", "output_dir": "Non-DBD-Window-Output",
+     "output_subdir": "nonDBD_normalized_scores", "region_name": "non-DBDs"}
+]
+
+# --- Stages: each runs inside the benchmark work directory and returns the
+# number of units (residues, or table rows for the BLAST filter) it processed.
+
+def stage_split(context: dict) -> int:
+    split = pipeline_scripts.load_script("DBD-Non-DBD-Split.py", BASE_FOLDER=context["raw_dir"])
+    os.makedirs(split.DBD_OUTPUT_DIR, exist_ok=True)
+    os.makedirs(split.NON_DBD_OUTPUT_DIR, exist_ok=True)
+    for dirpath, _, filenames in os.walk(context["raw_dir"]):
+        for filename in sorted(filenames):
+            if filename.endswith(".txt"):
+                split.process_file_for_splitting(os.path.join(dirpath, filename))
+    return context["residues"]
+
+def stage_disorder(context: dict) -> int:
+    disorder = pipeline_scripts.load_script("DBD-Disorder-Code.py")
+    for filename in os.listdir(disorder.BASE_FOLDER):
+        disorder.calculate_disorder_ratio(os.path.join(disorder.BASE_FOLDER, filename))
+    return context["dbd_residues"]
+
+def stage_window(context: dict) -> int:
+    window = pipeline_scripts.load_script("DBD-Non-DBD-Window-Code.py", WINDOW_SIZES=range(3, 12))
+    for job in window.JOBS:
+        window.perform_window_analysis_on_directory(job["input_dir"], job["output_dir"])
+    return context["residues"]
+
+def stage_occurrence(context: dict) -> int:
+    occurrence = pipeline_scripts.load_script("Occurence-CSV-generator.py")
+    for job in occurrence.JOBS:
+        occurrence.create_summary_csv(job)
+    return context["residues"]
+
+def stage_normalized(context: dict) -> int:
+    os.environ["MPLBACKEND"] = "Agg"
+    normalized = pipeline_scripts.load_script("Disorder-by-Order-Normalized.py")
+    for job in normalized.JOBS:
+        job_output_dir = os.path.join(normalized.OUTPUT_BASE_DIR, job["output_subdir"])
+        os.makedirs(job_output_dir, exist_ok=True)
+        for superclass in normalized.SUPERCLASSES:
+            normalized.analyze_superclass_normalized_disorder(superclass, job["input_dir"], job_output_dir, job["region_name"])
+    return context["residues"]
+
+def stage_blast_filter(context: dict) -> int:
+    runpy.run_path(os.path.join(pipeline_scripts.SCRIPT_DIR, "less-than-25-similarity.py"), run_name="__main__")
+    return context["blast_rows"]
+
+STAGES = {
+    "split": stage_split,
+    "disorder": stage_disorder,
+    "window": stage_window,
+    "occurrence_csv": stage_occurrence,
+    "normalized_scores": stage_normalized,
+    "blast_filter": stage_blast_filter
+}
+STAGE_UNITS = {"blast_filter": "rows/s"}
+
+def directory_usage(root: str, exclude_dirs=()) -> tuple:
+    file_count = 0
+    byte_count = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) not in exclude_dirs]
+        for filename in filenames:
+            file_count += 1
+            byte_count += os.path.getsize(os.path.join(dirpath, filename))
+    return file_count, byte_count
+
+def run_stage_in_child(stage_name: str, context: dict, connection):
+    """Child process body: a fresh process per stage keeps peak RSS per stage."""
+    try:
+        os.chdir(context["work_dir"])
+        # Telemetry exported by a stage script is not one of the stage's outputs.
+        exclude_dirs = {os.path.join(context["work_dir"], pipeline_telemetry.METRICS_DIR)}
+        files_before, bytes_before = directory_usage(context["work_dir"], exclude_dirs)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            units = STAGES[stage_name](context)
+            elapsed = time.perf_counter() - start
+        files_after, bytes_after = directory_usage(context["work_dir"], exclude_dirs)
+        connection.send({
+            "seconds": elapsed,
+            "units": units,
+            "throughput": units / elapsed if elapsed > 0 else 0.0,
+            "throughput_unit": STAGE_UNITS.get(stage_name, "residues/s"),
+            "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            "files_written": files_after - files_before,
+            "bytes_written": bytes_after - bytes_before
+        })
+    except BaseException as e:
+        connection.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+def run_stage(stage_name: str, context: dict) -> dict:
+    mp_context = multiprocessing.get_context("spawn")
+    parent_end, child_end = mp_context.Pipe(duplex=False)
+    process = mp_context.Process(target=run_stage_in_child, args=(stage_name, context, child_end))
+    process.start()
+    child_end.close()
+    try:
+        result = parent_end.recv()
+    except EOFError:
+        result = {"error": "stage process exited without reporting"}
+    process.join()
+    return result
+
+def run_scale(scale_name: str, stages: list, keep_work_dir: bool) -> dict:
+    scale = BENCHMARK_SCALES[scale_name]
+    work_dir = tempfile.mkdtemp(prefix=f"tfbd_benchmark_{scale_name}_")
+    raw_dir = os.path.join(work_dir, "NR_HI_IU")
+    print(f"\n--- Scale '{scale_name}': generating synthetic data in '{work_dir}' ---")
+
+    try:
+        totals = synthetic_dataset.generate_dataset(raw_dir, **scale["dataset"])
+        blast_rows = synthetic_dataset.generate_blast_table(os.path.join(work_dir, "similar_pairs.tsv"), scale["blast_sequences"])
+        context = {
+            "work_dir": work_dir,
+            "raw_dir": raw_dir,
+            "residues": totals["residues"],
+            "dbd_residues": totals["dbd_residues"],
+            "blast_rows": blast_rows
+        }
+        print(f"{totals['files']} files, {totals['factors']} factors, {totals['residues']} residues, {blast_rows} BLAST rows")
+
+        results = {"dataset": totals, "stages": {}}
+        for stage_name in stages:
+            result = run_stage(stage_name, context)
+            results["stages"][stage_name] = result
+            if "error" in result:
+                print(f"!!! Stage '{stage_name}' failed: {result['error']}")
+            else:
+                print(f"  {stage_name:<18} {result['seconds']:8.2f} s  {result['throughput']:12.0f} {result['throughput_unit']:<11}"
+                      f"  peak RSS {result['peak_rss_bytes'] / 2**20:7.1f} MiB  {result['files_written']:6d} files")
+        return results
+    finally:
+        if keep_work_dir:
+            print(f"Work directory kept at '{work_dir}'.")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for scale_name, scale_results in results.items():
+        for stage_name, current in scale_results["stages"].items():
+            previous = baseline.get(scale_name, {}).get("stages", {}).get(stage_name)
+            if "error" in current:
+                regressions.append(f"{scale_name}/{stage_name}: failed ({current['error']})")
+                continue
+            if not previous or "error" in previous:
+                continue
+            if current["throughput"] < previous["throughput"] * (1 - tolerance):
+                regressions.append(f"{scale_name}/{stage_name}: throughput {current['throughput']:.0f} vs baseline {previous['throughput']:.0f} {current['throughput_unit']}")
+            if current["peak_rss_bytes"] > previous["peak_rss_bytes"] * (1 + tolerance):
+                regressions.append(f"{scale_name}/{stage_name}: peak RSS {current['peak_rss_bytes'] / 2**20:.1f} vs baseline {previous['peak_rss_bytes'] / 2**20:.1f} MiB")
+    return regressions
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic NR_HI_IU data.")
+    parser.add_argument("--scales", nargs="+", choices=list(BENCHMARK_SCALES), default=["small", "medium"])
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--baseline", help="Results JSON of an earlier run; regressions against it fail the run.")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--output", default=BENCHMARK_RESULTS_FILE)
+    parser.add_argument("--keep-work-dir", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    for scale_name in args.scales:
+        results[scale_name] = run_scale(scale_name, args.stages, args.keep_work_dir)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\nBenchmark results saved to '{args.output}'.")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+    else:
+        regressions = [f"{scale}/{stage}: failed ({r['error']})"
+                       for scale, scale_results in results.items()
+                       for stage, r in scale_results["stages"].items() if "error" in r]
+
+    if regressions:
+        print("\n!!! REGRESSIONS DETECTED:")
+        for regression in regressions:
+            print(f"    {regression}")
+        sys.exit(1)
+
+    print("\n" + "*" * 50)
+    print("Benchmark complete, no regressions.")
+    print("*" * 50)
@@ -0,0 +1,301 @@
+import os
+import csv
+import json
+import time
+import argparse
+
+import numpy as np
+
+import fused_analysis
+import pipeline_telemetry
+
+INDEX_DIR: str = "composition_index"
+# Hashed k-mer profiles appended to the composition features; [] keeps only the
+# 20 amino acid fractions and the disorder fraction.
+FEATURE_KMER_SIZES = [2, 3]
+# Dimensions per hashed k-mer profile (a power of two).
+KMER_HASH_DIMENSIONS: int = 64
+KMER_HASH_MULTIPLIER: int = 0x9E3779B97F4A7C15
+
+# IVF (inverted file) index: k-means lists over the feature vectors. A query
+# scans the IVF_PROBES lists with the closest centroids instead of every factor.
+IVF_MINIMUM_FACTORS: int = 1000
+IVF_ITERATIONS: int = 20
+IVF_PROBES: int = 8
+IVF_SEED: int = 0
+# Rows of the feature matrix per BLAS block of the exact search.
+EXACT_SEARCH_BLOCK_ROWS: int = 65536
+DEFAULT_NEIGHBOURS: int = 10
+
+AMINO_ACID_INDEX = np.full(256, -1, dtype=np.int64)
+for _i, _aa in enumerate(fused_analysis.AMINO_ACID_ORDER_BY_DISORDER):
+    AMINO_ACID_INDEX[ord(_aa)] = _i
+
+def feature_names(kmer_sizes: list = None, hash_dimensions: int = KMER_HASH_DIMENSIONS) -> list:
+    kmer_sizes = FEATURE_KMER_SIZES if kmer_sizes is None else kmer_sizes
+    names = [f"fraction_{aa}" for aa in fused_analysis.AMINO_ACID_ORDER_BY_DISORDER] + ["disorder_fraction"]
+    for k in kmer_sizes:
+        names += [f"k{k}_hash_{h}" for h in range(hash_dimensions)]
+    return names
+
+def factor_features(sequence: str, iu_scores: list, kmer_sizes: list = None,
+                    hash_dimensions: int = KMER_HASH_DIMENSIONS) -> np.ndarray:
+    """
+    Amino acid composition (20 fractions), disorder fraction (IU > cutoff) and,
+    for every k in kmer_sizes, the k-mer profile hashed into hash_dimensions
+    bins and normalized to fractions.
+    """
+    kmer_sizes = FEATURE_KMER_SIZES if kmer_sizes is None else kmer_sizes
+    residues = AMINO_ACID_INDEX[np.frombuffer(sequence.encode("ascii", errors="replace"), dtype=np.uint8)]
+    known = residues[residues >= 0]
+    composition = np.bincount(known, minlength=20).astype(np.float64)
+    if len(known):
+        composition /= len(known)
+    scores = np.asarray(iu_scores, dtype=np.float64)
+    disorder = [float((scores > fused_analysis.DISORDER_CUTOFF).mean())] if len(scores) else [0.0]
+
+    blocks = [composition, disorder]
+    shift = np.uint64(64 - int(hash_dimensions).bit_length() + 1)
+    for k in kmer_sizes:
+        profile = np.zeros(hash_dimensions, dtype=np.float64)
+        if len(residues) >= k:
+            codes = np.zeros(len(residues) - k + 1, dtype=np.uint64)
+            valid = np.ones(len(codes), dtype=bool)
+            for offset in range(k):
+                window = residues[offset : len(residues) - k + 1 + offset]
+                valid &= window >= 0
+                codes = codes * np.uint64(21) + (window + 1).astype(np.uint64)
+            hashed = (codes[valid] * np.uint64(KMER_HASH_MULTIPLIER)) >> shift
+            if len(hashed):
+                profile = np.bincount(hashed.astype(np.int64), minlength=hash_dimensions) / len(hashed)
+        blocks.append(profile)
+    return np.concatenate(blocks).astype(np.float32)
+
+class FeatureVectorAccumulator(fused_analysis.Accumulator):
+    """One fixed-length feature vector per factor, in scan order."""
+
+    name = "feature_vectors"
+
+    def __init__(self, kmer_sizes: list = None, hash_dimensions: int = KMER_HASH_DIMENSIONS):
+        self.kmer_sizes = list(FEATURE_KMER_SIZES if kmer_sizes is None else kmer_sizes)
+        self.hash_dimensions = hash_dimensions
+        self.factors = []
+        self.vectors = []
+
+    def add(self, factor: fused_analysis.RegionFactor):
+        if not factor.sequence:
+            return
+        self.factors.append((factor.region, factor.filename, len(factor.sequence)))
+        self.vectors.append(factor_features(factor.sequence, factor.iu_scores, self.kmer_sizes, self.hash_dimensions))
+
+    def write(self, output_dir: str):
+        features = np.vstack(self.vectors) if self.vectors else np.zeros((0, len(feature_names(self.kmer_sizes, self.hash_dimensions))), dtype=np.float32)
+        save_array(os.path.join(output_dir, "features.npy"), features)
+        save_array(os.path.join(output_dir, "norms.npy"), np.einsum("ij,ij->i", features, features))
+        factors_csv = os.path.join(output_dir, "factors.csv")
+        with open(factors_csv, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['row', 'region', 'filename', 'length'])
+            for row, factor in enumerate(self.factors):
+                writer.writerow([row, *factor])
+        pipeline_telemetry.record_written(factors_csv)
+
+def save_array(path: str, array: np.ndarray):
+    np.save(path, array)
+    pipeline_telemetry.record_written(path)
+
+def squared_distances(features: np.ndarray, norms: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2 for every (query, row) pair, as one matrix product."""
+    query_norms = np.einsum("ij,ij->i", queries, queries)
+    distances = norms[None, :] - 2.0 * (queries @ features.T) + query_norms[:, None]
+    return np.maximum(distances, 0.0)
+
+def merge_top_k(best_rows: np.ndarray, best_distances: np.ndarray, rows: np.ndarray, distances: np.ndarray, k: int) -> tuple:
+    all_rows = np.concatenate((best_rows, rows), axis=1)
+    all_distances = np.concatenate((best_distances, distances), axis=1)
+    keep = np.argpartition(all_distances, min(k, all_distances.shape[1] - 1), axis=1)[:, :k]
+    return np.take_along_axis(all_rows, keep, axis=1), np.take_along_axis(all_distances, keep, axis=1)
+
+def sort_neighbours(rows: np.ndarray, distances: np.ndarray) -> tuple:
+    order = np.argsort(distances, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1), np.sqrt(np.take_along_axis(distances, order, axis=1))
+
+def exact_knn(features: np.ndarray, norms: np.ndarray, queries: np.ndarray, k: int,
+              excluded: np.ndarray = None, block_rows: int = EXACT_SEARCH_BLOCK_ROWS) -> tuple:
+    """
+    Exact k nearest rows (Euclidean) for a batch of queries; the matrix is
+    scanned in blocks of `block_rows` so memory stays bounded. `excluded` is a
+    boolean mask of rows that must not be returned. Returns (rows, distances),
+    nearest first; missing neighbours are row -1 at distance inf.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+    best_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    for start in range(0, len(features), block_rows):
+        block = np.asarray(features[start:start + block_rows])
+        distances = squared_distances(block, np.asarray(norms[start:start + block_rows]), queries)
+        if excluded is not None:
+            distances[:, excluded[start:start + len(block)]] = np.inf
+        rows = np.broadcast_to(np.arange(start, start + len(block)), distances.shape)
+        best_rows, best_distances = merge_top_k(best_rows, best_distances, rows, distances, k)
+    best_rows[np.isinf(best_distances)] = -1
+    return sort_neighbours(best_rows, best_distances)
+
+def nearest_centroids(centroids: np.ndarray, features: np.ndarray) -> np.ndarray:
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    return np.asarray(exact_knn(centroids, centroid_norms, features, 1)[0][:, 0])
+
+def build_ivf(features: np.ndarray, lists: int = None, iterations: int = IVF_ITERATIONS, seed: int = IVF_SEED) -> tuple:
+    """
+    Lloyd's k-means over the feature rows (sqrt(n) lists by default). Returns the
+    centroids, the rows ordered by list, and the start offset of every list. The
+    lists are filled from a final assignment to the returned centroids, so every
+    row sits in the list of its nearest saved centroid.
+    """
+    features = np.asarray(features)
+    lists = max(1, int(np.sqrt(len(features)))) if lists is None else lists
+    rng = np.random.default_rng(seed)
+    centroids = features[rng.choice(len(features), size=lists, replace=False)].copy()
+    norms = np.einsum("ij,ij->i", features, features)
+    for _ in range(iterations):
+        assignments = nearest_centroids(centroids, features)
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        np.add.at(sums, assignments, features)
+        counts = np.bincount(assignments, minlength=lists)
+        filled = counts > 0
+        centroids[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+        # Empty lists are re-seeded with the rows farthest from their centroid.
+        if not filled.all():
+            residual = norms - 2.0 * np.einsum("ij,ij->i", features, centroids[assignments]) + np.einsum("ij,ij->i", centroids[assignments], centroids[assignments])
+            centroids[~filled] = features[np.argsort(residual)[::-1][:int((~filled).sum())]]
+    assignments = nearest_centroids(centroids, features)
+    order = np.argsort(assignments, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=lists)))).astype(np.int64)
+    return centroids, order.astype(np.int64), offsets
+
+def ivf_knn(index: dict, queries: np.ndarray, k: int, probes: int = IVF_PROBES, excluded: np.ndarray = None) -> tuple:
+    """Approximate kNN: exact search over the rows of the `probes` lists nearest to each query."""
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    centroids = index["ivf_centroids"]
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    probed_lists = exact_knn(centroids, centroid_norms, queries, min(probes, len(centroids)))[0]
+    all_rows = np.full((len(queries), k), -1, dtype=np.int64)
+    all_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    for q, lists in enumerate(probed_lists):
+        candidates = np.concatenate([index["ivf_order"][index["ivf_offsets"][l]:index["ivf_offsets"][l + 1]] for l in lists])
+        if excluded is not None:
+            candidates = candidates[~excluded[candidates]]
+        if len(candidates) == 0:
+            continue
+        candidates.sort()
+        rows, distances = exact_knn(index["features"][candidates], index["norms"][candidates], queries[q], k)
+        found = rows[0] >= 0
+        all_rows[q, :found.sum()] = candidates[rows[0][found]]
+        all_distances[q, :found.sum()] = distances[0][found]
+    return all_rows, all_distances
+
+def build_index(region_dirs: dict = None, index_dir: str = INDEX_DIR, with_ivf: bool = True):
+    os.makedirs(index_dir, exist_ok=True)
+    accumulator = FeatureVectorAccumulator()
+    totals = fused_analysis.run_fused_analysis([accumulator], region_dirs)
+    accumulator.write(index_dir)
+    print(f"Built {len(accumulator.factors)} feature vectors of {len(feature_names(accumulator.kmer_sizes, accumulator.hash_dimensions))} "
+          f"dimensions from {totals['residues']} residues.")
+
+    metadata = {"factors": len(accumulator.factors), "kmer_sizes": accumulator.kmer_sizes,
+                "hash_dimensions": accumulator.hash_dimensions, "ivf": False}
+    if with_ivf and len(accumulator.factors) >= IVF_MINIMUM_FACTORS:
+        features = np.load(os.path.join(index_dir, "features.npy"))
+        centroids, order, offsets = build_ivf(features)
+        for name, array in (("ivf_centroids", centroids), ("ivf_order", order), ("ivf_offsets", offsets)):
+            save_array(os.path.join(index_dir, f"{name}.npy"), array)
+        metadata["ivf"] = True
+        print(f"Built an IVF index with {len(centroids)} lists.")
+    metadata_path = os.path.join(index_dir, "index.json")
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    pipeline_telemetry.record_written(metadata_path)
+
+def load_index(index_dir: str = INDEX_DIR) -> dict:
+    """Memory-maps the feature matrix, so loading costs no more than the rows a query touches."""
+    with open(os.path.join(index_dir, "index.json"), 'r') as f:
+        index = json.load(f)
+    index["features"] = np.load(os.path.join(index_dir, "features.npy"), mmap_mode="r")
+    index["norms"] = np.load(os.path.join(index_dir, "norms.npy"), mmap_mode="r")
+    if index["ivf"]:
+        for name in ("ivf_centroids", "ivf_order", "ivf_offsets"):
+            index[name] = np.load(os.path.join(index_dir, f"{name}.npy"))
+    with open(os.path.join(index_dir, "factors.csv"), 'r', newline='') as csvfile:
+        index["factors"] = [(row["region"], row["filename"], int(row["length"])) for row in csv.DictReader(csvfile)]
+    index["rows_by_factor"] = {(region, filename): row for row, (region, filename, _) in enumerate(index["factors"])}
+    index["regions"] = np.array([region for region, _, _ in index["factors"]])
+    return index
+
+def find_neighbours(index: dict, region: str, filename: str, k: int = DEFAULT_NEIGHBOURS,
+                    target_region: str = None, search: str = "exact", probes: int = IVF_PROBES) -> list:
+    """
+    The k factors closest to (region, filename), optionally restricted to one
+    region. Returns (region, filename, length, distance) tuples, nearest first.
+    """
+    try:
+        query_row = index["rows_by_factor"][(region, filename)]
+    except KeyError:
+        raise KeyError(f"Factor '{filename}' is not in the index for region '{region}'.") from None
+    excluded = np.zeros(len(index["factors"]), dtype=bool)
+    excluded[query_row] = True
+    if target_region is not None:
+        excluded |= index["regions"] != target_region
+
+    query = np.asarray(index["features"][query_row])
+    if search == "ivf":
+        if not index["ivf"]:
+            raise ValueError("The index was built without IVF lists; use the exact search or rebuild with more factors.")
+        rows, distances = ivf_knn(index, query, k, probes, excluded)
+    else:
+        rows, distances = exact_knn(index["features"], index["norms"], query, k, excluded)
+    return [(*index["factors"][row], float(distance)) for row, distance in zip(rows[0], distances[0]) if row >= 0]
+
+if __name__ == "__main__":
+    pipeline_telemetry.configure("composition_index")
+
+    parser = argparse.ArgumentParser(description="Build or query the composition-vector nearest-neighbour index.")
+    parser.add_argument("--rebuild", action="store_true", help="Rescan the region directories even if the index exists.")
+    parser.add_argument("--no-ivf", action="store_true", help="Build only the exact index.")
+    parser.add_argument("--region", choices=list(fused_analysis.REGION_DIRS), help="Region of the query factor.")
+    parser.add_argument("--factor", help="File name of the query factor, e.g. '1.2.1.1_TF_3.txt'.")
+    parser.add_argument("--k", type=int, default=DEFAULT_NEIGHBOURS, help="Number of neighbours.")
+    parser.add_argument("--target-region", choices=list(fused_analysis.REGION_DIRS), help="Only return factors of this region.")
+    parser.add_argument("--search", choices=["exact", "ivf"], default="exact")
+    parser.add_argument("--probes", type=int, default=IVF_PROBES, help="IVF lists scanned per query.")
+    parser.add_argument("--output-csv", help="Write the neighbours to this CSV instead of printing them.")
+    args = parser.parse_args()
+
+    if args.rebuild or not os.path.exists(os.path.join(INDEX_DIR, "index.json")):
+        with pipeline_telemetry.stage("build"):
+            build_index(with_ivf=not args.no_ivf)
+        print(f"Saved the index to '{INDEX_DIR}'.")
+
+    if args.region and args.factor:
+        with pipeline_telemetry.stage("load"):
+            index = load_index()
+        with pipeline_telemetry.stage("query"):
+            start = time.perf_counter()
+            neighbours = find_neighbours(index, args.region, args.factor, args.k, args.target_region, args.search, args.probes)
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+        print(f"Found {len(neighbours)} neighbours of '{args.factor}' ({args.region}) in {elapsed_ms:.1f} ms with the {args.search} search.")
+
+        header = ['region', 'filename', 'length', 'distance']
+        rows = [[region, filename, length, f"{distance:.6f}"] for region, filename, length, distance in neighbours]
+        if args.output_csv:
+            with open(args.output_csv, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(header)
+                writer.writerows(rows)
+            pipeline_telemetry.record_written(args.output_csv)
+            print(f"--- Successfully created {args.output_csv} ---")
+        else:
+            print("\t".join(header))
+            for row in rows:
+                print("\t".join(str(value) for value in row))
+
+    pipeline_telemetry.finish()
@@ -1,6 +1,8 @@
 import os
 import csv
 
+import pipeline_telemetry
+
 BASE_FOLDER: str = "DBD-Region"
 IU_COLUMN_INDEX: int = 2
 
@@ -26,17 +28,23 @@ def calculate_disorder_ratio(filepath: str) -> float:
                 except ValueError:
                     continue
         
+        pipeline_telemetry.add("factors")
+        pipeline_telemetry.add("residues", total_anchor_residues)
+
         if total_anchor_residues == 0:
+            pipeline_telemetry.record_skipped(filepath, "no residue rows")
             return -1.0
         
         return disordered_residues / total_anchor_residues
 
     except Exception as e:
         print(f"!!! Could not read or process file {filepath}: {e}")
+        pipeline_telemetry.record_error(filepath, e)
         return -1.0
 
 if __name__ == "__main__":
-    
+    pipeline_telemetry.configure("disorder")
+
     threshold_percentage = -1
     while True:
         try:
@@ -58,15 +66,17 @@ if __name__ == "__main__":
         print(f"Error: The input directory '{BASE_FOLDER}' was not found.")
         print("Please ensure the script is in the same directory as your 'DBD_Split' folder.")
     else:
-        for dirpath, _, filenames in os.walk(BASE_FOLDER):
-            for filename in filenames:
-                if filename.endswith(".txt"):
-                    full_filepath = os.path.join(dirpath, filename)
-                    
-                    ratio = calculate_disorder_ratio(full_filepath)
+        with pipeline_telemetry.stage("disorder"):
+            for dirpath, _, filenames in os.walk(BASE_FOLDER):
+                for filename in filenames:
+                    if filename.endswith(".txt"):
+                        full_filepath = os.path.join(dirpath, filename)
 
-                    if ratio >= threshold_ratio:
-                        found_files_with_ratios.append((full_filepath, ratio))
+                        with pipeline_telemetry.track_file(full_filepath):
+                            ratio = calculate_disorder_ratio(full_filepath)
+
+                        if ratio >= threshold_ratio:
+                            found_files_with_ratios.append((full_filepath, ratio))
 
     if found_files_with_ratios:
         sorted_files = sorted(found_files_with_ratios)
@@ -79,16 +89,20 @@ if __name__ == "__main__":
         print(f"\nSaving the results to '{csv_filename}'...")
         
         try:
-            with open(csv_filename, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['filename', 'disorder_percentage'])
-                for f_path, ratio in sorted_files:
-                    filename_only = os.path.basename(f_path)
-                    percentage = ratio * 100.0
-                    writer.writerow([filename_only, f"{percentage:.2f}"])
+            with pipeline_telemetry.stage("write_csv"):
+                with open(csv_filename, 'w', newline='') as csvfile:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(['filename', 'disorder_percentage'])
+                    for f_path, ratio in sorted_files:
+                        filename_only = os.path.basename(f_path)
+                        percentage = ratio * 100.0
+                        writer.writerow([filename_only, f"{percentage:.2f}"])
+                pipeline_telemetry.record_written(csv_filename)
             print("Successfully saved the CSV file.")
         except Exception as e:
             print(f"!!! Error writing CSV file: {e}")
 
     else:
-        print("No files were found that meet the specified disorder threshold.")
\ No newline at end of file
+        print("No files were found that meet the specified disorder threshold.")
+
+    pipeline_telemetry.finish()
\ No newline at end of file
@@ -0,0 +1,238 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import pipeline_telemetry
+
+# Inputs are the sorted global count tables written by DBD-Non-DBD-Window-Code.py
+# with ANALYSIS_MODE = "global".
+DBD_COUNTS_DIR: str = "DBD-Global-Kmer-Counts"
+NON_DBD_COUNTS_DIR: str = "Non-DBD-Global-Kmer-Counts"
+OUTPUT_DIR: str = "kmer_enrichment"
+
+# The window sizes DBD-Non-DBD-Window-Code.py counts (WINDOW_SIZES there).
+ENRICHMENT_WINDOW_SIZES = range(3, 12)
+ENRICHMENT_CHUNK_SIZE: int = 500_000
+PSEUDOCOUNT: float = 0.5
+# Which p-value the Benjamini-Hochberg correction and the ranking use: "fisher" or "chi2".
+FDR_TEST: str = "fisher"
+# Per-k-mer results are spilled to these fixed-width columns while streaming; the
+# k-mer itself is stored as window_size bytes.
+SPILL_COLUMNS = {
+    "dbd_count": np.int64,
+    "nondbd_count": np.int64,
+    "log2_odds_ratio": np.float64,
+    "chi2_p": np.float64,
+    "fisher_p": np.float64
+}
+
+def column_total(csv_path: str, column: str) -> int:
+    total = 0
+    for chunk in pd.read_csv(csv_path, usecols=[column], chunksize=ENRICHMENT_CHUNK_SIZE):
+        total += int(chunk[column].sum())
+    return total
+
+def iter_aligned_chunks(dbd_csv: str, nondbd_csv: str, column: str):
+    """
+    Streams the two kmer-sorted tables side by side and yields
+    (kmers, dbd_counts, nondbd_counts) for at most ~ENRICHMENT_CHUNK_SIZE k-mers
+    at a time; a k-mer missing from one region gets a count of 0.
+    """
+    readers = [
+        pd.read_csv(path, usecols=["kmer", column], chunksize=ENRICHMENT_CHUNK_SIZE,
+                    dtype={"kmer": str, column: np.int64}, keep_default_na=False)
+        for path in (dbd_csv, nondbd_csv)
+    ]
+    buffers = [pd.DataFrame(columns=["kmer", column]) for _ in readers]
+    exhausted = [False, False]
+
+    while True:
+        for i, reader in enumerate(readers):
+            if not exhausted[i] and len(buffers[i]) < ENRICHMENT_CHUNK_SIZE:
+                try:
+                    buffers[i] = pd.concat([buffers[i], next(reader)], ignore_index=True)
+                except StopIteration:
+                    exhausted[i] = True
+
+        if all(exhausted):
+            ready = buffers
+            buffers = [b.iloc[0:0] for b in buffers]
+        else:
+            # Only k-mers up to the smaller "last seen" key are complete in both tables.
+            boundary = min(b["kmer"].iloc[-1] for b, done in zip(buffers, exhausted) if not done and len(b))
+            ready = [b[b["kmer"] <= boundary] for b in buffers]
+            buffers = [b[b["kmer"] > boundary].reset_index(drop=True) for b in buffers]
+
+        merged = pd.merge(ready[0], ready[1], on="kmer", how="outer", suffixes=("_dbd", "_nondbd"), sort=True)
+        if len(merged):
+            yield (merged["kmer"].to_numpy(),
+                   merged[f"{column}_dbd"].fillna(0).to_numpy(dtype=np.int64),
+                   merged[f"{column}_nondbd"].fillna(0).to_numpy(dtype=np.int64))
+
+        if all(exhausted) and not any(len(b) for b in buffers):
+            return
+
+def enrichment_statistics(dbd_counts: np.ndarray, nondbd_counts: np.ndarray, dbd_total: int, nondbd_total: int) -> dict:
+    """
+    Vectorized 2x2 tests for every k-mer at once. For each k-mer the table is
+    [[a, b], [c, d]] with a/b its DBD/non-DBD counts and c/d all other k-mers.
+    """
+    a = dbd_counts.astype(np.float64)
+    b = nondbd_counts.astype(np.float64)
+    c = dbd_total - a
+    d = nondbd_total - b
+    n = a + b + c + d
+
+    log2_odds = np.log2(((a + PSEUDOCOUNT) * (d + PSEUDOCOUNT)) / ((b + PSEUDOCOUNT) * (c + PSEUDOCOUNT)))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2_statistic = n * (a * d - b * c) ** 2 / ((a + b) * (c + d) * (a + c) * (b + d))
+    chi2_statistic = np.nan_to_num(chi2_statistic, nan=0.0, posinf=0.0)
+    chi2_p = stats.chi2.sf(chi2_statistic, df=1)
+
+    fisher_p = fisher_two_sided(dbd_counts, dbd_counts + nondbd_counts, dbd_total, nondbd_total)
+
+    return {"log2_odds_ratio": log2_odds, "chi2_p": chi2_p, "fisher_p": fisher_p}
+
+def fisher_two_sided(dbd_counts: np.ndarray, kmer_totals: np.ndarray, dbd_total: int, nondbd_total: int) -> np.ndarray:
+    """
+    Exact two-sided Fisher p-values (the same "sum of tables no more likely than
+    the observed one" definition as scipy.stats.fisher_exact) for all k-mers at once.
+    The observed count a lies on one side of the hypergeometric mode; the matching
+    cut-off on the other side is found by a vectorized bisection over the monotone pmf.
+    """
+    population = int(dbd_total + nondbd_total)
+    a = dbd_counts.astype(np.int64)
+    n = kmer_totals.astype(np.int64)
+    support_low = np.maximum(0, dbd_total - (population - n))
+    support_high = np.minimum(n, dbd_total)
+    mode = np.floor((n + 1) * (dbd_total + 1) / (population + 2)).astype(np.int64)
+    mode = np.clip(mode, support_low, support_high)
+
+    observed = stats.hypergeom.pmf(a, population, n, dbd_total) * (1 + 1e-7)
+    lower = a < mode
+    upper = a > mode
+
+    # Lower-tail observations: smallest x in [mode, high] with pmf(x) <= observed (pmf decreasing).
+    left = mode.copy()
+    right = support_high + 1
+    # Upper-tail observations: largest x in [low, mode] with pmf(x) <= observed (pmf increasing),
+    # searched as the smallest x with pmf(x) > observed, minus one.
+    left[upper] = support_low[upper]
+    right[upper] = mode[upper]
+    active = lower | upper
+    while True:
+        searching = active & (left < right)
+        if not searching.any():
+            break
+        middle = (left + right) // 2
+        at_or_below = stats.hypergeom.pmf(middle, population, n, dbd_total) <= observed
+        go_left = np.where(lower, at_or_below, ~at_or_below)
+        right = np.where(searching & go_left, middle, right)
+        left = np.where(searching & ~go_left, middle + 1, left)
+
+    p_values = np.ones(len(a))
+    p_values[lower] = (stats.hypergeom.cdf(a[lower], population, n[lower], dbd_total)
+                       + stats.hypergeom.sf(left[lower] - 1, population, n[lower], dbd_total))
+    p_values[upper] = (stats.hypergeom.sf(a[upper] - 1, population, n[upper], dbd_total)
+                       + stats.hypergeom.cdf(left[upper] - 1, population, n[upper], dbd_total))
+    return np.minimum(p_values, 1.0)
+
+def benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    m = len(p_values)
+    if m == 0:
+        return p_values
+    order = np.argsort(p_values, kind="stable")
+    ranked = p_values[order] * m / np.arange(1, m + 1)
+    q_sorted = np.minimum.accumulate(ranked[::-1])[::-1]
+    q_values = np.empty(m)
+    q_values[order] = np.minimum(q_sorted, 1.0)
+    return q_values
+
+def load_spilled(path: str, dtype) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+def write_ranked_table(output_csv: str, table: dict, q_values: np.ndarray, order: np.ndarray):
+    """Writes the rows in ranked order, ENRICHMENT_CHUNK_SIZE rows at a time."""
+    with open(output_csv, 'w', newline='') as csvfile:
+        for start in range(0, max(len(order), 1), ENRICHMENT_CHUNK_SIZE):
+            rows = order[start : start + ENRICHMENT_CHUNK_SIZE]
+            block = pd.DataFrame({"rank": np.arange(start + 1, start + len(rows) + 1), "kmer": table["kmer"][rows].astype(str)})
+            for key in SPILL_COLUMNS:
+                block[key] = table[key][rows]
+            block["q_value"] = q_values[rows]
+            block.to_csv(csvfile, index=False, header=start == 0, float_format="%.6g")
+
+def run_enrichment(window_size: int, column: str):
+    """
+    Streams the two tables chunk by chunk and spills every chunk's counts and
+    statistics to disk. Only the FDR p-values, the q-values, the log odds and the
+    rank order (8 bytes each per k-mer) are held in memory for the
+    Benjamini-Hochberg correction and the ranking; the k-mers and the remaining
+    columns stay memory-mapped and are written out in ranked chunks.
+    """
+    dbd_csv = os.path.join(DBD_COUNTS_DIR, f"global_kmer_counts_WS{window_size}.csv")
+    nondbd_csv = os.path.join(NON_DBD_COUNTS_DIR, f"global_kmer_counts_WS{window_size}.csv")
+    output_csv = os.path.join(OUTPUT_DIR, f"{column}_WS{window_size}_enrichment.csv")
+    print(f"--- Starting enrichment for {column}, window size {window_size} ---")
+
+    dbd_total = column_total(dbd_csv, column)
+    nondbd_total = column_total(nondbd_csv, column)
+    if dbd_total == 0 or nondbd_total == 0:
+        print(f"--- {column} has no k-mers in one of the regions. Skipping.")
+        return
+
+    dtypes = dict(SPILL_COLUMNS, kmer=f"S{window_size}")
+    with tempfile.TemporaryDirectory(prefix=f"spill_{column}_WS{window_size}_", dir=OUTPUT_DIR) as spill_dir:
+        spill_paths = {key: os.path.join(spill_dir, f"{key}.bin") for key in dtypes}
+        spill_files = {key: open(path, 'wb') for key, path in spill_paths.items()}
+        try:
+            for kmers, dbd_counts, nondbd_counts in iter_aligned_chunks(dbd_csv, nondbd_csv, column):
+                keep = (dbd_counts + nondbd_counts) > 0
+                kmers, dbd_counts, nondbd_counts = kmers[keep], dbd_counts[keep], nondbd_counts[keep]
+                chunk = enrichment_statistics(dbd_counts, nondbd_counts, dbd_total, nondbd_total)
+                chunk.update(kmer=kmers, dbd_count=dbd_counts, nondbd_count=nondbd_counts)
+                for key, values in chunk.items():
+                    spill_files[key].write(np.asarray(values, dtype=dtypes[key]).tobytes())
+        finally:
+            for f in spill_files.values():
+                f.close()
+
+        table = {key: load_spilled(spill_paths[key], dtype) for key, dtype in dtypes.items()}
+        q_values = benjamini_hochberg(np.asarray(table[f"{FDR_TEST}_p"]))
+        order = np.lexsort((-np.abs(table["log2_odds_ratio"]), q_values))
+        write_ranked_table(output_csv, table, q_values, order)
+        del table
+
+    pipeline_telemetry.add("bytes_read", os.path.getsize(dbd_csv) + os.path.getsize(nondbd_csv))
+    pipeline_telemetry.record_written(output_csv)
+    print(f"--- Successfully created {output_csv} ({len(q_values)} k-mers, {int((q_values < 0.05).sum())} with q < 0.05) ---")
+
+if __name__ == "__main__":
+    pipeline_telemetry.configure("enrichment")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    for window_size in ENRICHMENT_WINDOW_SIZES:
+        dbd_csv = os.path.join(DBD_COUNTS_DIR, f"global_kmer_counts_WS{window_size}.csv")
+        nondbd_csv = os.path.join(NON_DBD_COUNTS_DIR, f"global_kmer_counts_WS{window_size}.csv")
+        if not (os.path.exists(dbd_csv) and os.path.exists(nondbd_csv)):
+            print(f"!!! ERROR: Global count tables for window size {window_size} not found. Run the window analysis with ANALYSIS_MODE = \"global\" first.")
+            continue
+
+        dbd_columns = pd.read_csv(dbd_csv, nrows=0).columns
+        nondbd_columns = set(pd.read_csv(nondbd_csv, nrows=0).columns)
+        for column in dbd_columns:
+            if column.startswith("superclass_") and column in nondbd_columns:
+                with pipeline_telemetry.stage(f"{column}_WS{window_size}"):
+                    run_enrichment(window_size, column)
+        print("-" * 50)
+
+    print("\n\n" + "*" * 50)
+    print("All enrichment jobs are complete.")
+    print("*" * 50)
+    pipeline_telemetry.finish()
@@ -1,5 +1,10 @@
 import os
 
+import archive_ingest
+import checkpoint
+import pipeline_telemetry
+
+# A directory, a .tar/.tar.gz/.tar.zst/.zip snapshot of it, or a single .gz/.bz2/.zst file.
 BASE_FOLDER: str = "/mnt/d/NR_HI_IU"
 DBD_OUTPUT_DIR: str = "DBD-Region"
 NON_DBD_OUTPUT_DIR: str = "Non-DBD-Region"
@@ -7,12 +12,15 @@ NON_DBD_OUTPUT_DIR: str = "Non-DBD-Region"
 POSITION_COLUMN_INDEX: int = 4
 ANCHOR_COLUMN_INDEX: int = 7
 
-def process_file_for_splitting(filepath: str):
+def process_file_for_splitting(filepath: str, lines: list = None):
+    """Returns the paths of the region files written, or None if the file could not be processed."""
+    written = []
     try:
         base_name, _ = os.path.splitext(os.path.basename(filepath))
 
-        with open(filepath, 'r') as f:
-            lines = f.readlines()
+        if lines is None:
+            with open(filepath, 'r') as f:
+                lines = f.readlines()
 
         NEW_HEADER = "POS_IU\tRES_IU\tIU\tANCHOR\n"
         all_residue_lines = []
@@ -23,7 +31,8 @@ def process_file_for_splitting(filepath: str):
                     all_residue_lines.append(line)
         
         if not all_residue_lines:
-            return
+            pipeline_telemetry.record_skipped(filepath, "no residue rows")
+            return written
 
         factor_start_indices = [0]
         for i in range(1, len(all_residue_lines)):
@@ -35,6 +44,9 @@ def process_file_for_splitting(filepath: str):
             except (ValueError, IndexError):
                 continue
 
+        pipeline_telemetry.add("factors", len(factor_start_indices))
+        pipeline_telemetry.add("residues", len(all_residue_lines))
+
         for i in range(len(factor_start_indices)):
             factor_num = i + 1
             start_index = factor_start_indices[i]
@@ -61,33 +73,44 @@ def process_file_for_splitting(filepath: str):
             if reformatted_dbd_lines:
                 output_filename = f"{base_name}_TF_{factor_num}.txt"
                 full_output_path = os.path.join(DBD_OUTPUT_DIR, output_filename)
-                with open(full_output_path, 'w') as out_file:
+                with checkpoint.atomic_write(full_output_path, sync=False) as out_file:
                     out_file.write(NEW_HEADER)
                     out_file.writelines(reformatted_dbd_lines)
+                pipeline_telemetry.record_written(full_output_path)
+                written.append(full_output_path)
 
             if reformatted_nondbd_lines:
                 output_filename = f"{base_name}_TF_{factor_num}.txt"
                 full_output_path = os.path.join(NON_DBD_OUTPUT_DIR, output_filename)
-                with open(full_output_path, 'w') as out_file:
+                with checkpoint.atomic_write(full_output_path, sync=False) as out_file:
                     out_file.write(NEW_HEADER)
                     out_file.writelines(reformatted_nondbd_lines)
+                pipeline_telemetry.record_written(full_output_path)
+                written.append(full_output_path)
 
     except Exception as e:
         print(f"!!! An error occurred while processing the file {filepath}: {e}")
+        pipeline_telemetry.record_error(filepath, e)
+        return None
+    return written
 
 if __name__ == "__main__":
+    pipeline_telemetry.configure("split")
+    checkpoint.configure()
     os.makedirs(DBD_OUTPUT_DIR, exist_ok=True)
     os.makedirs(NON_DBD_OUTPUT_DIR, exist_ok=True)
     print(f"DBD regions will be saved in '{DBD_OUTPUT_DIR}'")
     print(f"Non-DBD regions will be saved in '{NON_DBD_OUTPUT_DIR}'")
 
-    for dirpath, _, filenames in os.walk(BASE_FOLDER):
-        for filename in filenames:
-            if filename.endswith(".txt"):
-                full_filepath = os.path.join(dirpath, filename)
-                print(f"--- Splitting: {full_filepath} ---")
-                process_file_for_splitting(full_filepath)
+    with checkpoint.journal("split") as journal, pipeline_telemetry.stage("split"):
+        for member in archive_ingest.iter_raw_members(BASE_FOLDER, skip=journal.is_done):
+            print(f"--- Splitting: {member.path} ---")
+            with pipeline_telemetry.track_file(member.path, member.size):
+                written = process_file_for_splitting(member.path, member.lines)
+            if written is not None:
+                journal.mark_done(member.path, written, member.fingerprint)
 
     print("\n\n" + "*" * 50)
     print("All files have been split and processed.")
-    print("*" * 50)
\ No newline at end of file
+    print("*" * 50)
+    pipeline_telemetry.finish()
\ No newline at end of file
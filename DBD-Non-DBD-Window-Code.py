@@ -1,18 +1,66 @@
 import os
 import collections
+import heapq
+import math
+import shutil
+import struct
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import checkpoint
+import pipeline_telemetry
 
 JOBS = [
     {
         "input_dir": "DBD-Region",
-        "output_dir": "DBD-region-Window-Output"
+        "output_dir": "DBD-region-Window-Output",
+        "global_output_dir": "DBD-Global-Kmer-Counts",
+        "sketch_output_dir": "DBD-Kmer-Sketches"
     },
     {
         "input_dir": "Non-DBD-Region",
-        "output_dir": "Non-DBD-Window-Output"
+        "output_dir": "Non-DBD-Window-Output",
+        "global_output_dir": "Non-DBD-Global-Kmer-Counts",
+        "sketch_output_dir": "Non-DBD-Kmer-Sketches"
     }
 ]
 AMINO_ACID_COLUMN_INDEX: int = 1
 
+# "window" writes the per-factor sliding window files, "global" builds one
+# dataset-wide k-mer -> count table per window size with per-superclass columns,
+# "sketch" estimates the same statistics approximately under a memory budget.
+ANALYSIS_MODE: str = "window"
+WINDOW_SIZES = range(3, 12)
+
+# --- Global (out-of-core) counting ---
+# Memory for the bucket counting tables of all workers together. It sets how many
+# buckets the k-mers are partitioned into and how many are counted at once.
+GLOBAL_COUNT_MEMORY_BUDGET_BYTES: int = 1024 * 1024 * 1024
+GLOBAL_COUNT_WORKERS: int = os.cpu_count() or 1
+GLOBAL_COUNT_MAX_BUCKETS: int = 4096
+GLOBAL_COUNT_FLUSH_BYTES: int = 1 << 20
+GLOBAL_COUNT_READ_RECORDS: int = 1 << 16
+# In-memory cost of one distinct k-mer in count_bucket: dict entry, code and count
+# list, plus GLOBAL_COUNT_SUPERCLASS_BYTES per superclass column.
+GLOBAL_COUNT_KMER_BYTES: int = 180
+GLOBAL_COUNT_SUPERCLASS_BYTES: int = 8
+# Shortest possible split-file row ("1\tA\t0.5\tNo\n"); bounds the residues of a file by its size.
+SPLIT_ROW_MIN_BYTES: int = 11
+# Residues are encoded as 1..26 (A..Z) in base 27, so a k-mer code is unique for
+# every k and sorting codes of equal k is the same as sorting the k-mers.
+KMER_ENCODING_BASE: int = 27
+BUCKET_RECORD = struct.Struct("<QHQ")
+
+# --- Approximate (sketch) counting ---
+SKETCH_MEMORY_BUDGET_BYTES: int = 64 * 1024 * 1024
+SKETCH_DEPTH: int = 5
+SKETCH_HLL_PRECISION: int = 14
+SKETCH_HEAVY_HITTER_FRACTION: float = 0.1
+SKETCH_HEAVY_HITTER_ENTRY_BYTES: int = 128
+MINIMUM_OCCURRENCE_COUNT: int = 3
+MASK_64: int = 0xFFFFFFFFFFFFFFFF
+
 def count_pattern_occurrences(sequence: str, window_size: int) -> collections.Counter:
     if not sequence or len(sequence) < window_size:
         return collections.Counter()
@@ -22,6 +70,92 @@ def count_pattern_occurrences(sequence: str, window_size: int) -> collections.Co
         pattern_counts[pattern] += 1
     return pattern_counts
 
+def encode_kmer(pattern: str) -> int:
+    """Packs a k-mer into a 64-bit integer, or returns -1 for non A-Z residues."""
+    code = 0
+    for residue in pattern:
+        value = ord(residue) - 64
+        if value < 1 or value > 26:
+            return -1
+        code = code * KMER_ENCODING_BASE + value
+    return code
+
+def decode_kmer(code: int, window_size: int) -> str:
+    residues = []
+    for _ in range(window_size):
+        code, value = divmod(code, KMER_ENCODING_BASE)
+        residues.append(chr(value + 64))
+    return "".join(reversed(residues))
+
+def kmer_bucket(code: int, bucket_count: int) -> int:
+    mixed = (code * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    return (mixed >> 32) % bucket_count
+
+def splitmix64(value: int) -> int:
+    value = (value + 0x9E3779B97F4A7C15) & MASK_64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return value ^ (value >> 31)
+
+class CountMinSketch:
+    """Count-min sketch over encoded k-mers; estimates never undercount."""
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.table = [array('Q', bytes(8 * width)) for _ in range(depth)]
+        self.seeds = [splitmix64(row + 1) for row in range(depth)]
+        self.total = 0
+
+    def add(self, code: int, count: int = 1):
+        self.total += count
+        for row, seed in zip(self.table, self.seeds):
+            row[splitmix64(code ^ seed) % self.width] += count
+
+    def estimate(self, code: int) -> int:
+        return min(row[splitmix64(code ^ seed) % self.width] for row, seed in zip(self.table, self.seeds))
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+class HyperLogLog:
+    """Distinct-count estimator with 2**precision one-byte registers."""
+
+    def __init__(self, precision: int):
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.registers = bytearray(self.register_count)
+
+    def add(self, code: int):
+        hashed = splitmix64(code ^ 0x5851F42D4C957F2D)
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> float:
+        m = self.register_count
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return raw
+
+    @property
+    def relative_standard_error(self) -> float:
+        return 1.04 / math.sqrt(self.register_count)
+
+def get_superclass(filename: str) -> str:
+    """'1.2.1.1_TF_3.txt' -> '1'."""
+    return filename.split(".", 1)[0]
+
 def extract_sequence_from_split_file(filepath: str) -> str:
     """Extracts the amino acid sequence from the new 4-column files."""
     sequence_list = []
@@ -34,65 +168,371 @@ def extract_sequence_from_split_file(filepath: str) -> str:
                     sequence_list.append(parts[AMINO_ACID_COLUMN_INDEX])
     except Exception as e:
         print(f"!!! Error reading sequence from {filepath}: {e}")
+        pipeline_telemetry.record_error(filepath, e)
     return "".join(sequence_list)
 
-def perform_window_analysis_on_directory(input_dir: str, output_root: str):
+def count_factor_once(counted: set, filepath: str, sequence: str):
+    """Adds a factor to the telemetry counters the first time a run reads it, not once per window size."""
+    if filepath not in counted:
+        counted.add(filepath)
+        pipeline_telemetry.add("factors")
+        pipeline_telemetry.add("residues", len(sequence))
+
+def perform_window_analysis_on_directory(input_dir: str, output_root: str, journal: checkpoint.Journal = None):
     """
     Main function to run the full sliding window analysis on a given directory.
+    With a journal, every (window size, file) pair already completed is skipped.
     """
     if not os.path.isdir(input_dir):
         print(f"Warning: Input directory '{input_dir}' not found. Skipping this job.")
         return
 
     os.makedirs(output_root, exist_ok=True)
+    counted = set()
     
-    for window_size in range(3, 12):
+    for window_size in WINDOW_SIZES:
         print("\n" + "#" * 70)
         print(f"###   WINDOW SIZE = {window_size} for '{input_dir}'   ###")
         print("#" * 70 + "\n")
 
-        for filename in os.listdir(input_dir):
-            if filename.endswith(".txt"):
-                full_filepath = os.path.join(input_dir, filename)
-                print(f"--- Analyzing: {filename} ---")
-                
+        with pipeline_telemetry.stage(f"window_{window_size}"):
+            for filename in os.listdir(input_dir):
+                if filename.endswith(".txt"):
+                    full_filepath = os.path.join(input_dir, filename)
+                    unit = f"WS{window_size}/{filename}"
+                    fingerprint = checkpoint.file_fingerprint(full_filepath)
+                    if journal is not None and journal.is_done(unit, fingerprint):
+                        pipeline_telemetry.record_skipped(full_filepath, "completed in an earlier run")
+                        continue
+                    print(f"--- Analyzing: {filename} ---")
+
+                    with pipeline_telemetry.track_file(full_filepath):
+                        sequence_str = extract_sequence_from_split_file(full_filepath)
+                        count_factor_once(counted, full_filepath, sequence_str)
+                        if not sequence_str:
+                            pipeline_telemetry.record_skipped(full_filepath, "empty sequence")
+                            continue
+
+                        total_occurrences = count_pattern_occurrences(sequence_str, window_size)
+
+                        output_dir_ws = os.path.join(output_root, str(window_size))
+                        os.makedirs(output_dir_ws, exist_ok=True)
+
+                        base_name, _ = os.path.splitext(filename)
+                        output_filename = f"{base_name}_WS{window_size}.txt"
+                        full_output_path = os.path.join(output_dir_ws, output_filename)
+
+                        with checkpoint.atomic_write(full_output_path, sync=False) as out_file:
+                            out_file.write(f"--- Analysis for: {filename} ---\n")
+                            out_file.write(f"Window Size: {window_size}\n")
+                            out_file.write("=" * 50 + "\n\n")
+                            out_file.write(f"Sequence: {sequence_str}\n\n")
+                            out_file.write("Output (Sliding Window Step - Total Count of that Pattern):\n")
+
+                            if len(sequence_str) >= window_size:
+                                for i in range(len(sequence_str) - window_size + 1):
+                                    pattern = sequence_str[i : i + window_size]
+                                    count = total_occurrences[pattern]
+                                    out_file.write(f"  {pattern} - {count}\n")
+                            else:
+                                out_file.write(f"  (Sequence too short for window size {window_size})\n")
+                        pipeline_telemetry.record_written(full_output_path)
+                    if journal is not None:
+                        journal.mark_done(unit, [full_output_path], fingerprint)
+
+def kmer_table_bytes(distinct_kmers: int, superclass_count: int) -> int:
+    return distinct_kmers * (GLOBAL_COUNT_KMER_BYTES + GLOBAL_COUNT_SUPERCLASS_BYTES * superclass_count)
+
+def global_bucket_count(input_bytes: int, superclass_count: int) -> int:
+    """
+    Enough buckets that one bucket's counting table fits in a worker's share of
+    GLOBAL_COUNT_MEMORY_BUDGET_BYTES. The distinct k-mers are bounded by the
+    residues, and those by the input size.
+    """
+    worker_budget = max(1, GLOBAL_COUNT_MEMORY_BUDGET_BYTES // max(1, GLOBAL_COUNT_WORKERS))
+    table_bytes = kmer_table_bytes(input_bytes // SPLIT_ROW_MIN_BYTES, superclass_count)
+    return min(GLOBAL_COUNT_MAX_BUCKETS, max(1, -(-table_bytes // worker_budget)))
+
+def global_count_workers(bucket_paths: list, superclass_count: int) -> int:
+    """GLOBAL_COUNT_WORKERS, lowered so that the largest buckets counted at once fit in the memory budget."""
+    largest_records = max((os.path.getsize(path) // BUCKET_RECORD.size for path in bucket_paths), default=0)
+    largest_table = max(1, kmer_table_bytes(largest_records, superclass_count))
+    return max(1, min(GLOBAL_COUNT_WORKERS, GLOBAL_COUNT_MEMORY_BUDGET_BYTES // largest_table))
+
+def partition_kmers_to_buckets(input_dir: str, window_size: int, bucket_dir: str, superclasses: list, counted: set = None,
+                               bucket_count: int = 1) -> list:
+    """
+    Pass 1: counts every factor with count_pattern_occurrences and appends
+    (k-mer code, superclass index, count) records to one of `bucket_count`
+    hash-selected bucket files. Only one factor's Counter and the write buffers,
+    together at most GLOBAL_COUNT_MEMORY_BUDGET_BYTES, are held in memory.
+    """
+    superclass_index = {sc: i for i, sc in enumerate(superclasses)}
+    bucket_paths = [os.path.join(bucket_dir, f"bucket_{b:04d}.bin") for b in range(bucket_count)]
+    buffers = [bytearray() for _ in range(bucket_count)]
+    flush_bytes = max(BUCKET_RECORD.size, min(GLOBAL_COUNT_FLUSH_BYTES, GLOBAL_COUNT_MEMORY_BUDGET_BYTES // bucket_count))
+    bucket_files = [open(path, 'wb') for path in bucket_paths]
+
+    try:
+        for filename in sorted(os.listdir(input_dir)):
+            if not filename.endswith(".txt"):
+                continue
+            full_filepath = os.path.join(input_dir, filename)
+            with pipeline_telemetry.track_file(full_filepath):
                 sequence_str = extract_sequence_from_split_file(full_filepath)
+                count_factor_once(set() if counted is None else counted, full_filepath, sequence_str)
                 if not sequence_str:
+                    pipeline_telemetry.record_skipped(full_filepath, "empty sequence")
                     continue
-                
-                total_occurrences = count_pattern_occurrences(sequence_str, window_size)
-                
-                output_dir_ws = os.path.join(output_root, str(window_size))
-                os.makedirs(output_dir_ws, exist_ok=True)
-                
-                base_name, _ = os.path.splitext(filename)
-                output_filename = f"{base_name}_WS{window_size}.txt"
-                full_output_path = os.path.join(output_dir_ws, output_filename)
-
-                with open(full_output_path, 'w') as out_file:
-                    out_file.write(f"--- Analysis for: {filename} ---\n")
-                    out_file.write(f"Window Size: {window_size}\n")
-                    out_file.write("=" * 50 + "\n\n")
-                    out_file.write(f"Sequence: {sequence_str}\n\n")
-                    out_file.write("Output (Sliding Window Step - Total Count of that Pattern):\n")
-                    
-                    if len(sequence_str) >= window_size:
-                        for i in range(len(sequence_str) - window_size + 1):
-                            pattern = sequence_str[i : i + window_size]
-                            count = total_occurrences[pattern]
-                            out_file.write(f"  {pattern} - {count}\n")
-                    else:
-                        out_file.write(f"  (Sequence too short for window size {window_size})\n")
+
+                sc_index = superclass_index[get_superclass(filename)]
+                for pattern, count in count_pattern_occurrences(sequence_str, window_size).items():
+                    code = encode_kmer(pattern)
+                    if code < 0:
+                        continue
+                    b = kmer_bucket(code, bucket_count)
+                    buffers[b] += BUCKET_RECORD.pack(code, sc_index, count)
+                    if len(buffers[b]) >= flush_bytes:
+                        bucket_files[b].write(buffers[b])
+                        buffers[b].clear()
+
+        for b, buffer in enumerate(buffers):
+            bucket_files[b].write(buffer)
+    finally:
+        for f in bucket_files:
+            f.close()
+
+    return bucket_paths
+
+def count_bucket(bucket_path: str, superclass_count: int) -> str:
+    """
+    Pass 2: sums the records of one bucket and rewrites it as a code-sorted run
+    of (code, count per superclass) records. The bucket is read
+    GLOBAL_COUNT_READ_RECORDS at a time, so peak memory is one bucket's distinct k-mers.
+    """
+    bucket_counts = {}
+    with open(bucket_path, 'rb') as f:
+        while True:
+            chunk = f.read(BUCKET_RECORD.size * GLOBAL_COUNT_READ_RECORDS)
+            if not chunk:
+                break
+            for code, sc_index, count in BUCKET_RECORD.iter_unpack(chunk):
+                counts = bucket_counts.get(code)
+                if counts is None:
+                    counts = bucket_counts[code] = [0] * superclass_count
+                counts[sc_index] += count
+
+    sorted_record = struct.Struct(f"<Q{superclass_count}Q")
+    sorted_path = bucket_path[:-len(".bin")] + ".sorted"
+    with open(sorted_path, 'wb') as out_file:
+        for code in sorted(bucket_counts):
+            out_file.write(sorted_record.pack(code, *bucket_counts[code]))
+    os.remove(bucket_path)
+    return sorted_path
+
+def iter_sorted_bucket(sorted_path: str, superclass_count: int):
+    sorted_record = struct.Struct(f"<Q{superclass_count}Q")
+    with open(sorted_path, 'rb') as f:
+        while True:
+            chunk = f.read(sorted_record.size * 4096)
+            if not chunk:
+                break
+            yield from sorted_record.iter_unpack(chunk)
+
+def perform_global_kmer_counting(input_dir: str, output_root: str, journal: checkpoint.Journal = None):
+    """
+    Dataset-wide k-mer counting for every window size. Each window size is
+    hash-partitioned into on-disk buckets sized from GLOBAL_COUNT_MEMORY_BUDGET_BYTES,
+    every bucket is counted independently (in parallel by up to GLOBAL_COUNT_WORKERS
+    processes, as many as the budget allows), and the
+    sorted buckets are merged into global_kmer_counts_WS<k>.csv. With a journal,
+    window sizes whose table was completed earlier are skipped.
+    """
+    if not os.path.isdir(input_dir):
+        print(f"Warning: Input directory '{input_dir}' not found. Skipping this job.")
+        return
+
+    os.makedirs(output_root, exist_ok=True)
+    superclasses = sorted({get_superclass(f) for f in os.listdir(input_dir) if f.endswith(".txt")},
+                          key=lambda sc: (not sc.isdigit(), int(sc) if sc.isdigit() else 0, sc))
+    if not superclasses:
+        print(f"--- No region files found in '{input_dir}'. Skipping.")
+        return
+
+    # Bucket directories left behind by an interrupted run are never reused.
+    for entry in os.listdir(output_root):
+        if entry.startswith("kmer_buckets_WS"):
+            shutil.rmtree(os.path.join(output_root, entry), ignore_errors=True)
+
+    input_paths = [os.path.join(input_dir, f) for f in sorted(os.listdir(input_dir)) if f.endswith(".txt")]
+    fingerprint = checkpoint.file_fingerprint(*input_paths)
+    bucket_count = global_bucket_count(sum(os.path.getsize(path) for path in input_paths), len(superclasses))
+    counted = set()
+    for window_size in WINDOW_SIZES:
+        output_csv = os.path.join(output_root, f"global_kmer_counts_WS{window_size}.csv")
+        unit = f"global_WS{window_size}"
+        if journal is not None and journal.is_done(unit, fingerprint):
+            print(f"--- Window size {window_size} already counted in '{output_csv}'. Skipping.")
+            continue
+        print(f"--- Global counting, window size {window_size} for '{input_dir}' ---")
+        bucket_dir = tempfile.mkdtemp(prefix=f"kmer_buckets_WS{window_size}_", dir=output_root)
+        try:
+            with pipeline_telemetry.stage(f"partition_{window_size}"):
+                bucket_paths = partition_kmers_to_buckets(input_dir, window_size, bucket_dir, superclasses, counted, bucket_count)
+
+            with pipeline_telemetry.stage(f"count_buckets_{window_size}"):
+                workers = global_count_workers(bucket_paths, len(superclasses))
+                if workers > 1:
+                    with ProcessPoolExecutor(max_workers=workers) as executor:
+                        sorted_paths = list(executor.map(count_bucket, bucket_paths, [len(superclasses)] * len(bucket_paths)))
+                else:
+                    sorted_paths = [count_bucket(path, len(superclasses)) for path in bucket_paths]
+
+            distinct_kmers = 0
+            with pipeline_telemetry.stage(f"merge_{window_size}"):
+                with checkpoint.atomic_write(output_csv, newline='') as csvfile:
+                    csvfile.write(",".join(["kmer", "total"] + [f"superclass_{sc}" for sc in superclasses]) + "\n")
+                    merged = heapq.merge(*(iter_sorted_bucket(path, len(superclasses)) for path in sorted_paths))
+                    for record in merged:
+                        counts = record[1:]
+                        csvfile.write(f"{decode_kmer(record[0], window_size)},{sum(counts)},{','.join(map(str, counts))}\n")
+                        distinct_kmers += 1
+                pipeline_telemetry.record_written(output_csv)
+            if journal is not None:
+                journal.mark_done(unit, [output_csv], fingerprint)
+            print(f"--- Wrote {distinct_kmers} distinct k-mers to {output_csv} ---")
+        finally:
+            shutil.rmtree(bucket_dir, ignore_errors=True)
+
+def prune_heavy_hitters(heavy_hitters: dict, keep: int) -> tuple:
+    """
+    Drops every entry whose recorded estimate is at most the (keep + 1)-th largest,
+    leaving at most `keep`, and returns them with the raised admission threshold
+    (one above the largest dropped estimate). Count-min estimates never undercount
+    or decrease, so a k-mer whose true count reaches the final threshold was
+    admitted at its last occurrence and can never have been dropped after it.
+    """
+    cutoff = heapq.nlargest(keep + 1, heavy_hitters.values())[-1]
+    return {code: estimate for code, estimate in heavy_hitters.items() if estimate > cutoff}, cutoff + 1
+
+def perform_sketch_analysis_on_directory(input_dir: str, output_root: str, journal: checkpoint.Journal = None):
+    """
+    Approximate k-mer statistics for every window size within SKETCH_MEMORY_BUDGET_BYTES:
+    a count-min sketch for per-pattern frequency, a bounded heavy-hitters list for
+    patterns estimated at >= MINIMUM_OCCURRENCE_COUNT (raised when the list overflows,
+    see prune_heavy_hitters), and one HyperLogLog per
+    superclass (plus "all") for the number of distinct k-mers. With a journal,
+    window sizes completed earlier are skipped.
+    """
+    if not os.path.isdir(input_dir):
+        print(f"Warning: Input directory '{input_dir}' not found. Skipping this job.")
+        return
+
+    os.makedirs(output_root, exist_ok=True)
+    filenames = sorted(f for f in os.listdir(input_dir) if f.endswith(".txt"))
+    groups = ["all"] + sorted({get_superclass(f) for f in filenames})
+
+    hll_bytes = len(groups) * (1 << SKETCH_HLL_PRECISION)
+    heavy_hitter_limit = max(1, int(SKETCH_MEMORY_BUDGET_BYTES * SKETCH_HEAVY_HITTER_FRACTION) // SKETCH_HEAVY_HITTER_ENTRY_BYTES)
+    cms_bytes = SKETCH_MEMORY_BUDGET_BYTES - hll_bytes - heavy_hitter_limit * SKETCH_HEAVY_HITTER_ENTRY_BYTES
+    cms_width = cms_bytes // (8 * SKETCH_DEPTH)
+    if cms_width < 1:
+        print(f"!!! ERROR: SKETCH_MEMORY_BUDGET_BYTES={SKETCH_MEMORY_BUDGET_BYTES} is too small for the sketches.")
+        return
+
+    fingerprint = checkpoint.file_fingerprint(*(os.path.join(input_dir, f) for f in filenames))
+    counted = set()
+    for window_size in WINDOW_SIZES:
+        unit = f"sketch_WS{window_size}"
+        if journal is not None and journal.is_done(unit, fingerprint):
+            print(f"--- Window size {window_size} already sketched in '{output_root}'. Skipping.")
+            continue
+        print(f"--- Sketch counting, window size {window_size} for '{input_dir}' ---")
+        sketch = CountMinSketch(cms_width, SKETCH_DEPTH)
+        cardinalities = {group: HyperLogLog(SKETCH_HLL_PRECISION) for group in groups}
+        heavy_hitters = {}
+        admission = MINIMUM_OCCURRENCE_COUNT
+
+        with pipeline_telemetry.stage(f"sketch_{window_size}"):
+            for filename in filenames:
+                full_filepath = os.path.join(input_dir, filename)
+                with pipeline_telemetry.track_file(full_filepath):
+                    sequence_str = extract_sequence_from_split_file(full_filepath)
+                    count_factor_once(counted, full_filepath, sequence_str)
+                    if not sequence_str:
+                        pipeline_telemetry.record_skipped(full_filepath, "empty sequence")
+                        continue
+                    superclass_hll = cardinalities[get_superclass(filename)]
+                    for pattern, count in count_pattern_occurrences(sequence_str, window_size).items():
+                        code = encode_kmer(pattern)
+                        if code < 0:
+                            continue
+                        sketch.add(code, count)
+                        cardinalities["all"].add(code)
+                        superclass_hll.add(code)
+                        estimate = sketch.estimate(code)
+                        if estimate >= admission:
+                            heavy_hitters[code] = estimate
+                            if len(heavy_hitters) > heavy_hitter_limit:
+                                heavy_hitters, admission = prune_heavy_hitters(heavy_hitters, heavy_hitter_limit // 2)
+
+        max_overcount = sketch.epsilon * sketch.total
+        heavy_csv = os.path.join(output_root, f"sketch_heavy_hitters_WS{window_size}.csv")
+        with checkpoint.atomic_write(heavy_csv, newline='') as csvfile:
+            csvfile.write("kmer,estimated_count,max_overcount\n")
+            final = sorted(((sketch.estimate(code), code) for code in heavy_hitters), key=lambda item: (-item[0], item[1]))
+            for estimate, code in final:
+                csvfile.write(f"{decode_kmer(code, window_size)},{estimate},{max_overcount:.1f}\n")
+
+        cardinality_csv = os.path.join(output_root, f"sketch_distinct_kmers_WS{window_size}.csv")
+        with checkpoint.atomic_write(cardinality_csv, newline='') as csvfile:
+            csvfile.write("group,estimated_distinct_kmers,relative_standard_error\n")
+            for group in groups:
+                hll = cardinalities[group]
+                label = group if group == "all" else f"superclass_{group}"
+                csvfile.write(f"{label},{hll.estimate():.0f},{hll.relative_standard_error:.4f}\n")
+
+        report_path = os.path.join(output_root, f"sketch_report_WS{window_size}.txt")
+        with checkpoint.atomic_write(report_path) as report:
+            report.write(f"--- Sketch analysis for: {input_dir} ---\n")
+            report.write(f"Window Size: {window_size}\n")
+            report.write("=" * 50 + "\n\n")
+            report.write(f"Memory budget (bytes): {SKETCH_MEMORY_BUDGET_BYTES}\n")
+            report.write(f"Count-min sketch: width={cms_width}, depth={SKETCH_DEPTH}, total k-mers={sketch.total}\n")
+            report.write(f"  Each estimate overcounts by at most {max_overcount:.1f} (epsilon={sketch.epsilon:.3g} * total) "
+                         f"with probability {1 - sketch.delta:.4f}; it never undercounts.\n")
+            report.write(f"Heavy hitters: {len(final)} k-mers (list capped at {heavy_hitter_limit}). Every k-mer occurring "
+                         f"at least {admission} times is listed")
+            if admission > MINIMUM_OCCURRENCE_COUNT:
+                report.write(f"; the threshold was raised from {MINIMUM_OCCURRENCE_COUNT} because the list overflowed, "
+                             f"so k-mers occurring {MINIMUM_OCCURRENCE_COUNT}-{admission - 1} times may be missing")
+            report.write(".\n")
+            report.write(f"HyperLogLog: precision={SKETCH_HLL_PRECISION}, relative standard error "
+                         f"{cardinalities['all'].relative_standard_error:.2%} per group.\n")
+        for output_path in (heavy_csv, cardinality_csv, report_path):
+            pipeline_telemetry.record_written(output_path)
+        if journal is not None:
+            journal.mark_done(unit, [heavy_csv, cardinality_csv, report_path], fingerprint)
+        print(f"--- Wrote {heavy_csv}, {cardinality_csv} and {report_path} ---")
 
 if __name__ == "__main__":
-    
+    pipeline_telemetry.configure(f"{ANALYSIS_MODE}_window_analysis")
+    checkpoint.configure()
+
     for job in JOBS:
         print("\n" + "="*80)
         print(f"STARTING JOB FOR INPUT DIRECTORY: '{job['input_dir']}'")
         print("="*80)
-        perform_window_analysis_on_directory(job['input_dir'], job['output_dir'])
+        with checkpoint.journal(f"{ANALYSIS_MODE}_{job['input_dir']}") as journal, pipeline_telemetry.stage(job['input_dir']):
+            if ANALYSIS_MODE == "global":
+                perform_global_kmer_counting(job['input_dir'], job['global_output_dir'], journal)
+            elif ANALYSIS_MODE == "sketch":
+                perform_sketch_analysis_on_directory(job['input_dir'], job['sketch_output_dir'], journal)
+            else:
+                perform_window_analysis_on_directory(job['input_dir'], job['output_dir'], journal)
         print(f"\nJOB FOR '{job['input_dir']}' COMPLETE.")
 
     print("\n\n" + "*" * 50)
     print("All sliding window analyses are complete.")
-    print("*" * 50)
\ No newline at end of file
+    print("*" * 50)
+    pipeline_telemetry.finish()
\ No newline at end of file
@@ -1,16 +1,23 @@
 import os
 
+import archive_ingest
+import checkpoint
+import pipeline_telemetry
+
+# A directory, a .tar/.tar.gz/.tar.zst/.zip snapshot of it, or a single .gz/.bz2/.zst file.
 BASE_FOLDER: str = "/mnt/d/NR_HI_IU"
 OUTPUT_BASE_DIR: str = "DBD_Split"
 
 POSITION_COLUMN_INDEX: int = 4
 ANCHOR_COLUMN_INDEX: int = 7
 
-def extract_and_save_anchor_regions(filepath: str, output_root: str):
+def extract_and_save_anchor_regions(filepath: str, output_root: str, lines: list = None):
     """
     Reads a file, identifies each transcription factor using only the POS_IU
     column, isolates when column 8 is "Yes", and saves only the DBD region to an organized directory.
+    Returns the paths written, or None if the file could not be processed.
     """
+    written = []
     try:
         family_name = os.path.basename(os.path.dirname(filepath))
         base_name, _ = os.path.splitext(os.path.basename(filepath))
@@ -18,8 +25,9 @@ def extract_and_save_anchor_regions(filepath: str, output_root: str):
         output_directory = os.path.join(output_root, family_name)
         os.makedirs(output_directory, exist_ok=True)
 
-        with open(filepath, 'r') as f:
-            lines = f.readlines()
+        if lines is None:
+            with open(filepath, 'r') as f:
+                lines = f.readlines()
 
         NEW_HEADER = "POS_IU\tRES_IU\tIU\tANCHOR\n"
         all_residue_lines = []
@@ -30,7 +38,8 @@ def extract_and_save_anchor_regions(filepath: str, output_root: str):
                     all_residue_lines.append(line)
         
         if not all_residue_lines:
-            return
+            pipeline_telemetry.record_skipped(filepath, "no residue rows")
+            return written
 
         factor_start_indices = [0]
         for i in range(1, len(all_residue_lines)):
@@ -42,6 +51,9 @@ def extract_and_save_anchor_regions(filepath: str, output_root: str):
             except (ValueError, IndexError):
                 continue
 
+        pipeline_telemetry.add("factors", len(factor_start_indices))
+        pipeline_telemetry.add("residues", len(all_residue_lines))
+
         for i in range(len(factor_start_indices)):
             factor_num = i + 1
             
@@ -67,26 +79,35 @@ def extract_and_save_anchor_regions(filepath: str, output_root: str):
             output_filename = f"{base_name}_TF_{factor_num}_ANCHOR.txt"
             full_output_path = os.path.join(output_directory, output_filename)
             
-            with open(full_output_path, 'w') as out_file:
+            with checkpoint.atomic_write(full_output_path, sync=False) as out_file:
                 out_file.write(NEW_HEADER)
                 out_file.writelines(reformatted_anchor_lines)
+            pipeline_telemetry.record_written(full_output_path)
+            written.append(full_output_path)
 
     except Exception as e:
         print(f"!!! An error occurred while processing the file {filepath}: {e}")
+        pipeline_telemetry.record_error(filepath, e)
+        return None
+    return written
 
 if __name__ == "__main__":
-    
+    pipeline_telemetry.configure("dbd_split")
+    checkpoint.configure()
+
     os.makedirs(OUTPUT_BASE_DIR, exist_ok=True)
     print(f"All extracted ANCHOR regions will be saved in the '{OUTPUT_BASE_DIR}' directory.")
 
-    for dirpath, _, filenames in os.walk(BASE_FOLDER):
-        for filename in filenames:
-            if filename.endswith(".txt"):
-                full_filepath = os.path.join(dirpath, filename)
-                print(f"--- Processing: {full_filepath} ---")
-                
-                extract_and_save_anchor_regions(full_filepath, OUTPUT_BASE_DIR)
+    with checkpoint.journal("dbd_split") as journal, pipeline_telemetry.stage("dbd_split"):
+        for member in archive_ingest.iter_raw_members(BASE_FOLDER, skip=journal.is_done):
+            print(f"--- Processing: {member.path} ---")
+
+            with pipeline_telemetry.track_file(member.path, member.size):
+                written = extract_and_save_anchor_regions(member.path, OUTPUT_BASE_DIR, member.lines)
+            if written is not None:
+                journal.mark_done(member.path, written, member.fingerprint)
 
     print("\n\n" + "*" * 50)
     print("ANCHOR region extraction and reformatting is complete.")
-    print("*" * 50)
\ No newline at end of file
+    print("*" * 50)
+    pipeline_telemetry.finish()
\ No newline at end of file
@@ -0,0 +1,142 @@
+import os
+import csv
+
+import numpy as np
+
+import fused_analysis
+import pipeline_telemetry
+
+SEGMENT_OUTPUT_CSV: str = "disorder_segments.csv"
+# A segment is a run of at least SEGMENT_MIN_LENGTH residues whose (smoothed)
+# IU score is above the cutoff.
+SEGMENT_MIN_LENGTH: int = 20
+DISORDER_CUTOFF: float = fused_analysis.DISORDER_CUTOFF
+# Width of the centred moving average applied to the IU scores before the
+# cutoff (odd; 1 disables smoothing). The window is clipped at factor ends.
+SMOOTHING_WINDOW: int = 1
+
+class ResidueArrayAccumulator(fused_analysis.Accumulator):
+    """Collects the POS_IU and IU columns of every factor for one vectorized pass."""
+
+    name = "residue_arrays"
+
+    def __init__(self):
+        self.factors = []
+        self.positions = []
+        self.iu_scores = []
+
+    def add(self, factor: fused_analysis.RegionFactor):
+        if not factor.iu_scores:
+            return
+        self.factors.append((factor.region, factor.filename))
+        self.positions.append(np.asarray(factor.positions, dtype=np.int64))
+        self.iu_scores.append(np.asarray(factor.iu_scores, dtype=np.float64))
+
+    def arrays(self) -> tuple:
+        """Concatenated positions and IU scores, plus the start offset of every factor."""
+        lengths = np.array([len(scores) for scores in self.iu_scores], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        if not self.iu_scores:
+            return np.empty(0, dtype=np.int64), np.empty(0), offsets
+        return np.concatenate(self.positions), np.concatenate(self.iu_scores), offsets
+
+    def write(self, output_dir: str):
+        positions, iu_scores, offsets = self.arrays()
+        segments = detect_segments(iu_scores, offsets, positions)
+        output_csv = os.path.join(output_dir, SEGMENT_OUTPUT_CSV)
+        write_segment_table(output_csv, segments, self.factors, positions)
+
+def contiguous_pieces(positions: np.ndarray, offsets: np.ndarray) -> tuple:
+    """
+    Splits the residue array into pieces of consecutive POS_IU values: a piece
+    ends at every factor end and wherever POS_IU jumps (e.g. around the DBD cut
+    out of a non-DBD file). Returns the piece of every residue and the piece offsets.
+    """
+    starts = np.zeros(len(positions), dtype=bool)
+    starts[offsets[:-1][offsets[:-1] < len(positions)]] = True
+    if len(positions):
+        starts[0] = True
+        starts[1:] |= positions[1:] != positions[:-1] + 1
+    piece_offsets = np.append(np.flatnonzero(starts), len(positions))
+    return np.cumsum(starts) - 1, piece_offsets
+
+def smooth_scores(iu_scores: np.ndarray, piece_ids: np.ndarray, piece_offsets: np.ndarray, window: int) -> np.ndarray:
+    """
+    Centred moving average of the concatenated scores. The box filter is
+    evaluated as a difference of prefix sums, so each residue's window can be
+    clipped to its own contiguous piece and no scores leak across factor
+    boundaries or POS_IU gaps.
+    """
+    if window <= 1:
+        return iu_scores
+    half = window // 2
+    prefix = np.concatenate(([0.0], np.cumsum(iu_scores)))
+    index = np.arange(len(iu_scores))
+    lo = np.maximum(index - half, piece_offsets[piece_ids])
+    hi = np.minimum(index + half + 1, piece_offsets[piece_ids + 1])
+    return (prefix[hi] - prefix[lo]) / (hi - lo)
+
+def detect_segments(iu_scores: np.ndarray, offsets: np.ndarray, positions: np.ndarray, min_length: int = SEGMENT_MIN_LENGTH,
+                    cutoff: float = DISORDER_CUTOFF, window: int = SMOOTHING_WINDOW) -> dict:
+    """
+    Finds every disordered segment of every factor at once. The scores of all
+    factors are one array; a run-length encoding of the disordered mask, with an
+    extra break at each factor start and at each gap in POS_IU, gives the runs.
+    Returns parallel arrays of factor index, start and end (exclusive) offsets
+    into the residue array, and mean raw IU score.
+    """
+    factor_ids = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    piece_ids, piece_offsets = contiguous_pieces(positions, offsets)
+    disordered = smooth_scores(iu_scores, piece_ids, piece_offsets, window) > cutoff
+
+    breaks = np.ones(len(disordered), dtype=bool)
+    breaks[1:] = (disordered[1:] != disordered[:-1]) | (piece_ids[1:] != piece_ids[:-1])
+    run_starts = np.flatnonzero(breaks)
+    run_ends = np.append(run_starts[1:], len(disordered))
+    keep = disordered[run_starts] & (run_ends - run_starts >= min_length)
+    starts, ends = run_starts[keep], run_ends[keep]
+
+    prefix = np.concatenate(([0.0], np.cumsum(iu_scores)))
+    return {
+        "factor": factor_ids[starts],
+        "start": starts,
+        "end": ends,
+        "mean_iu": (prefix[ends] - prefix[starts]) / (ends - starts)
+    }
+
+def write_segment_table(output_csv: str, segments: dict, factors: list, positions: np.ndarray):
+    with open(output_csv, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['region', 'filename', 'start_pos_iu', 'end_pos_iu', 'length', 'mean_iu'])
+        for factor, start, end, mean_iu in zip(segments["factor"].tolist(), segments["start"].tolist(),
+                                               segments["end"].tolist(), segments["mean_iu"].tolist()):
+            region, filename = factors[factor]
+            writer.writerow([region, filename, positions[start], positions[end - 1], end - start, f"{mean_iu:.4f}"])
+    pipeline_telemetry.record_written(output_csv)
+
+if __name__ == "__main__":
+    pipeline_telemetry.configure("disorder_segments")
+
+    accumulator = ResidueArrayAccumulator()
+    with pipeline_telemetry.stage("scan"):
+        totals = fused_analysis.run_fused_analysis([accumulator])
+    print(f"Read {totals['factors']} factors ({totals['residues']} residues).")
+
+    with pipeline_telemetry.stage("detect"):
+        positions, iu_scores, offsets = accumulator.arrays()
+        segments = detect_segments(iu_scores, offsets, positions)
+
+    with pipeline_telemetry.stage("write"):
+        write_segment_table(SEGMENT_OUTPUT_CSV, segments, accumulator.factors, positions)
+
+    region_counts = {}
+    for factor in segments["factor"].tolist():
+        region = accumulator.factors[factor][0]
+        region_counts[region] = region_counts.get(region, 0) + 1
+    for region, count in sorted(region_counts.items()):
+        print(f"--- {region}: {count} disordered segments of >= {SEGMENT_MIN_LENGTH} residues ---")
+
+    print("\n\n" + "*" * 50)
+    print(f"Disorder segments saved to '{SEGMENT_OUTPUT_CSV}'.")
+    print("*" * 50)
+    pipeline_telemetry.finish()
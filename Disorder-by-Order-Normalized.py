@@ -1,8 +1,13 @@
 import os
-import collections
+import csv
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+import pipeline_telemetry
+
 JOBS = [
     {
         "input_dir": "DBD-Region",
@@ -44,11 +49,76 @@ AMINO_ACID_ORDER_BY_DISORDER = [
 RESIDUE_COLUMN_INDEX: int = 1
 IU_COLUMN_INDEX: int = 2
 
-def analyze_superclass_normalized_disorder(superclass_prefix: str, input_dir: str, output_dir: str, region_name: str):
+# Bootstrap confidence intervals: transcription factors are resampled with
+# replacement within each superclass. 0 replicates disables the bootstrap.
+BOOTSTRAP_REPLICATES: int = 0
+BOOTSTRAP_CONFIDENCE: float = 0.95
+BOOTSTRAP_CHUNK_REPLICATES: int = 1000
+BOOTSTRAP_WORKERS: int = os.cpu_count() or 1
+BOOTSTRAP_SEED: int = 0
+
+# Count matrix columns: the 20 amino acids, then every other residue symbol
+# (those only enter the Otot / Dtot totals).
+AMINO_ACID_COLUMNS = {aa: i for i, aa in enumerate(AMINO_ACID_ORDER_BY_DISORDER)}
+OTHER_RESIDUE_COLUMN: int = len(AMINO_ACID_ORDER_BY_DISORDER)
+
+def normalized_scores_from_counts(ordered: np.ndarray, disordered: np.ndarray) -> np.ndarray:
+    """
+    (Di/Dtot - Oi/Otot) / (Di/Dtot + Oi/Otot) per amino acid, for count vectors
+    of shape (..., 21); returns shape (..., 20). Zero totals or denominators give 0.
+    """
+    ordered = np.asarray(ordered, dtype=np.float64)
+    disordered = np.asarray(disordered, dtype=np.float64)
+    total_ordered = ordered.sum(axis=-1, keepdims=True)
+    total_disordered = disordered.sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        freq_ordered = np.where(total_ordered > 0, ordered[..., :OTHER_RESIDUE_COLUMN] / total_ordered, 0.0)
+        freq_disordered = np.where(total_disordered > 0, disordered[..., :OTHER_RESIDUE_COLUMN] / total_disordered, 0.0)
+        denominator = freq_disordered + freq_ordered
+        return np.where(denominator > 0, (freq_disordered - freq_ordered) / denominator, 0.0)
+
+def bootstrap_chunk(ordered: np.ndarray, disordered: np.ndarray, replicates: int, seed) -> np.ndarray:
+    """
+    Scores of `replicates` bootstrap samples at once. Each replicate draws F
+    factor indices with replacement; the draws become an (R, F) weight matrix,
+    and the resampled totals are the products weights @ counts.
+    """
+    factor_count = len(ordered)
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, factor_count, size=(replicates, factor_count))
+    draws += (np.arange(replicates) * factor_count)[:, None]
+    weights = np.bincount(draws.ravel(), minlength=replicates * factor_count).reshape(replicates, factor_count)
+    return normalized_scores_from_counts(weights @ ordered, weights @ disordered)
+
+def bootstrap_normalized_scores(ordered: np.ndarray, disordered: np.ndarray, replicates: int = BOOTSTRAP_REPLICATES,
+                                executor: ProcessPoolExecutor = None, seed: int = BOOTSTRAP_SEED) -> np.ndarray:
+    """
+    (replicates, 20) bootstrap scores for one superclass. The replicates are split
+    into chunks of BOOTSTRAP_CHUNK_REPLICATES, each with its own child seed, so
+    the result does not depend on whether or how the chunks run in parallel.
+    """
+    chunk_sizes = [min(BOOTSTRAP_CHUNK_REPLICATES, replicates - start) for start in range(0, replicates, BOOTSTRAP_CHUNK_REPLICATES)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    arguments = ([ordered] * len(chunk_sizes), [disordered] * len(chunk_sizes), chunk_sizes, seeds)
+    if executor is not None:
+        chunks = list(executor.map(bootstrap_chunk, *arguments))
+    else:
+        chunks = list(map(bootstrap_chunk, *arguments))
+    return np.concatenate(chunks)
+
+def confidence_intervals(replicate_scores: np.ndarray, confidence: float = BOOTSTRAP_CONFIDENCE) -> tuple:
+    """Percentile intervals and standard errors per amino acid."""
+    tail = (1.0 - confidence) / 2.0 * 100.0
+    lower, upper = np.percentile(replicate_scores, [tail, 100.0 - tail], axis=0)
+    return lower, upper, replicate_scores.std(axis=0, ddof=1)
+
+def analyze_superclass_normalized_disorder(superclass_prefix: str, input_dir: str, output_dir: str, region_name: str,
+                                           executor: ProcessPoolExecutor = None):
     print(f"\n--- Analyzing Superclass '{superclass_prefix.strip('.')}' in '{region_name}' ---")
 
-    individual_ordered_counts = collections.Counter()
-    individual_disordered_counts = collections.Counter()
+    # One row of ordered / disordered residue counts per transcription factor.
+    factor_ordered_counts = []
+    factor_disordered_counts = []
     
     files_to_process = [f for f in os.listdir(input_dir) if f.startswith(superclass_prefix) and f.endswith(".txt")]
 
@@ -60,73 +130,100 @@ def analyze_superclass_normalized_disorder(superclass_prefix: str, input_dir: st
 
     for filename in files_to_process:
         filepath = os.path.join(input_dir, filename)
-        try:
-            with open(filepath, 'r') as f:
-                lines = f.readlines()[1:]
-                for line in lines:
-                    parts = line.split()
-                    if len(parts) > max(RESIDUE_COLUMN_INDEX, IU_COLUMN_INDEX):
-                        try:
-                            residue = parts[RESIDUE_COLUMN_INDEX]
-                            iu_score = float(parts[IU_COLUMN_INDEX])
-                            
-                            if iu_score < 0.5:
-                                individual_ordered_counts[residue] += 1
-                            else:
-                                individual_disordered_counts[residue] += 1
-                        except (ValueError, IndexError):
-                            continue
-        except Exception as e:
-            print(f"!!! Warning: Could not process {filename}: {e}")
-
-    total_ordered_count = sum(individual_ordered_counts.values())
-    total_disordered_count = sum(individual_disordered_counts.values())
-
-    scores = {}
-    for aa in AMINO_ACID_ORDER_BY_DISORDER:
-        Di = individual_disordered_counts.get(aa, 0)
-        Oi = individual_ordered_counts.get(aa, 0)
-        
-        freq_disordered = Di / total_disordered_count if total_disordered_count > 0 else 0.0
-        freq_ordered = Oi / total_ordered_count if total_ordered_count > 0 else 0.0
-        
-        numerator = freq_disordered - freq_ordered
-        denominator = freq_disordered + freq_ordered
+        with pipeline_telemetry.track_file(filepath):
+            individual_ordered_counts = np.zeros(OTHER_RESIDUE_COLUMN + 1, dtype=np.int64)
+            individual_disordered_counts = np.zeros(OTHER_RESIDUE_COLUMN + 1, dtype=np.int64)
+            try:
+                with open(filepath, 'r') as f:
+                    lines = f.readlines()[1:]
+                    for line in lines:
+                        parts = line.split()
+                        if len(parts) > max(RESIDUE_COLUMN_INDEX, IU_COLUMN_INDEX):
+                            try:
+                                residue = parts[RESIDUE_COLUMN_INDEX]
+                                iu_score = float(parts[IU_COLUMN_INDEX])
+                                column = AMINO_ACID_COLUMNS.get(residue, OTHER_RESIDUE_COLUMN)
+
+                                if iu_score < 0.5:
+                                    individual_ordered_counts[column] += 1
+                                else:
+                                    individual_disordered_counts[column] += 1
+                            except (ValueError, IndexError):
+                                continue
+                factor_ordered_counts.append(individual_ordered_counts)
+                factor_disordered_counts.append(individual_disordered_counts)
+                pipeline_telemetry.add("factors")
+                pipeline_telemetry.add("residues", len(lines))
+            except Exception as e:
+                print(f"!!! Warning: Could not process {filename}: {e}")
+                pipeline_telemetry.record_error(filepath, e)
+
+    if not factor_ordered_counts:
+        print(f"No readable files for this superclass. Skipping.")
+        return
+
+    ordered_matrix = np.vstack(factor_ordered_counts)
+    disordered_matrix = np.vstack(factor_disordered_counts)
+    scores = dict(zip(AMINO_ACID_ORDER_BY_DISORDER,
+                      normalized_scores_from_counts(ordered_matrix.sum(axis=0), disordered_matrix.sum(axis=0)).tolist()))
 
-        score = numerator / denominator if denominator > 0 else 0.0
-        scores[aa] = score
+    intervals = None
+    if BOOTSTRAP_REPLICATES > 0:
+        with pipeline_telemetry.stage("bootstrap"):
+            replicate_scores = bootstrap_normalized_scores(ordered_matrix, disordered_matrix, BOOTSTRAP_REPLICATES, executor)
+            intervals = confidence_intervals(replicate_scores)
+            output_csv = os.path.join(output_dir, f"superclass_{superclass_prefix.strip('.')}_normalized_scores_bootstrap.csv")
+            with open(output_csv, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['amino_acid', 'normalized_score', 'ci_lower', 'ci_upper', 'std_error',
+                                 'confidence', 'replicates', 'factors'])
+                for i, aa in enumerate(AMINO_ACID_ORDER_BY_DISORDER):
+                    writer.writerow([aa, f"{scores[aa]:+.4f}", f"{intervals[0][i]:+.4f}", f"{intervals[1][i]:+.4f}",
+                                     f"{intervals[2][i]:.4f}", BOOTSTRAP_CONFIDENCE, BOOTSTRAP_REPLICATES, len(ordered_matrix)])
+            pipeline_telemetry.record_written(output_csv)
+        print(f"Bootstrap confidence intervals ({BOOTSTRAP_REPLICATES} replicates over {len(ordered_matrix)} factors) saved to '{output_csv}'")
         
-    plt.figure(figsize=(15, 8))
-    ax = sns.barplot(x=list(scores.keys()), y=list(scores.values()), palette="coolwarm_r")
+    with pipeline_telemetry.stage("plot"):
+        plt.figure(figsize=(15, 8))
+        ax = sns.barplot(x=list(scores.keys()), y=list(scores.values()), palette="coolwarm_r")
+        if intervals is not None:
+            values = np.array(list(scores.values()))
+            ax.errorbar(x=np.arange(len(values)), y=values, yerr=[values - intervals[0], intervals[1] - values],
+                        fmt='none', ecolor='black', elinewidth=1.0, capsize=3)
     
-    plt.axhline(0.0, color='black', linestyle='--', linewidth=1.0)
+        plt.axhline(0.0, color='black', linestyle='--', linewidth=1.0)
     
-    plt.title(f"Normalized Disorder Preference Score in {region_name}\n(Superclass {superclass_prefix.strip('.')})", fontsize=16)
-    plt.xlabel("Amino Acid", fontsize=12)
-    plt.ylabel("Preference Score (-1=Ordered, 1=Disordered)", fontsize=12)
-    plt.ylim(-1, 1)
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-    for bar in ax.patches:
-        height = bar.get_height()
-        ax.text(
-            x=bar.get_x() + bar.get_width() / 2,
-            y=height,
-            s=f'{height:+.2f}',
-            ha='center',
-            va='bottom' if height >= 0 else 'top',
-            fontsize=8
-        )
-
-    output_filename = f"superclass_{superclass_prefix.strip('.')}_normalized_scores.png"
-    full_output_path = os.path.join(output_dir, output_filename)
-    plt.savefig(full_output_path, bbox_inches='tight')
-    plt.close()
+        plt.title(f"Normalized Disorder Preference Score in {region_name}\n(Superclass {superclass_prefix.strip('.')})", fontsize=16)
+        plt.xlabel("Amino Acid", fontsize=12)
+        plt.ylabel("Preference Score (-1=Ordered, 1=Disordered)", fontsize=12)
+        plt.ylim(-1, 1)
+        plt.grid(axis='y', linestyle='--', alpha=0.7)
+
+        for bar in ax.patches:
+            height = bar.get_height()
+            ax.text(
+                x=bar.get_x() + bar.get_width() / 2,
+                y=height,
+                s=f'{height:+.2f}',
+                ha='center',
+                va='bottom' if height >= 0 else 'top',
+                fontsize=8
+            )
+
+        output_filename = f"superclass_{superclass_prefix.strip('.')}_normalized_scores.png"
+        full_output_path = os.path.join(output_dir, output_filename)
+        plt.savefig(full_output_path, bbox_inches='tight')
+        plt.close()
+    pipeline_telemetry.record_written(full_output_path)
     print(f"Plot saved to '{full_output_path}'")
 
 if __name__ == "__main__":
-    
+    pipeline_telemetry.configure("normalized_scores")
+
     os.makedirs(OUTPUT_BASE_DIR, exist_ok=True)
+    executor = None
+    if BOOTSTRAP_REPLICATES > 0 and BOOTSTRAP_WORKERS > 1:
+        executor = ProcessPoolExecutor(max_workers=BOOTSTRAP_WORKERS)
     
     for job in JOBS:
         input_dir = job["input_dir"]
@@ -145,11 +242,16 @@ if __name__ == "__main__":
         os.makedirs(job_output_dir, exist_ok=True)
         print(f"Normalized score plots will be saved in '{job_output_dir}'")
         
-        for superclass in SUPERCLASSES:
-            analyze_superclass_normalized_disorder(superclass, input_dir, job_output_dir, region_name)
+        with pipeline_telemetry.stage(region_name):
+            for superclass in SUPERCLASSES:
+                analyze_superclass_normalized_disorder(superclass, input_dir, job_output_dir, region_name, executor)
         
         print(f"\nJOB FOR '{region_name}' COMPLETE.")
 
+    if executor is not None:
+        executor.shutdown()
+
     print("\n\n" + "*" * 50)
     print("All analyses are complete.")
-    print("*" * 50)
\ No newline at end of file
+    print("*" * 50)
+    pipeline_telemetry.finish()
\ No newline at end of file
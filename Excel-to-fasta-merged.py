@@ -1,6 +1,8 @@
 # SCRIPT: merge_sequences.py
 import pandas as pd
 
+import pipeline_telemetry
+
 # --- CONFIGURATION ---
 EXCEL_FILE: str = "Human-TFs-PDB.xls"
 FASTA_FILE: str = "ExtraIDs.fasta"
@@ -41,11 +43,16 @@ def parse_fasta_file(fasta_filepath: str) -> dict:
         return None
 
 if __name__ == "__main__":
+    pipeline_telemetry.configure("merge_sequences")
     
+    pipeline_telemetry.begin(pipeline_telemetry.stage("parse_fasta"), pipeline_telemetry.track_file(FASTA_FILE))
     fasta_sequences = parse_fasta_file(FASTA_FILE)
+    pipeline_telemetry.end()
     if fasta_sequences is None:
+        pipeline_telemetry.finish()
         exit()
 
+    pipeline_telemetry.begin(pipeline_telemetry.stage("merge"), pipeline_telemetry.track_file(EXCEL_FILE))
     try:
         print(f"Reading sheets from {EXCEL_FILE}...")
         xls = pd.ExcelFile(EXCEL_FILE, engine='xlrd')
@@ -53,6 +60,7 @@ if __name__ == "__main__":
         if TARGET_SHEET not in xls.sheet_names or EXTRA_IDS_SHEET not in xls.sheet_names:
             print(f"!!! ERROR: One or both required sheets ('{TARGET_SHEET}', '{EXTRA_IDS_SHEET}') not found.")
             print(f"    Available sheets are: {xls.sheet_names}")
+            pipeline_telemetry.finish()
             exit()
             
         main_df = pd.read_excel(xls, sheet_name=TARGET_SHEET)
@@ -104,6 +112,7 @@ if __name__ == "__main__":
             if not match_found_for_this_id:
                  print(f"  - WARNING: No sequence found in FASTA file for ID starting with '{excel_id_str}'.")
 
+        pipeline_telemetry.add("factors", found_count)
         print(f"\nFound {found_count} new sequences to add.")
 
         if new_rows:
@@ -114,6 +123,7 @@ if __name__ == "__main__":
             print(f"Saving combined data to '{output_excel_file}'...")
             
             combined_df.to_excel(output_excel_file, sheet_name=TARGET_SHEET, index=False, engine='openpyxl')
+            pipeline_telemetry.record_written(output_excel_file)
             
             print("\n" + "="*50)
             print("Merge complete!")
@@ -123,7 +133,12 @@ if __name__ == "__main__":
         else:
             print("\nNo new sequences were added. The output file was not created.")
 
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         print(f"!!! ERROR: Excel file not found at '{EXCEL_FILE}'")
+        pipeline_telemetry.record_error(EXCEL_FILE, e)
     except Exception as e:
-        print(f"!!! An unexpected error occurred: {e}")
\ No newline at end of file
+        print(f"!!! An unexpected error occurred: {e}")
+        pipeline_telemetry.record_error(EXCEL_FILE, e)
+    pipeline_telemetry.end()
+
+    pipeline_telemetry.finish()
@@ -0,0 +1,212 @@
+import os
+import csv
+import json
+import argparse
+import collections
+
+import checkpoint
+import fused_analysis
+import pipeline_telemetry
+
+CUBE_FILE: str = "hierarchy_cube.json"
+CUBE_WINDOW_SIZE: int = 3
+MINIMUM_OCCURRENCE_COUNT: int = 3
+ROOT_NODE: str = "all"
+
+def new_cell() -> dict:
+    return {
+        "factors": 0,
+        "residues": 0,
+        "disordered_residues": 0,
+        "ordered": collections.Counter(),
+        "disordered": collections.Counter(),
+        "kmers": collections.Counter()
+    }
+
+def add_cell(target: dict, source: dict):
+    for key in ("factors", "residues", "disordered_residues"):
+        target[key] += source[key]
+    for key in ("ordered", "disordered", "kmers"):
+        target[key].update(source[key])
+
+class SubfamilyCellAccumulator(fused_analysis.Accumulator):
+    """
+    Collects the additive statistics of every factor into its finest-level
+    (subfamily) cell; everything above is derived by summing cells.
+    """
+
+    name = "subfamily_cells"
+
+    def __init__(self, window_size: int = CUBE_WINDOW_SIZE):
+        self.window_size = window_size
+        self.cells = {}
+
+    def add(self, factor: fused_analysis.RegionFactor):
+        key = (factor.region, factor.hierarchy[-1])
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = new_cell()
+
+        cell["factors"] += 1
+        cell["residues"] += len(factor.iu_scores)
+        for residue, iu_score in zip(factor.sequence, factor.iu_scores):
+            if iu_score > fused_analysis.DISORDER_CUTOFF:
+                cell["disordered_residues"] += 1
+            if iu_score < fused_analysis.DISORDER_CUTOFF:
+                cell["ordered"][residue] += 1
+            else:
+                cell["disordered"][residue] += 1
+
+        sequence = factor.sequence
+        kmers = cell["kmers"]
+        for i in range(len(sequence) - self.window_size + 1):
+            kmers[sequence[i : i + self.window_size]] += 1
+
+    def write(self, output_dir: str):
+        output_path = os.path.join(output_dir, CUBE_FILE)
+        save_cube(rollup_cells(self.cells, self.window_size), output_path)
+        pipeline_telemetry.record_written(output_path)
+
+def ancestors(node: str) -> list:
+    """'1.2.1.1' -> ['all', '1', '1.2', '1.2.1', '1.2.1.1']."""
+    levels = node.split(".")
+    return [ROOT_NODE] + [".".join(levels[:i + 1]) for i in range(len(levels))]
+
+def rollup_cells(cells: dict, window_size: int = CUBE_WINDOW_SIZE) -> dict:
+    """Sums the (region, subfamily) cells into every ancestor node of the hierarchy."""
+    cube = collections.defaultdict(dict)
+    for (region, subfamily), cell in sorted(cells.items()):
+        for node in ancestors(subfamily):
+            target = cube[region].get(node)
+            if target is None:
+                target = cube[region][node] = new_cell()
+            add_cell(target, cell)
+    return {"window_size": window_size, "regions": dict(cube)}
+
+def region_fingerprint(region_dirs: dict = None) -> str:
+    """Fingerprint of every region file; a saved cube built from a different one is stale."""
+    region_dirs = fused_analysis.REGION_DIRS if region_dirs is None else region_dirs
+    paths = [os.path.join(input_dir, filename) for input_dir in region_dirs.values() if os.path.isdir(input_dir)
+             for filename in sorted(os.listdir(input_dir)) if filename.endswith(".txt")]
+    return checkpoint.file_fingerprint(*paths)
+
+def build_cube(region_dirs: dict = None, window_size: int = CUBE_WINDOW_SIZE) -> dict:
+    """Scans the regions once and rolls the subfamily cells up every hierarchy level."""
+    fingerprint = region_fingerprint(region_dirs)
+    accumulator = SubfamilyCellAccumulator(window_size)
+    totals = fused_analysis.run_fused_analysis([accumulator], region_dirs)
+    print(f"Read {totals['factors']} factors ({totals['residues']} residues) into {len(accumulator.cells)} subfamily cells.")
+    cube = rollup_cells(accumulator.cells, window_size)
+    cube["input"] = fingerprint
+    return cube
+
+def save_cube(cube: dict, path: str = CUBE_FILE):
+    with open(path, 'w') as f:
+        json.dump(cube, f, sort_keys=True)
+
+def load_cube(path: str = CUBE_FILE) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def get_cell(cube: dict, region: str, node: str) -> dict:
+    try:
+        return cube["regions"][region][node]
+    except KeyError:
+        raise KeyError(f"No data for node '{node}' in region '{region}'.") from None
+
+def disorder_ratio(cube: dict, region: str, node: str) -> float:
+    cell = get_cell(cube, region, node)
+    if cell["residues"] == 0:
+        return -1.0
+    return cell["disordered_residues"] / cell["residues"]
+
+def normalized_scores(cube: dict, region: str, node: str) -> dict:
+    """(Di/Dtot - Oi/Otot) / (Di/Dtot + Oi/Otot) per amino acid, from the rolled-up counts."""
+    cell = get_cell(cube, region, node)
+    total_ordered_count = sum(cell["ordered"].values())
+    total_disordered_count = sum(cell["disordered"].values())
+
+    scores = {}
+    for aa in fused_analysis.AMINO_ACID_ORDER_BY_DISORDER:
+        Di = cell["disordered"].get(aa, 0)
+        Oi = cell["ordered"].get(aa, 0)
+        freq_disordered = Di / total_disordered_count if total_disordered_count > 0 else 0.0
+        freq_ordered = Oi / total_ordered_count if total_ordered_count > 0 else 0.0
+        denominator = freq_disordered + freq_ordered
+        scores[aa] = (freq_disordered - freq_ordered) / denominator if denominator > 0 else 0.0
+    return scores
+
+def children(cube: dict, region: str, node: str) -> list:
+    depth = 0 if node == ROOT_NODE else node.count(".") + 1
+    prefix = "" if node == ROOT_NODE else node + "."
+    return sorted(n for n in cube["regions"][region]
+                  if n != ROOT_NODE and n.startswith(prefix) and n.count(".") == depth)
+
+def occurrence_table(cube: dict, region: str, node: str) -> tuple:
+    """
+    Header and rows in the layout of Occurence-CSV-generator.py, one row per
+    child of `node`; columns are the k-mers occurring >= MINIMUM_OCCURRENCE_COUNT
+    times in `node`.
+    """
+    cell = get_cell(cube, region, node)
+    header_kmers = sorted(k for k, count in cell["kmers"].items() if count >= MINIMUM_OCCURRENCE_COUNT)
+    rows = []
+    for child in children(cube, region, node):
+        child_kmers = cube["regions"][region][child]["kmers"]
+        rows.append([child] + [child_kmers.get(kmer, 0) for kmer in header_kmers])
+    return ['node'] + header_kmers, rows
+
+if __name__ == "__main__":
+    pipeline_telemetry.configure("rollup_cube")
+
+    parser = argparse.ArgumentParser(description="Build or query the superclass/class/family/subfamily rollup cube.")
+    parser.add_argument("--rebuild", action="store_true", help="Rescan the region directories even if the cube file exists.")
+    parser.add_argument("--region", choices=list(fused_analysis.REGION_DIRS), help="Region to query.")
+    parser.add_argument("--node", help="Hierarchy node to query, e.g. 'all', '2', '2.1' or '2.1.3'.")
+    parser.add_argument("--metric", choices=["disorder", "normalized", "occurrence"], default="normalized")
+    parser.add_argument("--output-csv", help="Write the query result to this CSV instead of printing it.")
+    args = parser.parse_args()
+
+    cube = None
+    if not args.rebuild and os.path.exists(CUBE_FILE):
+        with pipeline_telemetry.stage("load"):
+            cube = load_cube()
+        if cube.get("input") != region_fingerprint():
+            print(f"--- The region files have changed since '{CUBE_FILE}' was built. Rebuilding it.")
+            cube = None
+    if cube is None:
+        with pipeline_telemetry.stage("build"):
+            cube = build_cube()
+            save_cube(cube)
+            pipeline_telemetry.record_written(CUBE_FILE)
+        print(f"Saved the rollup cube to '{CUBE_FILE}'.")
+
+    if args.region and args.node:
+        try:
+            if args.metric == "disorder":
+                header = ['node', 'disorder_percentage']
+                rows = [[args.node, f"{disorder_ratio(cube, args.region, args.node) * 100.0:.2f}"]]
+            elif args.metric == "normalized":
+                header = ['amino_acid', 'normalized_score']
+                rows = [[aa, f"{score:+.4f}"] for aa, score in normalized_scores(cube, args.region, args.node).items()]
+            else:
+                header, rows = occurrence_table(cube, args.region, args.node)
+        except KeyError as e:
+            print(f"!!! ERROR: {e.args[0]}")
+            print(f"    Nodes look like '{ROOT_NODE}', '2', '2.1' or '2.1.3'.")
+            pipeline_telemetry.finish()
+            exit()
+
+        if args.output_csv:
+            with open(args.output_csv, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(header)
+                writer.writerows(rows)
+            pipeline_telemetry.record_written(args.output_csv)
+            print(f"--- Successfully created {args.output_csv} ---")
+        else:
+            print("\t".join(header))
+            for row in rows:
+                print("\t".join(str(value) for value in row))
+
+    pipeline_telemetry.finish()
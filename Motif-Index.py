@@ -0,0 +1,424 @@
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+
+import numpy as np
+
+import fused_analysis
+import pipeline_telemetry
+
+# Motif index over every region sequence. All factors are concatenated into one
+# text, each followed by a separator; a suffix array, its LCP array and an
+# FM-index (BWT plus sampled occurrence counts) are built once and memory-mapped
+# by the queries. Motifs of any length, with wildcards and residue classes, are
+# counted by backward search and located through the suffix array; k-mer counts
+# for any k are read off the suffix array and LCP array without recounting.
+
+INDEX_DIR: str = "motif_index"
+SEPARATOR: bytes = b"$"
+# The BWT occurrence counts are stored every OCC_SAMPLE rows; a rank query scans
+# at most OCC_SAMPLE - 1 BWT bytes past the sample.
+OCC_SAMPLE: int = 64
+# Hits listed per motif (0: all). The count always covers every occurrence.
+MAX_HITS: int = 1000
+# Upper bound on the fixed-length variants a motif with x(m,n) repeats expands to.
+MAX_MOTIF_VARIANTS: int = 256
+# Degenerate residue codes accepted in motifs, besides 'x', '.' and [...] classes.
+DEGENERATE_RESIDUES = {
+    "B": "DNB",
+    "Z": "EQZ",
+    "J": "ILJ"
+}
+
+class MotifTextAccumulator(fused_analysis.Accumulator):
+    """Residues and POS_IU values of every factor, in scan order."""
+
+    name = "motif_text"
+
+    def __init__(self):
+        self.factors = []
+        self.sequences = []
+        self.positions = []
+
+    def add(self, factor: fused_analysis.RegionFactor):
+        self.factors.append((factor.region, factor.filename, len(factor.sequence)))
+        self.sequences.append(factor.sequence)
+        self.positions.append(np.asarray(factor.positions, dtype=np.int32))
+
+    def text(self) -> tuple:
+        """The concatenated text (uint8, one separator after every factor) and the start offset of every factor."""
+        text = np.frombuffer((SEPARATOR.decode().join(self.sequences) + SEPARATOR.decode()).encode("ascii", errors="replace"), dtype=np.uint8)
+        lengths = np.array([length for _, _, length in self.factors], dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1])) if len(lengths) else np.zeros(0, dtype=np.int64)
+        return text, starts
+
+def save_array(path: str, array: np.ndarray):
+    np.save(path, array)
+    pipeline_telemetry.record_written(path)
+
+def superclass_sort_key(superclass: str) -> tuple:
+    return (not superclass.isdigit(), int(superclass) if superclass.isdigit() else 0, superclass)
+
+def suffix_array(text: np.ndarray) -> np.ndarray:
+    """
+    Prefix doubling: in round h every suffix is ranked by its first 2^h bytes,
+    by sorting the (rank of the first half, rank of the second half) pairs packed
+    into one int64 key. The multiplier exceeds the largest second-half value, so
+    packed keys sort exactly like the pairs. Stops as soon as all ranks are distinct.
+    """
+    n = len(text)
+    rank = text.astype(np.int64)
+    offset = 1
+    while True:
+        second = np.zeros(n, dtype=np.int64)
+        if offset < n:
+            second[:n - offset] = rank[offset:] + 1
+        base = int(rank.max()) + 2 if n else 1
+        key = rank * base + second
+        sa = np.argsort(key, kind="stable")
+        sorted_key = key[sa]
+        sorted_rank = np.zeros(n, dtype=np.int64)
+        np.cumsum(sorted_key[1:] != sorted_key[:-1], out=sorted_rank[1:])
+        rank[sa] = sorted_rank
+        if n == 0 or sorted_rank[-1] == n - 1 or offset >= n:
+            return sa
+        offset *= 2
+
+def residues_to_separator(starts: np.ndarray, lengths: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Number of residues from each text position to the end of its factor (0 at separators)."""
+    factor = np.searchsorted(starts, positions, side="right") - 1
+    return np.maximum(starts[factor] + lengths[factor] - positions, 0)
+
+def lcp_array(text: np.ndarray, sa: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    lcp[i] is the longest common prefix of suffixes sa[i - 1] and sa[i], cut at
+    the end of either factor, so no common prefix spans a separator. Adjacent
+    pairs are compared 8 bytes at a time, all pairs at once; a pair drops out
+    at its first mismatching word.
+    """
+    n = len(text)
+    lcp = np.zeros(n, dtype=np.int32)
+    if n < 2:
+        return lcp
+    padded = np.concatenate((text, np.zeros(8, dtype=np.uint8)))
+    words = np.zeros(n, dtype=np.uint64)
+    for j in range(8):
+        words = (words << np.uint64(8)) | padded[j : j + n].astype(np.uint64)
+
+    remaining = residues_to_separator(starts, lengths, np.arange(n))
+    cap = np.minimum(remaining[sa[1:]], remaining[sa[:-1]])
+    pairs = np.flatnonzero(cap > 0)
+    a, b = sa[1:][pairs], sa[:-1][pairs]
+    depth = 0
+    while pairs.size:
+        equal = words[a + depth] == words[b + depth]
+        mismatched = ~equal
+        if mismatched.any():
+            difference = words[a[mismatched] + depth] ^ words[b[mismatched] + depth]
+            leading = np.zeros(len(difference), dtype=np.int32)
+            still_equal = np.ones(len(difference), dtype=bool)
+            for j in range(8):
+                still_equal &= ((difference >> np.uint64(56 - 8 * j)) & np.uint64(0xFF)) == 0
+                leading += still_equal
+            lcp[pairs[mismatched] + 1] = depth + leading
+        depth += 8
+        go_on = equal & (depth < cap[pairs])
+        lcp[pairs[equal & ~go_on] + 1] = depth
+        pairs, a, b = pairs[go_on], a[go_on], b[go_on]
+    lcp[1:] = np.minimum(lcp[1:], cap)
+    return lcp
+
+def fm_index(text: np.ndarray, sa: np.ndarray, occ_sample: int = OCC_SAMPLE) -> tuple:
+    """BWT, the symbols of the text, C (symbols smaller than each one) and the sampled occurrence table."""
+    bwt = text[sa - 1]
+    symbols, counts = np.unique(text, return_counts=True)
+    C = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    dtype = np.int32 if len(text) < 2**31 else np.int64
+    sampled_rows = np.arange(0, len(text) + 1, occ_sample)
+    occ = np.zeros((len(sampled_rows), len(symbols)), dtype=dtype)
+    for column, symbol in enumerate(symbols):
+        cumulative = np.concatenate(([0], np.cumsum(bwt == symbol)))
+        occ[:, column] = cumulative[sampled_rows]
+    return bwt, symbols, C, occ
+
+def build_index(region_dirs: dict = None, index_dir: str = INDEX_DIR):
+    os.makedirs(index_dir, exist_ok=True)
+    accumulator = MotifTextAccumulator()
+    totals = fused_analysis.run_fused_analysis([accumulator], region_dirs)
+    text, starts = accumulator.text()
+    lengths = np.array([length for _, _, length in accumulator.factors], dtype=np.int64)
+    print(f"Concatenated {len(accumulator.factors)} factors ({totals['residues']} residues) into a text of {len(text)} bytes.")
+
+    with pipeline_telemetry.stage("suffix_array"):
+        sa = suffix_array(text).astype(np.int32 if len(text) < 2**31 else np.int64)
+    with pipeline_telemetry.stage("lcp"):
+        lcp = lcp_array(text, sa, starts, lengths)
+    with pipeline_telemetry.stage("fm_index"):
+        bwt, symbols, C, occ = fm_index(text, sa)
+
+    positions = np.concatenate(accumulator.positions) if accumulator.positions else np.zeros(0, dtype=np.int32)
+    for name, array in (("text", text), ("sa", sa), ("lcp", lcp), ("bwt", bwt), ("occ", occ),
+                        ("starts", starts), ("lengths", lengths), ("positions", positions)):
+        save_array(os.path.join(index_dir, f"{name}.npy"), array)
+    factors_csv = os.path.join(index_dir, "factors.csv")
+    with open(factors_csv, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['row', 'region', 'filename', 'length'])
+        for row, factor in enumerate(accumulator.factors):
+            writer.writerow([row, *factor])
+    pipeline_telemetry.record_written(factors_csv)
+
+    metadata = {"factors": len(accumulator.factors), "text_length": len(text), "occ_sample": OCC_SAMPLE,
+                "symbols": bytes(symbols.tolist()).decode("ascii", errors="replace"), "C": C.tolist()}
+    metadata_path = os.path.join(index_dir, "index.json")
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    pipeline_telemetry.record_written(metadata_path)
+
+def load_index(index_dir: str = INDEX_DIR) -> dict:
+    """Memory-maps the index arrays; a query only touches the rows it needs."""
+    with open(os.path.join(index_dir, "index.json"), 'r') as f:
+        index = json.load(f)
+    for name in ("text", "sa", "lcp", "bwt", "occ", "positions"):
+        index[name] = np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+    index["starts"] = np.load(os.path.join(index_dir, "starts.npy"))
+    index["lengths"] = np.load(os.path.join(index_dir, "lengths.npy"))
+    index["C"] = np.array(index["C"], dtype=np.int64)
+    index["symbol_columns"] = {ord(symbol): column for column, symbol in enumerate(index["symbols"])}
+    with open(os.path.join(index_dir, "factors.csv"), 'r', newline='') as csvfile:
+        index["factors"] = [(row["region"], row["filename"], int(row["length"])) for row in csv.DictReader(csvfile)]
+    index["regions"] = np.array([region for region, _, _ in index["factors"]])
+    return index
+
+def parse_motif(motif: str, symbols: str) -> list:
+    """
+    Turns a motif into (set of residue bytes, minimum, maximum repeat) elements:
+        C          that residue (upper case)
+        x or .     any residue
+        [ST]       one of S, T;  [^P] or {P}: any residue but P
+        B, Z, J    D/N, E/Q, I/L (and the ambiguity code itself)
+        x(3)       the preceding element 3 times;  x(2,4): 2 to 4 times
+    '-' between elements is ignored, so PROSITE patterns such as C-x(2,4)-C work.
+    """
+    any_residue = {ord(symbol) for symbol in symbols if symbol != SEPARATOR.decode()}
+    elements = []
+    i = 0
+    while i < len(motif):
+        char = motif[i]
+        if char == "-" or char.isspace():
+            i += 1
+            continue
+        if char in "[{":
+            close = motif.find("]" if char == "[" else "}", i)
+            if close < 0:
+                raise ValueError(f"Unclosed '{char}' in motif '{motif}'.")
+            members = motif[i + 1 : close]
+            excluded = char == "{" or members.startswith("^")
+            residues = {ord(aa) for aa in members.lstrip("^").upper()}
+            elements.append((any_residue - residues if excluded else residues & any_residue, 1, 1))
+            i = close + 1
+        elif char in "x.":
+            elements.append((set(any_residue), 1, 1))
+            i += 1
+        elif char == "(":
+            close = motif.find(")", i)
+            bounds = motif[i + 1 : close].split(",") if close > 0 else []
+            if not elements or not 1 <= len(bounds) <= 2 or not all(bound.strip().isdigit() for bound in bounds):
+                raise ValueError(f"Bad repeat at position {i} of motif '{motif}'.")
+            minimum, maximum = int(bounds[0]), int(bounds[-1])
+            if minimum > maximum:
+                raise ValueError(f"Bad repeat at position {i} of motif '{motif}'.")
+            elements[-1] = (elements[-1][0], minimum, maximum)
+            i = close + 1
+        elif char.isalpha():
+            elements.append(({ord(aa) for aa in DEGENERATE_RESIDUES.get(char.upper(), char.upper())} & any_residue, 1, 1))
+            i += 1
+        else:
+            raise ValueError(f"Unexpected '{char}' in motif '{motif}'.")
+    if not elements:
+        raise ValueError("Empty motif.")
+    return elements
+
+def expand_motif(elements: list) -> list:
+    """One fixed-length list of residue sets per combination of variable repeat counts."""
+    variants = []
+    for repeats in itertools.product(*(range(minimum, maximum + 1) for _, minimum, maximum in elements)):
+        variant = [residues for (residues, _, _), count in zip(elements, repeats) for _ in range(count)]
+        if variant:
+            variants.append(variant)
+        if len(variants) > MAX_MOTIF_VARIANTS:
+            raise ValueError(f"The motif expands to more than {MAX_MOTIF_VARIANTS} fixed-length variants.")
+    if not variants:
+        raise ValueError("The motif only matches the empty string.")
+    return variants
+
+def rank(index: dict, column: int, rows: np.ndarray) -> np.ndarray:
+    """Occurrences of symbol `column` in bwt[:row] for every row, from the sample plus a scan of at most OCC_SAMPLE bytes."""
+    sample = index["occ_sample"]
+    blocks = rows // sample
+    counts = index["occ"][blocks, column].astype(np.int64)
+    partial = rows - blocks * sample
+    if partial.any():
+        symbol = ord(index["symbols"][column])
+        scan = blocks[:, None] * sample + np.arange(sample)
+        inside = np.arange(sample) < partial[:, None]
+        bwt = index["bwt"]
+        window = np.asarray(bwt[np.minimum(scan, len(bwt) - 1)])
+        counts += np.count_nonzero((window == symbol) & inside, axis=1)
+    return counts
+
+def backward_search(index: dict, elements: list) -> tuple:
+    """
+    Suffix-array intervals [lo, hi) of every text substring matching the motif.
+    Each wildcard or class position branches every live interval into one per
+    residue; all live intervals are extended together, one rank call per residue.
+    """
+    lo = np.array([0], dtype=np.int64)
+    hi = np.array([index["text_length"]], dtype=np.int64)
+    for residues in reversed(elements):
+        next_lo, next_hi = [], []
+        for symbol in sorted(residues):
+            column = index["symbol_columns"].get(symbol)
+            if column is None:
+                continue
+            extended_lo = index["C"][column] + rank(index, column, lo)
+            extended_hi = index["C"][column] + rank(index, column, hi)
+            live = extended_lo < extended_hi
+            next_lo.append(extended_lo[live])
+            next_hi.append(extended_hi[live])
+        lo = np.concatenate(next_lo) if next_lo else np.zeros(0, dtype=np.int64)
+        hi = np.concatenate(next_hi) if next_hi else np.zeros(0, dtype=np.int64)
+        if not lo.size:
+            break
+    return lo, hi
+
+def search_motif(index: dict, motif: str, region: str = None, max_hits: int = MAX_HITS) -> dict:
+    """
+    Counts the occurrences of `motif` (optionally in one region) and lists the
+    hits as (region, filename, start POS_IU, offset in the factor, matched residues).
+    """
+    found_positions, found_lengths = [], []
+    for elements in expand_motif(parse_motif(motif, index["symbols"])):
+        lo, hi = backward_search(index, elements)
+        sizes = hi - lo
+        rows = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes - lo, sizes)
+        found_positions.append(np.asarray(index["sa"][rows]).astype(np.int64))
+        found_lengths.append(np.full(len(rows), len(elements), dtype=np.int64))
+    # An occurrence is a start position; with variable repeats the shortest match is reported.
+    text_positions, match_lengths = np.concatenate(found_positions), np.concatenate(found_lengths)
+    order = np.lexsort((match_lengths, text_positions))
+    text_positions, match_lengths = text_positions[order], match_lengths[order]
+    first = np.ones(len(text_positions), dtype=bool)
+    first[1:] = text_positions[1:] != text_positions[:-1]
+    text_positions, match_lengths = text_positions[first], match_lengths[first]
+    factors = np.searchsorted(index["starts"], text_positions, side="right") - 1
+    if region is not None:
+        in_region = index["regions"][factors] == region
+        text_positions, match_lengths, factors = text_positions[in_region], match_lengths[in_region], factors[in_region]
+
+    hits = []
+    listed = slice(max_hits or None)
+    for text_position, length, factor in zip(text_positions[listed].tolist(), match_lengths[listed].tolist(), factors[listed].tolist()):
+        factor_region, filename, _ = index["factors"][factor]
+        offset = text_position - int(index["starts"][factor])
+        match = bytes(index["text"][text_position : text_position + length]).decode("ascii", errors="replace")
+        hits.append((factor_region, filename, int(index["positions"][text_position - factor]), offset, match))
+    return {"motif": motif, "count": len(text_positions),
+            "factors": len(np.unique(factors)), "hits": hits}
+
+def kmer_counts(index: dict, window_size: int, region: str) -> tuple:
+    """
+    Occurrence counts of every k-mer in one region, per superclass, from the
+    suffix and LCP arrays: the suffixes starting with the same k-mer are one
+    run of the suffix array, and a new run begins wherever lcp < k. Suffixes
+    with fewer than k residues before their separator are not k-mers.
+    Returns the k-mers in sorted order, the superclasses and the count matrix.
+    """
+    sa = np.asarray(index["sa"]).astype(np.int64)
+    run_ids = np.cumsum(np.asarray(index["lcp"]) < window_size) - 1
+    factors = np.searchsorted(index["starts"], sa, side="right") - 1
+    selected = (residues_to_separator(index["starts"], index["lengths"], sa) >= window_size) & (index["regions"][factors] == region)
+
+    superclasses = sorted({filename.split(".", 1)[0] for factor_region, filename, _ in index["factors"] if factor_region == region},
+                          key=superclass_sort_key)
+    column_of = {superclass: column for column, superclass in enumerate(superclasses)}
+    factor_columns = np.array([column_of.get(filename.split(".", 1)[0], -1) for _, filename, _ in index["factors"]], dtype=np.int64)
+
+    runs, first_rows, run_index = np.unique(run_ids[selected], return_index=True, return_inverse=True)
+    columns = factor_columns[factors[selected]]
+    counts = np.bincount(run_index * len(superclasses) + columns, minlength=len(runs) * len(superclasses))
+    counts = counts.reshape(len(runs), len(superclasses))
+
+    kmer_starts = sa[selected][first_rows]
+    kmer_bytes = np.asarray(index["text"])[kmer_starts[:, None] + np.arange(window_size)]
+    kmers = [row.tobytes().decode("ascii", errors="replace") for row in kmer_bytes]
+    return kmers, superclasses, counts
+
+def write_kmer_counts(output_csv: str, kmers: list, superclasses: list, counts: np.ndarray):
+    """Same layout as the global_kmer_counts_WS<k>.csv tables of DBD-Non-DBD-Window-Code.py."""
+    with open(output_csv, 'w', newline='') as csvfile:
+        csvfile.write(",".join(["kmer", "total"] + [f"superclass_{sc}" for sc in superclasses]) + "\n")
+        for kmer, row in zip(kmers, counts.tolist()):
+            csvfile.write(f"{kmer},{sum(row)},{','.join(map(str, row))}\n")
+    pipeline_telemetry.record_written(output_csv)
+
+if __name__ == "__main__":
+    pipeline_telemetry.configure("motif_index")
+
+    parser = argparse.ArgumentParser(description="Build or query the suffix-array / FM-index motif index.")
+    parser.add_argument("--rebuild", action="store_true", help="Rescan the region directories even if the index exists.")
+    parser.add_argument("--motif", nargs="+", default=[], help="Motifs to search, e.g. 'CGKxF' or 'C-x(2)-[ST]'.")
+    parser.add_argument("--region", choices=list(fused_analysis.REGION_DIRS), help="Only count hits in this region.")
+    parser.add_argument("--max-hits", type=int, default=MAX_HITS, help="Hits listed per motif (0: all).")
+    parser.add_argument("--kmers", type=int, help="Write the k-mer counts of this length for --region (default: DBD).")
+    parser.add_argument("--output-csv", help="Write the motif hits or k-mer counts to this CSV instead of printing them.")
+    args = parser.parse_args()
+
+    if args.rebuild or not os.path.exists(os.path.join(INDEX_DIR, "index.json")):
+        with pipeline_telemetry.stage("build"):
+            build_index()
+        print(f"Saved the index to '{INDEX_DIR}'.")
+
+    if args.motif or args.kmers:
+        with pipeline_telemetry.stage("load"):
+            index = load_index()
+
+    header = ['motif', 'region', 'filename', 'start_pos_iu', 'offset', 'match']
+    rows = []
+    for motif in args.motif:
+        with pipeline_telemetry.stage("query"):
+            start = time.perf_counter()
+            try:
+                result = search_motif(index, motif, args.region, args.max_hits)
+            except ValueError as e:
+                print(f"!!! Skipping motif '{motif}': {e}")
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+        print(f"--- '{motif}': {result['count']} occurrences in {result['factors']} factors ({elapsed_ms:.1f} ms) ---")
+        rows.extend([motif, *hit] for hit in result["hits"])
+
+    if args.motif:
+        if args.output_csv:
+            with open(args.output_csv, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(header)
+                writer.writerows(rows)
+            pipeline_telemetry.record_written(args.output_csv)
+            print(f"--- Successfully created {args.output_csv} ---")
+        else:
+            print("\t".join(header))
+            for row in rows:
+                print("\t".join(str(value) for value in row))
+
+    if args.kmers:
+        region = args.region or "DBD"
+        with pipeline_telemetry.stage("kmer_counts"):
+            kmers, superclasses, counts = kmer_counts(index, args.kmers, region)
+        output_csv = args.output_csv if args.output_csv and not args.motif else f"{region}_motif_kmer_counts_WS{args.kmers}.csv"
+        write_kmer_counts(output_csv, kmers, superclasses, counts)
+        print(f"--- Wrote {len(kmers)} distinct {args.kmers}-mers of region '{region}' to {output_csv} ---")
+
+    pipeline_telemetry.finish()
@@ -2,6 +2,8 @@ import os
 import csv
 import collections
 
+import pipeline_telemetry
+
 JOBS = [
     {
         "input_dir": "DBD-region-Window-Output/3",
@@ -111,25 +113,28 @@ def create_summary_csv(job_config: dict):
     for filename in target_files:
         filepath = os.path.join(input_dir, filename)
         current_file_counts = {}
-        try:
-            with open(filepath, 'r') as f:
-                lines = f.readlines()
-                for line in lines:
-                    line = line.strip()
-                    if " - " not in line or line.startswith(('#', '-', '=')):
-                        continue
-                    try:
-                        parts = line.split(" - ")
-                        triplet = parts[0].strip()
-                        count = int(parts[1])
-                        current_file_counts[triplet] = count
-                        if count >= MINIMUM_OCCURRENCE_COUNT:
-                            all_frequent_triplets_header.add(triplet)
-                    except (ValueError, IndexError):
-                        continue
-            all_file_data[filename] = current_file_counts
-        except Exception as e:
-            print(f"!!! Warning: Could not process {filename}: {e}")
+        with pipeline_telemetry.track_file(filepath):
+            try:
+                with open(filepath, 'r') as f:
+                    lines = f.readlines()
+                    for line in lines:
+                        line = line.strip()
+                        if " - " not in line or line.startswith(('#', '-', '=')):
+                            continue
+                        try:
+                            parts = line.split(" - ")
+                            triplet = parts[0].strip()
+                            count = int(parts[1])
+                            current_file_counts[triplet] = count
+                            if count >= MINIMUM_OCCURRENCE_COUNT:
+                                all_frequent_triplets_header.add(triplet)
+                        except (ValueError, IndexError):
+                            continue
+                all_file_data[filename] = current_file_counts
+                pipeline_telemetry.add("factors")
+            except Exception as e:
+                print(f"!!! Warning: Could not process {filename}: {e}")
+                pipeline_telemetry.record_error(filepath, e)
 
     if not all_frequent_triplets_header:
         print("--- No triplets with occurrences >= 3 found across all files. No CSV will be generated.")
@@ -153,17 +158,21 @@ def create_summary_csv(job_config: dict):
                     row.append(count)
                 
                 writer.writerow(row)
+        pipeline_telemetry.record_written(output_csv)
         print(f"--- Successfully created {output_csv} ---")
 
     except Exception as e:
         print(f"!!! ERROR: Could not write CSV file {output_csv}: {e}")
 
 if __name__ == "__main__":
-    
+    pipeline_telemetry.configure("occurrence_csv")
+
     for job in JOBS:
-        create_summary_csv(job)
+        with pipeline_telemetry.stage(job["output_csv"]):
+            create_summary_csv(job)
         print("-" * 50)
 
     print("\n\n" + "*" * 50)
     print("All summary CSV generation jobs are complete.")
-    print("*" * 50)
\ No newline at end of file
+    print("*" * 50)
+    pipeline_telemetry.finish()
\ No newline at end of file
@@ -0,0 +1,484 @@
+import os
+import json
+import signal
+import asyncio
+import argparse
+import contextlib
+import collections
+from urllib.parse import urlsplit, parse_qs
+
+import fused_analysis
+import pipeline_telemetry
+
+# Long-lived query service over the split region files. The factors and their
+# per-factor aggregates are loaded into memory once; small queries (disorder
+# ratio of a factor, k-mer counts of a family, normalized scores of a
+# superclass) are answered from memory through an LRU result cache. The region
+# directories are polled and only new, changed or removed files are re-read;
+# the per-level aggregates are updated by those files alone.
+
+SERVICE_HOST: str = "127.0.0.1"
+SERVICE_PORT: int = 8765
+# Path of a Unix socket to listen on instead of TCP (None: TCP).
+SERVICE_UNIX_SOCKET = None
+CACHE_SIZE: int = 1024
+# Seconds between scans of the region directories (0 disables automatic reload).
+RELOAD_INTERVAL_SECONDS: float = 5.0
+MAX_KMER_SIZE: int = 11
+# k-mer sizes counted at load time and kept per hierarchy level; other sizes are
+# counted on demand in a worker thread.
+PRECOMPUTED_KMER_SIZES = [3]
+ROOT_LEVEL: str = "all"
+DEFAULT_TOP_KMERS: int = 100
+DISORDER_CUTOFF: float = fused_analysis.DISORDER_CUTOFF
+MAX_REQUEST_LINE_BYTES: int = 8192
+
+class FactorRecord:
+    """One loaded region file with the aggregates the queries need."""
+
+    __slots__ = ("region", "filename", "signature", "levels", "sequence", "residues", "disordered_residues",
+                 "ordered", "disordered", "kmers")
+
+    def __init__(self, factor: fused_analysis.RegionFactor, signature: tuple, kmer_sizes: list = ()):
+        self.region = factor.region
+        self.filename = factor.filename
+        self.signature = signature
+        self.levels = [ROOT_LEVEL] + factor.hierarchy
+        self.sequence = factor.sequence
+        # Counted in the loading thread; folded into the level totals and dropped by RegionStore.
+        self.kmers = {window_size: count_kmers([factor.sequence], window_size) for window_size in kmer_sizes}
+        self.residues = len(factor.iu_scores)
+        self.ordered = collections.Counter()
+        self.disordered = collections.Counter()
+        for residue, iu_score in zip(factor.sequence, factor.iu_scores):
+            if iu_score < DISORDER_CUTOFF:
+                self.ordered[residue] += 1
+            else:
+                self.disordered[residue] += 1
+        self.disordered_residues = sum(1 for score in factor.iu_scores if score > DISORDER_CUTOFF)
+
+    @property
+    def superclass(self) -> str:
+        return self.filename.split(".", 1)[0]
+
+    def in_level(self, level: str) -> bool:
+        """Whether the factor lies under hierarchy level `level` ('all', '4', '1.2', '1.2.1.1', ...)."""
+        return level in self.levels
+
+def count_kmers(sequences: list, window_size: int) -> collections.Counter:
+    counts = collections.Counter()
+    for sequence in sequences:
+        counts.update(sequence[i : i + window_size] for i in range(len(sequence) - window_size + 1))
+    return counts
+
+class LRUCache:
+    def __init__(self, capacity: int = CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class QueryError(Exception):
+    """A bad or unanswerable query; becomes an HTTP 4xx response."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def scan_region_dirs(region_dirs: dict) -> dict:
+    """(region, filename) -> (size, mtime_ns, path) of every region file currently on disk."""
+    signatures = {}
+    for region, input_dir in region_dirs.items():
+        if not os.path.isdir(input_dir):
+            continue
+        with os.scandir(input_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    stat = entry.stat()
+                    signatures[(region, entry.name)] = (stat.st_size, stat.st_mtime_ns, entry.path)
+    return signatures
+
+def load_changed_factors(region_dirs: dict, known_signatures: dict, kmer_sizes: list = ()) -> tuple:
+    """
+    Scans the region directories and parses only the files that are new or whose
+    size or mtime changed. Returns the parsed records and the keys of removed files.
+    """
+    signatures = scan_region_dirs(region_dirs)
+    loaded = []
+    for key in sorted(signatures):
+        size, mtime_ns, path = signatures[key]
+        if known_signatures.get(key) == (size, mtime_ns):
+            continue
+        with pipeline_telemetry.track_file(path):
+            try:
+                factor = fused_analysis.read_region_file(key[0], path)
+            except Exception as e:
+                print(f"!!! Warning: Could not process {path}: {e}")
+                pipeline_telemetry.record_error(path, e)
+                continue
+            pipeline_telemetry.add("factors")
+            pipeline_telemetry.add("residues", len(factor.sequence))
+        loaded.append(FactorRecord(factor, (size, mtime_ns), kmer_sizes))
+    removed = [key for key in known_signatures if key not in signatures]
+    return loaded, removed
+
+class RegionStore:
+    """
+    In-memory factors, per (region, superclass) residue-order totals, per
+    (region, hierarchy level, k) k-mer totals and the result cache.
+    """
+
+    def __init__(self, region_dirs: dict = None, cache_size: int = CACHE_SIZE, kmer_sizes: list = None):
+        self.region_dirs = fused_analysis.REGION_DIRS if region_dirs is None else region_dirs
+        self.kmer_sizes = list(PRECOMPUTED_KMER_SIZES if kmer_sizes is None else kmer_sizes)
+        self.factors = {}
+        self.order_totals = collections.defaultdict(lambda: (collections.Counter(), collections.Counter()))
+        self.level_factors = collections.Counter()
+        self.kmer_totals = collections.defaultdict(collections.Counter)
+        self.cache = LRUCache(cache_size)
+        self.generation = 0
+        self.reloads = 0
+        self._reload_lock = asyncio.Lock()
+
+    def _remove(self, key):
+        record = self.factors.pop(key, None)
+        if record is None:
+            return
+        ordered, disordered = self.order_totals[(record.region, record.superclass)]
+        ordered.subtract(record.ordered)
+        disordered.subtract(record.disordered)
+        if not +ordered and not +disordered:
+            del self.order_totals[(record.region, record.superclass)]
+        # The per-factor k-mer counts are not kept; recounting one removed factor is cheap.
+        kmers = {window_size: count_kmers([record.sequence], window_size) for window_size in self.kmer_sizes}
+        for level in record.levels:
+            self.level_factors[(record.region, level)] -= 1
+            emptied = self.level_factors[(record.region, level)] <= 0
+            if emptied:
+                del self.level_factors[(record.region, level)]
+            for window_size, counts in kmers.items():
+                if emptied:
+                    self.kmer_totals.pop((record.region, level, window_size), None)
+                else:
+                    self.kmer_totals[(record.region, level, window_size)].subtract(counts)
+
+    def _add(self, record: FactorRecord):
+        self.factors[(record.region, record.filename)] = record
+        ordered, disordered = self.order_totals[(record.region, record.superclass)]
+        ordered.update(record.ordered)
+        disordered.update(record.disordered)
+        for level in record.levels:
+            self.level_factors[(record.region, level)] += 1
+            for window_size, counts in record.kmers.items():
+                self.kmer_totals[(record.region, level, window_size)].update(counts)
+        record.kmers = None
+
+    def apply(self, loaded: list, removed: list) -> int:
+        """Swaps in reloaded files; any change invalidates the cached results."""
+        for key in removed:
+            self._remove(key)
+        for record in loaded:
+            key = (record.region, record.filename)
+            if key in self.factors:
+                self._remove(key)
+            self._add(record)
+        self.reloads += 1
+        changed = len(loaded) + len(removed)
+        if changed:
+            self.generation += 1
+            self.cache.clear()
+        return changed
+
+    async def reload(self) -> int:
+        """
+        Scans and parses in a worker thread; the store itself is only modified on
+        the event loop. Reloads (periodic and POST /reload) run one at a time, so
+        each one diffs against the state the previous one left.
+        """
+        async with self._reload_lock:
+            known = {key: record.signature for key, record in self.factors.items()}
+            loaded, removed = await asyncio.get_running_loop().run_in_executor(None, load_changed_factors, self.region_dirs, known, self.kmer_sizes)
+            changed = self.apply(loaded, removed)
+        if changed:
+            print(f"--- Reloaded {len(loaded)} changed and dropped {len(removed)} removed region files (generation {self.generation}) ---")
+        return changed
+
+    def _region(self, params: dict) -> str:
+        region = params.get("region", "DBD")
+        if region not in self.region_dirs:
+            raise QueryError(400, f"Unknown region '{region}'; expected one of {sorted(self.region_dirs)}.")
+        return region
+
+    async def query(self, path: str, params: dict) -> dict:
+        handlers = {
+            "/disorder": self.query_disorder,
+            "/factors": self.query_factors,
+            "/kmers": self.query_kmers,
+            "/normalized": self.query_normalized
+        }
+        if path == "/status":
+            return self.query_status()
+        if path not in handlers:
+            raise QueryError(404, f"Unknown query '{path}'.")
+        key = (path, tuple(sorted(params.items())))
+        result = self.cache.get(key)
+        if result is None:
+            generation = self.generation
+            result = handlers[path](params)
+            if asyncio.iscoroutine(result):
+                result = await result
+            # A reload during an off-loop count makes the result stale for the cache.
+            if generation == self.generation:
+                self.cache.put(key, result)
+        return result
+
+    def query_status(self) -> dict:
+        counts = collections.Counter(region for region, _ in self.factors)
+        return {
+            "factors": dict(sorted(counts.items())),
+            "generation": self.generation,
+            "reloads": self.reloads,
+            "cache": {"entries": len(self.cache.entries), "capacity": self.cache.capacity,
+                      "hits": self.cache.hits, "misses": self.cache.misses}
+        }
+
+    def query_disorder(self, params: dict) -> dict:
+        """Disorder ratio of one factor, e.g. /disorder?factor=1.2.1.1_TF_3&region=DBD."""
+        if "factor" not in params:
+            raise QueryError(400, "Missing parameter 'factor'.")
+        region = self._region(params)
+        filename = params["factor"] if params["factor"].endswith(".txt") else params["factor"] + ".txt"
+        record = self.factors.get((region, filename))
+        if record is None:
+            raise QueryError(404, f"No factor '{filename}' in region '{region}'.")
+        return {
+            "region": region,
+            "filename": filename,
+            "residues": record.residues,
+            "disordered_residues": record.disordered_residues,
+            "disorder_percentage": round(record.disordered_residues / record.residues * 100.0, 2) if record.residues else None
+        }
+
+    def _factors_in_level(self, params: dict) -> list:
+        region = self._region(params)
+        level = params.get("level") or ROOT_LEVEL
+        return [record for (record_region, filename), record in sorted(self.factors.items())
+                if record_region == region and record.in_level(level)]
+
+    def query_factors(self, params: dict) -> dict:
+        """Factor files of a hierarchy level, e.g. /factors?level=1.2.1&region=non-DBD."""
+        records = self._factors_in_level(params)
+        return {"count": len(records), "factors": [record.filename for record in records]}
+
+    async def query_kmers(self, params: dict) -> dict:
+        """
+        k-mer counts over a hierarchy level, e.g. /kmers?level=1.2.1&k=3&top=20.
+        Sizes in PRECOMPUTED_KMER_SIZES are read from the level totals; other
+        sizes are counted in a worker thread so the event loop keeps serving.
+        """
+        try:
+            window_size = int(params.get("k", 3))
+            top = int(params.get("top", DEFAULT_TOP_KMERS))
+        except ValueError:
+            raise QueryError(400, "Parameters 'k' and 'top' must be integers.")
+        if not 1 <= window_size <= MAX_KMER_SIZE:
+            raise QueryError(400, f"'k' must be between 1 and {MAX_KMER_SIZE}.")
+        if window_size in self.kmer_sizes:
+            region = self._region(params)
+            level = params.get("level") or ROOT_LEVEL
+            factors = self.level_factors.get((region, level), 0)
+            counts = self.kmer_totals.get((region, level, window_size), collections.Counter())
+        else:
+            records = self._factors_in_level(params)
+            factors = len(records)
+            counts = await asyncio.get_running_loop().run_in_executor(
+                None, count_kmers, [record.sequence for record in records], window_size)
+        ranked = sorted(((kmer, count) for kmer, count in counts.items() if count > 0), key=lambda item: (-item[1], item[0]))
+        return {
+            "factors": factors,
+            "total": sum(count for _, count in ranked),
+            "distinct": len(ranked),
+            "counts": dict(ranked[:top] if top > 0 else ranked)
+        }
+
+    def query_normalized(self, params: dict) -> dict:
+        """Normalized disorder preference scores of a superclass, e.g. /normalized?superclass=4&region=DBD."""
+        if "superclass" not in params:
+            raise QueryError(400, "Missing parameter 'superclass'.")
+        region = self._region(params)
+        key = (region, params["superclass"].rstrip("."))
+        if key not in self.order_totals:
+            raise QueryError(404, f"No factors of superclass '{key[1]}' in region '{region}'.")
+        ordered, disordered = self.order_totals[key]
+        total_ordered_count = sum(ordered.values())
+        total_disordered_count = sum(disordered.values())
+        scores = {}
+        for aa in fused_analysis.AMINO_ACID_ORDER_BY_DISORDER:
+            Di = disordered.get(aa, 0)
+            Oi = ordered.get(aa, 0)
+            freq_disordered = Di / total_disordered_count if total_disordered_count > 0 else 0.0
+            freq_ordered = Oi / total_ordered_count if total_ordered_count > 0 else 0.0
+            denominator = freq_disordered + freq_ordered
+            scores[aa] = {"ordered": Oi, "disordered": Di,
+                          "score": round((freq_disordered - freq_ordered) / denominator, 4) if denominator > 0 else 0.0}
+        return {"region": region, "superclass": key[1], "ordered_residues": total_ordered_count,
+                "disordered_residues": total_disordered_count, "scores": scores}
+
+def http_response(status: int, body: dict, keep_alive: bool) -> bytes:
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+    payload = json.dumps(body).encode()
+    headers = [
+        f"HTTP/1.1 {status} {reasons.get(status, 'Error')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(payload)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}"
+    ]
+    return ("\r\n".join(headers) + "\r\n\r\n").encode() + payload
+
+async def read_request_head(reader: asyncio.StreamReader) -> tuple:
+    """
+    Reads the request line and headers, and discards any request body.
+    Returns (b"", {}) at the end of the stream; a line longer than the stream
+    limit or a bad Content-Length raises QueryError(400).
+    """
+    try:
+        request_line = await reader.readline()
+        if not request_line:
+            return request_line, {}
+        if len(request_line) > MAX_REQUEST_LINE_BYTES:
+            raise QueryError(400, "Request line too long.")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+    except (ValueError, asyncio.LimitOverrunError):
+        raise QueryError(400, f"Request line or header longer than {MAX_REQUEST_LINE_BYTES} bytes.")
+    content_length = headers.get("content-length", "") or "0"
+    if not content_length.isdigit():
+        raise QueryError(400, f"Invalid Content-Length '{content_length}'.")
+    if int(content_length):
+        await reader.readexactly(int(content_length))
+    return request_line, headers
+
+async def handle_connection(store: RegionStore, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Minimal HTTP/1.1: GET queries and POST /reload, with keep-alive."""
+    try:
+        while True:
+            try:
+                request_line, headers = await read_request_head(reader)
+            except QueryError as e:
+                writer.write(http_response(e.status, {"error": str(e)}, keep_alive=False))
+                await writer.drain()
+                break
+            if not request_line:
+                break
+
+            parts = request_line.decode("latin-1").split()
+            version = parts[2] if len(parts) > 2 else "HTTP/1.0"
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+            if len(parts) < 2:
+                status, body = 400, {"error": "Malformed request line."}
+            else:
+                method, target = parts[0], urlsplit(parts[1])
+                params = {name: values[-1] for name, values in parse_qs(target.query).items()}
+                try:
+                    if target.path == "/reload":
+                        if method != "POST":
+                            raise QueryError(405, "Use POST /reload.")
+                        status, body = 200, {"changed": await store.reload(), "generation": store.generation}
+                    elif method != "GET":
+                        raise QueryError(405, f"Method {method} is not supported.")
+                    else:
+                        status, body = 200, await store.query(target.path, params)
+                except QueryError as e:
+                    status, body = e.status, {"error": str(e)}
+                except Exception as e:
+                    print(f"!!! Error answering '{parts[1]}': {e}")
+                    status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+            writer.write(http_response(status, body, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def reload_periodically(store: RegionStore, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.reload()
+        except Exception as e:
+            print(f"!!! Reload failed: {e}")
+
+async def serve(store: RegionStore, host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+                unix_socket: str = SERVICE_UNIX_SOCKET, reload_interval: float = RELOAD_INTERVAL_SECONDS):
+    with pipeline_telemetry.stage("load"):
+        await store.reload()
+    print(f"Loaded {len(store.factors)} region files.")
+
+    def handler(reader, writer):
+        return handle_connection(store, reader, writer)
+
+    if unix_socket:
+        server = await asyncio.start_unix_server(handler, path=unix_socket, limit=MAX_REQUEST_LINE_BYTES)
+        print(f"Serving region queries on unix socket '{unix_socket}'.")
+    else:
+        server = await asyncio.start_server(handler, host, port, limit=MAX_REQUEST_LINE_BYTES)
+        print(f"Serving region queries on http://{host}:{port}/")
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+    reloader = asyncio.create_task(reload_periodically(store, reload_interval)) if reload_interval > 0 else None
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if reloader is not None:
+            reloader.cancel()
+    print("\nQuery service stopped.")
+
+if __name__ == "__main__":
+    pipeline_telemetry.configure("query_service")
+
+    parser = argparse.ArgumentParser(description="In-memory query service over the split region files.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--unix-socket", default=SERVICE_UNIX_SOCKET, help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE)
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL_SECONDS,
+                        help="Seconds between scans for changed region files (0 disables).")
+    args = parser.parse_args()
+
+    store = RegionStore(cache_size=args.cache_size)
+    try:
+        asyncio.run(serve(store, args.host, args.port, args.unix_socket, args.reload_interval))
+    finally:
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        pipeline_telemetry.finish()
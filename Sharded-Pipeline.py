@@ -0,0 +1,331 @@
+import os
+import sys
+import csv
+import json
+import heapq
+import argparse
+import itertools
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import checkpoint
+import pipeline_scripts
+import pipeline_telemetry
+
+# Sharded execution of the split, window and disorder stages. `plan` partitions
+# the raw NR_HI_IU tree into shard manifests; every shard is run independently
+# (`run-shard`, one per node) into its own output prefix; `reduce` merges the
+# per-shard count tables, catalogs and CSVs. `local` does all three on one
+# machine, with worker processes standing in for the nodes.
+
+BASE_FOLDER: str = "/mnt/d/NR_HI_IU"
+SHARD_ROOT: str = "shards"
+REDUCE_OUTPUT_DIR: str = "sharded_output"
+# "superclass": one shard per top-level superclass directory.
+# "size": SHARD_COUNT bins of roughly equal input bytes.
+SHARD_STRATEGY: str = "superclass"
+SHARD_COUNT: int = 8
+LOCAL_WORKERS: int = os.cpu_count() or 1
+# Window sizes run by every shard; None keeps the window script's WINDOW_SIZES.
+SHARD_WINDOW_SIZES = None
+
+PLAN_FILE: str = "plan.json"
+SHARD_DONE_FILE: str = "shard_done.json"
+DISORDER_CSV: str = "disorder_ratios.csv"
+REGION_CATALOG_CSV: str = "region_catalog.csv"
+WINDOW_CATALOG_CSV: str = "window_catalog.csv"
+
+def superclass_sort_key(superclass: str) -> tuple:
+    return (not superclass.isdigit(), int(superclass) if superclass.isdigit() else 0, superclass)
+
+def list_raw_files(base_folder: str) -> list:
+    """(relative path, size) of every raw .txt file, in a stable order."""
+    raw_files = []
+    for dirpath, dirnames, filenames in os.walk(base_folder):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(".txt"):
+                full_filepath = os.path.join(dirpath, filename)
+                raw_files.append((os.path.relpath(full_filepath, base_folder), os.path.getsize(full_filepath)))
+    return raw_files
+
+def partition_by_superclass(raw_files: list) -> list:
+    groups = {}
+    for relative_path, size in raw_files:
+        superclass = relative_path.split(os.sep, 1)[0] if os.sep in relative_path else os.path.basename(relative_path).split(".", 1)[0]
+        groups.setdefault(superclass, []).append((relative_path, size))
+    return [groups[superclass] for superclass in sorted(groups, key=superclass_sort_key)]
+
+def partition_by_size(raw_files: list, shard_count: int) -> list:
+    """Greedy longest-processing-time bins: the largest file goes to the currently lightest shard."""
+    shard_count = max(1, min(shard_count, len(raw_files)))
+    bins = [(0, shard, []) for shard in range(shard_count)]
+    heapq.heapify(bins)
+    for relative_path, size in sorted(raw_files, key=lambda item: (-item[1], item[0])):
+        total, shard, files = heapq.heappop(bins)
+        files.append((relative_path, size))
+        heapq.heappush(bins, (total + size, shard, files))
+    return [sorted(files) for _, _, files in sorted(bins, key=lambda item: item[1])]
+
+def plan_shards(base_folder: str = None, shard_root: str = SHARD_ROOT, strategy: str = None, shard_count: int = None) -> list:
+    """Writes one manifest per shard plus plan.json, and returns the manifest paths."""
+    base_folder = os.path.abspath(BASE_FOLDER if base_folder is None else base_folder)
+    strategy = SHARD_STRATEGY if strategy is None else strategy
+    raw_files = list_raw_files(base_folder)
+    if not raw_files:
+        raise FileNotFoundError(f"No raw .txt files found under '{base_folder}'.")
+    if strategy == "superclass":
+        shards = partition_by_superclass(raw_files)
+    elif strategy == "size":
+        shards = partition_by_size(raw_files, SHARD_COUNT if shard_count is None else shard_count)
+    else:
+        raise ValueError(f"Unknown shard strategy '{strategy}': expected 'superclass' or 'size'.")
+
+    os.makedirs(shard_root, exist_ok=True)
+    manifest_paths = []
+    for shard, files in enumerate(shards):
+        manifest = {
+            "shard": shard,
+            "base_folder": base_folder,
+            "output_prefix": os.path.abspath(os.path.join(shard_root, f"shard_{shard:03d}")),
+            "files": [relative_path for relative_path, _ in files],
+            "bytes": sum(size for _, size in files)
+        }
+        manifest_path = os.path.join(shard_root, f"shard_{shard:03d}.json")
+        with checkpoint.atomic_write(manifest_path) as f:
+            json.dump(manifest, f, indent=2)
+        manifest_paths.append(manifest_path)
+
+    with checkpoint.atomic_write(os.path.join(shard_root, PLAN_FILE)) as f:
+        json.dump({"strategy": strategy, "base_folder": base_folder, "manifests": manifest_paths}, f, indent=2)
+    return manifest_paths
+
+def load_manifest(manifest_path: str) -> dict:
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def configure_shard_telemetry(manifest: dict, argv: list = ()):
+    """Names the process's telemetry after the shard and exports it under the shard's output prefix."""
+    metrics_dir = os.path.join(manifest["output_prefix"], "pipeline_metrics")
+    pipeline_telemetry.configure(f"shard_{manifest['shard']:03d}", argv=list(argv) + ["--metrics-dir", metrics_dir])
+
+def run_shard(manifest_path: str) -> dict:
+    """
+    Runs split, window (per-factor files and global count tables) and disorder
+    for the files of one manifest. Every output, the stage log and the metrics
+    go under the shard's output prefix; shard_done.json is written last. The
+    caller configures telemetry once with configure_shard_telemetry().
+    """
+    manifest = load_manifest(manifest_path)
+    prefix = manifest["output_prefix"]
+    os.makedirs(prefix, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(os.path.join(prefix, SHARD_DONE_FILE))
+
+    split = pipeline_scripts.load_script("DBD-Non-DBD-Split.py",
+                                         DBD_OUTPUT_DIR=os.path.join(prefix, "DBD-Region"),
+                                         NON_DBD_OUTPUT_DIR=os.path.join(prefix, "Non-DBD-Region"))
+    window = pipeline_scripts.load_script("DBD-Non-DBD-Window-Code.py", GLOBAL_COUNT_WORKERS=1)
+    if SHARD_WINDOW_SIZES is not None:
+        window.WINDOW_SIZES = SHARD_WINDOW_SIZES
+    disorder = pipeline_scripts.load_script("DBD-Disorder-Code.py")
+    region_dirs = {"DBD-Region": split.DBD_OUTPUT_DIR, "Non-DBD-Region": split.NON_DBD_OUTPUT_DIR}
+
+    with open(os.path.join(prefix, "shard.log"), 'w') as log, contextlib.redirect_stdout(log):
+        with pipeline_telemetry.stage("split"):
+            os.makedirs(split.DBD_OUTPUT_DIR, exist_ok=True)
+            os.makedirs(split.NON_DBD_OUTPUT_DIR, exist_ok=True)
+            for relative_path in manifest["files"]:
+                full_filepath = os.path.join(manifest["base_folder"], relative_path)
+                print(f"--- Splitting: {full_filepath} ---")
+                with pipeline_telemetry.track_file(full_filepath):
+                    split.process_file_for_splitting(full_filepath)
+
+        for job in window.JOBS:
+            input_dir = region_dirs[job["input_dir"]]
+            with pipeline_telemetry.stage(f"window_{job['input_dir']}"):
+                window.perform_window_analysis_on_directory(input_dir, os.path.join(prefix, job["output_dir"]))
+            with pipeline_telemetry.stage(f"global_{job['input_dir']}"):
+                window.perform_global_kmer_counting(input_dir, os.path.join(prefix, job["global_output_dir"]))
+
+        with pipeline_telemetry.stage("disorder"):
+            disorder_csv = os.path.join(prefix, DISORDER_CSV)
+            with checkpoint.atomic_write(disorder_csv, newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['filename', 'disorder_percentage'])
+                for filename in sorted(os.listdir(split.DBD_OUTPUT_DIR)):
+                    if filename.endswith(".txt"):
+                        full_filepath = os.path.join(split.DBD_OUTPUT_DIR, filename)
+                        with pipeline_telemetry.track_file(full_filepath):
+                            ratio = disorder.calculate_disorder_ratio(full_filepath)
+                        if ratio >= 0:
+                            writer.writerow([filename, f"{ratio * 100.0:.2f}"])
+            pipeline_telemetry.record_written(disorder_csv)
+
+    summary = pipeline_telemetry.finish()
+    done = {"shard": manifest["shard"], "files": len(manifest["files"]), "totals": summary["totals"],
+            "wall_seconds": summary["wall_seconds"], "window_sizes": list(window.WINDOW_SIZES)}
+    with checkpoint.atomic_write(os.path.join(prefix, SHARD_DONE_FILE)) as f:
+        json.dump(done, f, indent=2)
+    return done
+
+def iter_count_rows(csv_path: str):
+    """(kmer, {superclass: count}) rows of one global count table, in file (k-mer) order."""
+    with open(csv_path, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        superclasses = [column[len("superclass_"):] for column in header[2:]]
+        for row in reader:
+            yield row[0], dict(zip(superclasses, map(int, row[2:])))
+
+def merge_count_tables(csv_paths: list, output_csv: str) -> int:
+    """
+    k-way merge of k-mer-sorted global count tables, summing the counts of equal
+    k-mers per superclass. The columns are the union of all superclasses.
+    """
+    superclasses = set()
+    for csv_path in csv_paths:
+        with open(csv_path, 'r', newline='') as csvfile:
+            superclasses.update(column[len("superclass_"):] for column in next(csv.reader(csvfile))[2:])
+    superclasses = sorted(superclasses, key=superclass_sort_key)
+
+    distinct_kmers = 0
+    with checkpoint.atomic_write(output_csv, newline='') as csvfile:
+        csvfile.write(",".join(["kmer", "total"] + [f"superclass_{sc}" for sc in superclasses]) + "\n")
+        merged = heapq.merge(*(iter_count_rows(path) for path in csv_paths), key=lambda row: row[0])
+        for kmer, rows in itertools.groupby(merged, key=lambda row: row[0]):
+            totals = dict.fromkeys(superclasses, 0)
+            for _, counts in rows:
+                for superclass, count in counts.items():
+                    totals[superclass] += count
+            counts = [totals[sc] for sc in superclasses]
+            csvfile.write(f"{kmer},{sum(counts)},{','.join(map(str, counts))}\n")
+            distinct_kmers += 1
+    pipeline_telemetry.record_written(output_csv)
+    return distinct_kmers
+
+def reduce_shards(shard_root: str = SHARD_ROOT, output_dir: str = REDUCE_OUTPUT_DIR):
+    """Merges the outputs of every completed shard; fails if a shard has not finished."""
+    with open(os.path.join(shard_root, PLAN_FILE), 'r') as f:
+        plan = json.load(f)
+    manifests = [load_manifest(path) for path in plan["manifests"]]
+    missing = [m["shard"] for m in manifests if not os.path.exists(os.path.join(m["output_prefix"], SHARD_DONE_FILE))]
+    if missing:
+        raise RuntimeError(f"Shards {missing} have not completed; run them before reducing.")
+    window = pipeline_scripts.load_script("DBD-Non-DBD-Window-Code.py")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Catalogs of the per-factor files; a factor file name must come from exactly one shard.
+    region_rows = []
+    window_rows = []
+    owners = {}
+    for manifest in manifests:
+        prefix = manifest["output_prefix"]
+        for job in window.JOBS:
+            region_dir = os.path.join(prefix, job["input_dir"])
+            for filename in sorted(os.listdir(region_dir)) if os.path.isdir(region_dir) else []:
+                if not filename.endswith(".txt"):
+                    continue
+                owner = owners.setdefault((job["input_dir"], filename), manifest["shard"])
+                if owner != manifest["shard"]:
+                    raise RuntimeError(f"'{filename}' in '{job['input_dir']}' was produced by shards {owner} and {manifest['shard']}.")
+                region_rows.append([job["input_dir"], filename, manifest["shard"], os.path.join(region_dir, filename)])
+            window_root = os.path.join(prefix, job["output_dir"])
+            for window_size in sorted(os.listdir(window_root), key=int) if os.path.isdir(window_root) else []:
+                for filename in sorted(os.listdir(os.path.join(window_root, window_size))):
+                    if filename.endswith(".txt"):
+                        window_rows.append([job["output_dir"], int(window_size), filename, manifest["shard"],
+                                            os.path.join(window_root, window_size, filename)])
+
+    for catalog_name, header, rows in ((REGION_CATALOG_CSV, ['region_dir', 'filename', 'shard', 'path'], region_rows),
+                                       (WINDOW_CATALOG_CSV, ['window_output_dir', 'window_size', 'filename', 'shard', 'path'], window_rows)):
+        catalog_path = os.path.join(output_dir, catalog_name)
+        with checkpoint.atomic_write(catalog_path, newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(header)
+            writer.writerows(sorted(rows))
+        pipeline_telemetry.record_written(catalog_path)
+        print(f"--- Catalogued {len(rows)} files in '{catalog_path}' ---")
+
+    for job in window.JOBS:
+        tables = {}
+        for manifest in manifests:
+            table_dir = os.path.join(manifest["output_prefix"], job["global_output_dir"])
+            for filename in sorted(os.listdir(table_dir)) if os.path.isdir(table_dir) else []:
+                if filename.startswith("global_kmer_counts_WS") and filename.endswith(".csv"):
+                    tables.setdefault(filename, []).append(os.path.join(table_dir, filename))
+        merged_dir = os.path.join(output_dir, job["global_output_dir"])
+        os.makedirs(merged_dir, exist_ok=True)
+        for filename, paths in sorted(tables.items()):
+            with pipeline_telemetry.stage(f"merge_{job['global_output_dir']}"):
+                distinct_kmers = merge_count_tables(paths, os.path.join(merged_dir, filename))
+            print(f"--- Merged {len(paths)} shard tables into {os.path.join(merged_dir, filename)} ({distinct_kmers} distinct k-mers) ---")
+
+    disorder_rows = []
+    for manifest in manifests:
+        with open(os.path.join(manifest["output_prefix"], DISORDER_CSV), 'r', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader)
+            disorder_rows.extend(reader)
+    disorder_csv = os.path.join(output_dir, DISORDER_CSV)
+    with checkpoint.atomic_write(disorder_csv, newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['filename', 'disorder_percentage'])
+        writer.writerows(sorted(disorder_rows))
+    pipeline_telemetry.record_written(disorder_csv)
+    print(f"--- Merged {len(disorder_rows)} disorder ratios into '{disorder_csv}' ---")
+
+def run_shard_process(manifest_path: str) -> dict:
+    configure_shard_telemetry(load_manifest(manifest_path))
+    return run_shard(manifest_path)
+
+def run_local(manifest_paths: list, workers: int = LOCAL_WORKERS) -> list:
+    """Runs every shard in its own spawned process, `workers` at a time."""
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")) as executor:
+        return list(executor.map(run_shard_process, manifest_paths))
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Sharded split/window/disorder execution with a map-reduce coordinator.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    plan_parser = subparsers.add_parser("plan", help="Write one manifest per shard.")
+    shard_parser = subparsers.add_parser("run-shard", help="Run every stage for one manifest (one per node).")
+    shard_parser.add_argument("manifest")
+    subparsers.add_parser("reduce", help="Merge the outputs of all completed shards.")
+    local_parser = subparsers.add_parser("local", help="Plan, run every shard with local worker processes, and reduce.")
+    for sub in (plan_parser, local_parser):
+        sub.add_argument("--base-folder", default=BASE_FOLDER)
+        sub.add_argument("--strategy", choices=["superclass", "size"], default=SHARD_STRATEGY)
+        sub.add_argument("--shards", type=int, default=SHARD_COUNT, help="Number of shards for the 'size' strategy.")
+    local_parser.add_argument("--workers", type=int, default=LOCAL_WORKERS)
+    args = parser.parse_args(pipeline_telemetry.strip_options(sys.argv[1:]))
+
+    # One telemetry run per process: a node running a single shard reports as that shard.
+    if args.command == "run-shard":
+        configure_shard_telemetry(load_manifest(args.manifest), sys.argv[1:])
+    else:
+        pipeline_telemetry.configure("sharded_pipeline")
+
+    if args.command in ("plan", "local"):
+        with pipeline_telemetry.stage("plan"):
+            manifest_paths = plan_shards(args.base_folder, SHARD_ROOT, args.strategy, args.shards)
+        print(f"Planned {len(manifest_paths)} shards ({args.strategy}) in '{SHARD_ROOT}'.")
+
+    if args.command == "run-shard":
+        done = run_shard(args.manifest)
+        print(f"Shard {done['shard']} finished: {done['files']} raw files in {done['wall_seconds']:.1f} s.")
+
+    if args.command == "local":
+        with pipeline_telemetry.stage("map"):
+            for done in run_local(manifest_paths, args.workers):
+                print(f"--- Shard {done['shard']} finished: {done['files']} raw files in {done['wall_seconds']:.1f} s ---")
+
+    if args.command in ("reduce", "local"):
+        with pipeline_telemetry.stage("reduce"):
+            reduce_shards(SHARD_ROOT, REDUCE_OUTPUT_DIR)
+        print("\n\n" + "*" * 50)
+        print(f"Sharded run complete. Merged results are in '{REDUCE_OUTPUT_DIR}'.")
+        print("*" * 50)
+
+    pipeline_telemetry.finish()
@@ -0,0 +1,173 @@
+import os
+import bz2
+import gzip
+import lzma
+import queue
+import tarfile
+import zipfile
+import threading
+
+import checkpoint
+
+try:
+    import zstandard
+except ImportError:  # Only needed for .zst inputs.
+    zstandard = None
+
+# Streams the raw NR_HI_IU .txt files straight out of a directory, a tar/zip
+# archive or a single compressed file. Decompression runs on a background
+# thread that fills a bounded queue, so parsing overlaps decompression and
+# nothing is ever extracted to disk.
+
+MEMBER_SUFFIX: str = ".txt"
+QUEUE_DEPTH: int = 64
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz", ".tar.zst", ".tzst")
+ZIP_SUFFIXES = (".zip",)
+SINGLE_FILE_OPENERS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+    ".zst": None  # zstandard, see open_zstd
+}
+
+class RawMember:
+    """
+    One raw input file: its path inside the source, its decoded lines, its
+    compressed-side size and a fingerprint (size and modification time, or CRC)
+    that changes when the file does.
+    """
+
+    __slots__ = ("path", "lines", "size", "fingerprint")
+
+    def __init__(self, path: str, lines: list, size: int, fingerprint: str):
+        self.path = path
+        self.lines = lines
+        self.size = size
+        self.fingerprint = fingerprint
+
+def open_zstd(path: str):
+    if zstandard is None:
+        raise ImportError(f"Reading '{path}' requires the 'zstandard' package (pip install zstandard).")
+    return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+def decode_lines(data: bytes) -> list:
+    return data.decode("utf-8", errors="replace").splitlines(keepends=True)
+
+def never_skip(path: str, fingerprint: str) -> bool:
+    return False
+
+def iter_directory(source: str, skip=never_skip):
+    for dirpath, _, filenames in os.walk(source):
+        for filename in filenames:
+            if filename.endswith(MEMBER_SUFFIX):
+                full_filepath = os.path.join(dirpath, filename)
+                fingerprint = checkpoint.file_fingerprint(full_filepath)
+                if skip(full_filepath, fingerprint):
+                    continue
+                with open(full_filepath, 'rb') as f:
+                    data = f.read()
+                yield RawMember(full_filepath, decode_lines(data), len(data), fingerprint)
+
+def iter_plain_file(source: str, skip=never_skip):
+    fingerprint = checkpoint.file_fingerprint(source)
+    if skip(source, fingerprint):
+        return
+    with open(source, 'rb') as f:
+        data = f.read()
+    yield RawMember(source, decode_lines(data), len(data), fingerprint)
+
+def iter_tar(source: str, skip=never_skip):
+    if source.lower().endswith((".tar.zst", ".tzst")):
+        stream = open_zstd(source)
+        archive = tarfile.open(fileobj=stream, mode="r|")
+    else:
+        stream = None
+        archive = tarfile.open(source, mode="r|*")
+    try:
+        # Streaming mode ("r|"): members are read strictly in archive order, without seeking.
+        for member in archive:
+            if member.isfile() and member.name.endswith(MEMBER_SUFFIX):
+                member_path = member.name[2:] if member.name.startswith("./") else member.name
+                fingerprint = f"{member.size}:{member.mtime}"
+                if skip(member_path, fingerprint):
+                    continue
+                data = archive.extractfile(member).read()
+                yield RawMember(member_path, decode_lines(data), member.size, fingerprint)
+    finally:
+        archive.close()
+        if stream is not None:
+            stream.close()
+
+def iter_zip(source: str, skip=never_skip):
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            fingerprint = f"{info.file_size}:{info.CRC:08x}"
+            if not info.is_dir() and info.filename.endswith(MEMBER_SUFFIX) and not skip(info.filename, fingerprint):
+                yield RawMember(info.filename, decode_lines(archive.read(info)), info.compress_size, fingerprint)
+
+def iter_single_file(source: str, suffix: str, skip=never_skip):
+    member_path = source[:-len(suffix)]
+    fingerprint = checkpoint.file_fingerprint(source)
+    if not member_path.endswith(MEMBER_SUFFIX) or skip(member_path, fingerprint):
+        return
+    opener = SINGLE_FILE_OPENERS[suffix] or open_zstd
+    with opener(source) as f:
+        data = f.read()
+    yield RawMember(member_path, decode_lines(data), os.path.getsize(source), fingerprint)
+
+def iter_source_members(source: str, skip=never_skip):
+    """Picks the reader for `source` from its type and suffix."""
+    if os.path.isdir(source):
+        return iter_directory(source, skip)
+    lowered = source.lower()
+    if lowered.endswith(TAR_SUFFIXES):
+        return iter_tar(source, skip)
+    if lowered.endswith(ZIP_SUFFIXES):
+        return iter_zip(source, skip)
+    for suffix in SINGLE_FILE_OPENERS:
+        if lowered.endswith(suffix):
+            return iter_single_file(source, suffix, skip)
+    if lowered.endswith(MEMBER_SUFFIX):
+        return iter_plain_file(source, skip)
+    raise ValueError(f"Unsupported input '{source}': expected a directory, a tar/zip archive or a .gz/.bz2/.xz/.zst file.")
+
+def iter_raw_members(source: str, queue_depth: int = QUEUE_DEPTH, skip=never_skip):
+    """
+    Yields RawMember objects for every .txt file in `source`. Reading and
+    decompression happen on a background thread; the member paths keep the
+    superclass/class/family hierarchy of the archive (e.g. '1/1.1/1.1.1/1.1.1.1.txt').
+    Members for which `skip(path, fingerprint)` is true are passed over without being decoded.
+    """
+    members = queue.Queue(maxsize=queue_depth)
+    finished = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for member in iter_source_members(source, skip):
+                while not stop.is_set():
+                    try:
+                        members.put(member, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            members.put(finished)
+        except BaseException as e:
+            members.put(e)
+
+    reader = threading.Thread(target=produce, name="archive-reader", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = members.get()
+            if item is finished:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        reader.join(timeout=1.0)
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import contextlib
+
+# Durable progress journals for the long-running stages. A stage records every
+# finished input unit (a raw file, a (window size, factor) pair, ...) together
+# with a fingerprint of its input and the outputs it produced; with --resume the
+# units whose input is unchanged and whose outputs are still intact are skipped. Outputs are written to a temporary file and renamed into
+# place, so an interrupted run never leaves a truncated output behind.
+
+CHECKPOINT_DIR: str = "pipeline_checkpoints"
+PARTIAL_SUFFIX: str = ".partial"
+# The journal is flushed after every unit and fsync'ed every N units and on close.
+JOURNAL_SYNC_INTERVAL: int = 256
+
+@contextlib.contextmanager
+def atomic_write(path: str, mode: str = 'w', sync: bool = True, **open_kwargs):
+    """
+    Opens `path + PARTIAL_SUFFIX` for writing and renames it over `path` once the
+    block completes; on error the partial file is removed and `path` is untouched.
+    With sync=False the data is not fsync'ed before the rename: for the many small
+    per-unit outputs, whose size the journal checks on --resume, so a file left
+    empty by a crash is redone instead of trusted.
+    """
+    partial_path = path + PARTIAL_SUFFIX
+    f = open(partial_path, mode, **open_kwargs)
+    try:
+        yield f
+        if sync:
+            # The data must be on disk before the rename makes it visible, or a crash
+            # could leave `path` renamed but empty.
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        f.close()
+        with contextlib.suppress(OSError):
+            os.remove(partial_path)
+        raise
+    f.close()
+    os.replace(partial_path, path)
+
+def file_fingerprint(*paths) -> str:
+    """
+    "size:mtime_ns" of one input file; for several files, a SHA-1 over their
+    names, sizes and modification times, so adding or removing a file changes it too.
+    """
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    if len(parts) == 1:
+        return parts[0]
+    digest = hashlib.sha1()
+    for path, part in zip(paths, parts):
+        digest.update(f"{path}={part}\n".encode())
+    return digest.hexdigest()
+
+class Journal:
+    """
+    Append-only JSON-lines record of completed units. Each line holds the unit
+    key, the fingerprint of its input and the size of every output; a unit only
+    counts as done while its input has the same fingerprint and all of its
+    outputs still exist with that size.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.resume = resume
+        self.completed = {}
+        self._unsynced = 0
+        if resume and os.path.exists(path):
+            self._load()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._handle = open(path, 'a' if resume else 'w')
+        if resume:
+            print(f"Resuming from '{path}': {len(self.completed)} completed units recorded.")
+
+    def _load(self):
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from an interrupted write; that unit is redone.
+                    continue
+                self.completed[entry["unit"]] = (entry.get("input"), entry["outputs"])
+
+    def is_done(self, unit: str, fingerprint: str = None) -> bool:
+        if unit not in self.completed:
+            return False
+        recorded_fingerprint, outputs = self.completed[unit]
+        if recorded_fingerprint != fingerprint:
+            print(f"!!! Input of completed unit '{unit}' has changed; redoing it.")
+            del self.completed[unit]
+            return False
+        for output_path, size in outputs:
+            try:
+                intact = os.path.getsize(output_path) == size
+            except OSError:
+                intact = False
+            if not intact:
+                print(f"!!! Output '{output_path}' of completed unit '{unit}' is missing or changed; redoing it.")
+                del self.completed[unit]
+                return False
+        return True
+
+    def mark_done(self, unit: str, outputs=(), fingerprint: str = None):
+        entry = {"unit": unit, "input": fingerprint, "outputs": [[path, os.path.getsize(path)] for path in outputs]}
+        self.completed[unit] = (fingerprint, entry["outputs"])
+        self._handle.write(json.dumps(entry) + "\n")
+        self._handle.flush()
+        self._unsynced += 1
+        if self._unsynced >= JOURNAL_SYNC_INTERVAL:
+            os.fsync(self._handle.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        if self._handle.closed:
+            return
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+_checkpoint_dir = CHECKPOINT_DIR
+_resume = False
+
+def configure(argv: list = None) -> bool:
+    """
+    Reads the shared checkpoint options and removes them from sys.argv:
+        --resume                 skip units recorded as completed by an earlier run
+        --checkpoint-dir DIR     where journals are kept (default: pipeline_checkpoints)
+    Returns whether the run resumes.
+    """
+    global _checkpoint_dir, _resume
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    args, remaining = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if argv is None:
+        sys.argv[1:] = remaining
+
+    _checkpoint_dir = args.checkpoint_dir
+    _resume = args.resume
+    return _resume
+
+def journal(name: str) -> Journal:
+    """Opens the journal `<checkpoint dir>/<name>.journal` with the configured resume setting."""
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    return Journal(os.path.join(_checkpoint_dir, f"{safe_name}.journal"), resume=_resume)
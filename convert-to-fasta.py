@@ -1,6 +1,8 @@
 # SCRIPT: merged_excel_to_fasta.py
 import pandas as pd
 
+import pipeline_telemetry
+
 # --- CONFIGURATION ---
 # The merged Excel file you just created.
 INPUT_EXCEL_FILE: str = "Human-TFs-PDB_MERGED.xlsx"
@@ -16,6 +18,9 @@ OUTPUT_FASTA_FILE: str = "all_sequences.fasta"
 # -------------------------------------------------------------
 
 if __name__ == "__main__":
+    pipeline_telemetry.configure("convert_to_fasta")
+
+    pipeline_telemetry.begin(pipeline_telemetry.stage("convert"), pipeline_telemetry.track_file(INPUT_EXCEL_FILE))
     try:
         # Use openpyxl engine for modern .xlsx files.
         df = pd.read_excel(INPUT_EXCEL_FILE, sheet_name=SHEET_NAME, engine='openpyxl')
@@ -32,7 +37,13 @@ if __name__ == "__main__":
                     out_file.write(f"{sequence}\n")
                     file_count += 1
         
+        pipeline_telemetry.add("factors", file_count)
+        pipeline_telemetry.record_written(OUTPUT_FASTA_FILE)
         print(f"Successfully wrote {file_count} total sequences to '{OUTPUT_FASTA_FILE}'.")
 
     except Exception as e:
         print(f"!!! An unexpected error occurred: {e}")
+        pipeline_telemetry.record_error(INPUT_EXCEL_FILE, e)
+    pipeline_telemetry.end()
+
+    pipeline_telemetry.finish()
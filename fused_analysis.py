@@ -0,0 +1,273 @@
+import os
+import csv
+import collections
+
+import pipeline_telemetry
+
+# Shared single-scan reader for the split region files. Each analysis is an
+# accumulator that receives every parsed factor; the data is read exactly once
+# no matter how many accumulators are registered.
+
+REGION_DIRS = {
+    "DBD": "DBD-Region",
+    "non-DBD": "Non-DBD-Region"
+}
+FUSED_OUTPUT_DIR: str = "fused_analysis_output"
+
+POSITION_COLUMN_INDEX: int = 0
+RESIDUE_COLUMN_INDEX: int = 1
+IU_COLUMN_INDEX: int = 2
+DISORDER_CUTOFF: float = 0.5
+# The window sizes DBD-Non-DBD-Window-Code.py counts (WINDOW_SIZES there).
+FUSED_WINDOW_SIZES = range(3, 12)
+
+AMINO_ACID_ORDER_BY_DISORDER = [
+    'P', 'E', 'S', 'Q', 'K', 'A', 'G', 'D', 'T', 'R',
+    'M', 'N', 'V', 'H', 'L', 'F', 'Y', 'I', 'W', 'C'
+]
+
+class RegionFactor:
+    """One transcription factor region as parsed from a 4-column split file."""
+
+    __slots__ = ("region", "filename", "positions", "sequence", "iu_scores")
+
+    def __init__(self, region: str, filename: str, positions: list, sequence: str, iu_scores: list):
+        self.region = region
+        self.filename = filename
+        self.positions = positions
+        self.sequence = sequence
+        self.iu_scores = iu_scores
+
+    @property
+    def superclass(self) -> str:
+        """'1.2.1.1_TF_3.txt' -> '1'."""
+        return self.filename.split(".", 1)[0]
+
+    @property
+    def hierarchy(self) -> list:
+        """'1.2.1.1_TF_3.txt' -> ['1', '1.2', '1.2.1', '1.2.1.1']."""
+        levels = self.filename.split("_TF_", 1)[0].split(".")
+        return [".".join(levels[:i + 1]) for i in range(len(levels))]
+
+def parse_region_lines(lines) -> tuple:
+    """
+    Parses the residue rows (header excluded) into positions, sequence and IU
+    scores. Rows are accepted exactly like the per-analysis scripts did (a
+    residue and a numeric IU score); a position that is not an integer is
+    taken as the previous position + 1 and counted as 'unparsed_positions'.
+    """
+    positions = []
+    residues = []
+    iu_scores = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) <= IU_COLUMN_INDEX:
+            continue
+        try:
+            iu_score = float(parts[IU_COLUMN_INDEX])
+        except ValueError:
+            continue
+        try:
+            position = int(parts[POSITION_COLUMN_INDEX])
+        except ValueError:
+            position = positions[-1] + 1 if positions else 1
+            pipeline_telemetry.add("unparsed_positions")
+        positions.append(position)
+        residues.append(parts[RESIDUE_COLUMN_INDEX])
+        iu_scores.append(iu_score)
+    return positions, "".join(residues), iu_scores
+
+def read_region_file(region: str, filepath: str) -> RegionFactor:
+    with open(filepath, 'r') as f:
+        lines = f.readlines()[1:]
+    positions, sequence, iu_scores = parse_region_lines(lines)
+    return RegionFactor(region, os.path.basename(filepath), positions, sequence, iu_scores)
+
+def iter_region_factors(region_dirs: dict = None):
+    """Yields every factor of every region directory, in a stable order."""
+    region_dirs = REGION_DIRS if region_dirs is None else region_dirs
+    for region, input_dir in region_dirs.items():
+        if not os.path.isdir(input_dir):
+            print(f"Warning: Input directory '{input_dir}' not found. Skipping region '{region}'.")
+            continue
+        for filename in sorted(os.listdir(input_dir)):
+            if not filename.endswith(".txt"):
+                continue
+            filepath = os.path.join(input_dir, filename)
+            with pipeline_telemetry.track_file(filepath):
+                try:
+                    factor = read_region_file(region, filepath)
+                except Exception as e:
+                    print(f"!!! Warning: Could not process {filepath}: {e}")
+                    pipeline_telemetry.record_error(filepath, e)
+                    continue
+                pipeline_telemetry.add("factors")
+                pipeline_telemetry.add("residues", len(factor.sequence))
+                yield factor
+
+class Accumulator:
+    """Base class: `add` is called once per factor, `write` once at the end."""
+
+    name: str = "accumulator"
+
+    def add(self, factor: RegionFactor):
+        raise NotImplementedError
+
+    def write(self, output_dir: str):
+        raise NotImplementedError
+
+class DisorderRatioAccumulator(Accumulator):
+    """Per-factor fraction of residues with IU > DISORDER_CUTOFF (DBD-Disorder-Code.py)."""
+
+    name = "disorder_ratio"
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, factor: RegionFactor):
+        if not factor.iu_scores:
+            return
+        disordered = sum(1 for score in factor.iu_scores if score > DISORDER_CUTOFF)
+        self.rows.append((factor.region, factor.filename, len(factor.iu_scores), disordered))
+
+    def write(self, output_dir: str):
+        output_csv = os.path.join(output_dir, "disorder_ratios.csv")
+        with open(output_csv, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['region', 'filename', 'residues', 'disordered_residues', 'disorder_percentage'])
+            for region, filename, residues, disordered in self.rows:
+                writer.writerow([region, filename, residues, disordered, f"{disordered / residues * 100.0:.2f}"])
+        pipeline_telemetry.record_written(output_csv)
+
+class ResidueOrderAccumulator(Accumulator):
+    """
+    Per region and superclass ordered (IU < cutoff) / disordered counts of each
+    amino acid, plus the normalized disorder preference score of
+    Disorder-by-Order-Normalized.py.
+    """
+
+    name = "residue_order"
+
+    def __init__(self):
+        self.ordered = collections.defaultdict(collections.Counter)
+        self.disordered = collections.defaultdict(collections.Counter)
+
+    def add(self, factor: RegionFactor):
+        key = (factor.region, factor.superclass)
+        ordered = self.ordered[key]
+        disordered = self.disordered[key]
+        for residue, iu_score in zip(factor.sequence, factor.iu_scores):
+            if iu_score < DISORDER_CUTOFF:
+                ordered[residue] += 1
+            else:
+                disordered[residue] += 1
+
+    def write(self, output_dir: str):
+        output_csv = os.path.join(output_dir, "residue_order_counts.csv")
+        with open(output_csv, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['region', 'superclass', 'amino_acid', 'ordered', 'disordered', 'normalized_score'])
+            for key in sorted(set(self.ordered) | set(self.disordered)):
+                ordered = self.ordered[key]
+                disordered = self.disordered[key]
+                total_ordered_count = sum(ordered.values())
+                total_disordered_count = sum(disordered.values())
+                for aa in AMINO_ACID_ORDER_BY_DISORDER:
+                    Di = disordered.get(aa, 0)
+                    Oi = ordered.get(aa, 0)
+                    freq_disordered = Di / total_disordered_count if total_disordered_count > 0 else 0.0
+                    freq_ordered = Oi / total_ordered_count if total_ordered_count > 0 else 0.0
+                    denominator = freq_disordered + freq_ordered
+                    score = (freq_disordered - freq_ordered) / denominator if denominator > 0 else 0.0
+                    writer.writerow([key[0], key[1], aa, Oi, Di, f"{score:+.4f}"])
+        pipeline_telemetry.record_written(output_csv)
+
+class KmerCountAccumulator(Accumulator):
+    """Per region k-mer counts with one column per superclass, for each window size."""
+
+    name = "kmer_counts"
+
+    def __init__(self, window_sizes=None):
+        self.window_sizes = list(FUSED_WINDOW_SIZES if window_sizes is None else window_sizes)
+        self.counts = collections.defaultdict(collections.Counter)
+        self.superclasses = collections.defaultdict(set)
+
+    def add(self, factor: RegionFactor):
+        sequence = factor.sequence
+        self.superclasses[factor.region].add(factor.superclass)
+        for window_size in self.window_sizes:
+            counts = self.counts[(factor.region, window_size, factor.superclass)]
+            for i in range(len(sequence) - window_size + 1):
+                counts[sequence[i : i + window_size]] += 1
+
+    def write(self, output_dir: str):
+        for region, superclasses in sorted(self.superclasses.items()):
+            superclasses = sorted(superclasses, key=lambda sc: (len(sc), sc))
+            for window_size in self.window_sizes:
+                per_superclass = [self.counts[(region, window_size, sc)] for sc in superclasses]
+                all_kmers = sorted(set().union(*per_superclass))
+                output_csv = os.path.join(output_dir, f"{region}_kmer_counts_WS{window_size}.csv")
+                with open(output_csv, 'w', newline='') as csvfile:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(['kmer', 'total'] + [f"superclass_{sc}" for sc in superclasses])
+                    for kmer in all_kmers:
+                        counts = [c.get(kmer, 0) for c in per_superclass]
+                        writer.writerow([kmer, sum(counts)] + counts)
+                pipeline_telemetry.record_written(output_csv)
+
+class LengthAccumulator(Accumulator):
+    """Per-factor region length in residues."""
+
+    name = "lengths"
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, factor: RegionFactor):
+        self.rows.append((factor.region, factor.filename, len(factor.sequence)))
+
+    def write(self, output_dir: str):
+        output_csv = os.path.join(output_dir, "factor_lengths.csv")
+        with open(output_csv, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['region', 'filename', 'length'])
+            writer.writerows(self.rows)
+        pipeline_telemetry.record_written(output_csv)
+
+def run_fused_analysis(accumulators: list, region_dirs: dict = None) -> dict:
+    """Streams every factor once and feeds it to all registered accumulators."""
+    factors_read = 0
+    residues_read = 0
+    for factor in iter_region_factors(region_dirs):
+        for accumulator in accumulators:
+            accumulator.add(factor)
+        factors_read += 1
+        residues_read += len(factor.sequence)
+    return {"factors": factors_read, "residues": residues_read}
+
+if __name__ == "__main__":
+    pipeline_telemetry.configure("fused_analysis")
+
+    os.makedirs(FUSED_OUTPUT_DIR, exist_ok=True)
+
+    accumulators = [
+        DisorderRatioAccumulator(),
+        ResidueOrderAccumulator(),
+        KmerCountAccumulator(),
+        LengthAccumulator()
+    ]
+    print(f"Running {len(accumulators)} analyses in a single scan: {', '.join(a.name for a in accumulators)}")
+
+    with pipeline_telemetry.stage("scan"):
+        totals = run_fused_analysis(accumulators)
+    print(f"Read {totals['factors']} factors ({totals['residues']} residues) once.")
+
+    for accumulator in accumulators:
+        with pipeline_telemetry.stage(f"write_{accumulator.name}"):
+            accumulator.write(FUSED_OUTPUT_DIR)
+        print(f"--- Wrote '{accumulator.name}' results to '{FUSED_OUTPUT_DIR}' ---")
+
+    print("\n\n" + "*" * 50)
+    print("Fused analysis is complete.")
+    print("*" * 50)
+    pipeline_telemetry.finish()
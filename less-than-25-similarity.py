@@ -2,6 +2,8 @@
 import os
 import csv
 
+import pipeline_telemetry
+
 # --- CONFIGURATION ---
 # The original, unfiltered BLAST result file.
 BLAST_RESULTS_FILE: str = "similar_pairs.tsv"
@@ -12,13 +14,16 @@ SIMILARITY_THRESHOLD: float = 25.0
 # -------------------------------------------------------------------
 
 if __name__ == "__main__":
+    pipeline_telemetry.configure("blast_filter")
     
     # --- Check if the input BLAST file exists ---
     if not os.path.exists(BLAST_RESULTS_FILE):
         print(f"!!! ERROR: BLAST results file '{BLAST_RESULTS_FILE}' not found.")
         print("    Please ensure you have run the `blastp` command first.")
+        pipeline_telemetry.finish()
         exit()
 
+    pipeline_telemetry.begin(pipeline_telemetry.stage("blast_filter"), pipeline_telemetry.track_file(BLAST_RESULTS_FILE))
     print(f"Reading '{BLAST_RESULTS_FILE}' to find pairs with less than {SIMILARITY_THRESHOLD}% identity...")
     
     dissimilar_pairs_found = 0
@@ -57,8 +62,13 @@ if __name__ == "__main__":
                         # Silently skip any line that can't be parsed correctly
                         continue
         
+        pipeline_telemetry.record_written(DISSIMILAR_PAIRS_OUTPUT)
         print(f"\nSuccessfully identified and saved {dissimilar_pairs_found} unique dissimilar pairs.")
         print(f"Final results are in '{DISSIMILAR_PAIRS_OUTPUT}'.")
 
     except Exception as e:
-        print(f"!!! An unexpected error occurred: {e}")
\ No newline at end of file
+        print(f"!!! An unexpected error occurred: {e}")
+        pipeline_telemetry.record_error(BLAST_RESULTS_FILE, e)
+    pipeline_telemetry.end()
+
+    pipeline_telemetry.finish()
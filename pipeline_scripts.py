@@ -0,0 +1,35 @@
+import os
+import sys
+import importlib.util
+
+# The pipeline stages are hyphen-named scripts that configure themselves through
+# module-level constants. This loads one of them as a module (without running its
+# __main__ block) so harnesses can override those constants and call its functions.
+
+SCRIPT_DIR: str = os.path.dirname(os.path.abspath(__file__))
+
+def load_script(script_filename: str, **overrides):
+    """
+    Imports e.g. 'DBD-Non-DBD-Split.py' as module 'DBD_Non_DBD_Split' and applies
+    the given constant overrides (BASE_FOLDER="...", WINDOW_SIZES=[3], ...).
+    The module is registered in sys.modules so its functions can be used with
+    process pools.
+    """
+    module_name = os.path.splitext(script_filename)[0].replace("-", "_")
+    module = sys.modules.get(module_name)
+    if module is None:
+        script_path = os.path.join(SCRIPT_DIR, script_filename)
+        spec = importlib.util.spec_from_file_location(module_name, script_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            del sys.modules[module_name]
+            raise
+
+    for name, value in overrides.items():
+        if not hasattr(module, name):
+            raise AttributeError(f"'{script_filename}' has no setting named '{name}'.")
+        setattr(module, name, value)
+    return module
@@ -0,0 +1,296 @@
+import os
+import csv
+import sys
+import json
+import time
+import pstats
+import atexit
+import cProfile
+import argparse
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak memory is then not reported.
+    resource = None
+
+# Shared instrumentation for the pipeline scripts. A script calls configure()
+# once, wraps its work in stage() / track_file() (or begin() / end() where a
+# with-block would reindent existing code), and the functions it runs report
+# counters with add(), record_written(), record_skipped() and record_error().
+# Metrics are exported by finish(), which also runs at interpreter exit if the
+# script stops early; until configure() is called every hook is a cheap no-op,
+# so the functions stay usable on their own.
+
+METRICS_DIR: str = "pipeline_metrics"
+PROFILE_TOP_FUNCTIONS: int = 25
+COUNTERS = ["files_processed", "files_skipped", "files_errored", "files_written",
+            "bytes_read", "bytes_written", "factors", "residues"]
+FILE_FIELDS = ["stage", "path", "status", "seconds"] + COUNTERS[3:] + ["error"]
+
+def peak_memory_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class Telemetry:
+    """Per-run metrics: totals, per-stage records and a streamed per-file CSV."""
+
+    def __init__(self, pipeline: str, metrics_dir: str = METRICS_DIR, profile_stages=None,
+                 profile_top: int = PROFILE_TOP_FUNCTIONS, enabled: bool = True):
+        self.pipeline = pipeline
+        self.metrics_dir = metrics_dir
+        self.profile_stages = profile_stages
+        self.profile_top = profile_top
+        self.enabled = enabled
+        self.started = time.time()
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.stages = {}
+        self._profilers = {}
+        self._profiling_active = False
+        self._stage = None
+        self._file = None
+        self._file_writer = None
+        self._file_handle = None
+        self._summary = None
+        if enabled:
+            os.makedirs(metrics_dir, exist_ok=True)
+            self._file_handle = open(os.path.join(metrics_dir, f"{pipeline}_files.csv"), 'w', newline='')
+            self._file_writer = csv.DictWriter(self._file_handle, fieldnames=FILE_FIELDS)
+            self._file_writer.writeheader()
+
+    def add(self, counter: str, value: int = 1):
+        if not self.enabled:
+            return
+        self.totals[counter] += value
+        if self._stage is not None:
+            self._stage["counters"][counter] += value
+        if self._file is not None and counter in self._file:
+            self._file[counter] += value
+
+    def _profiling(self, name: str) -> bool:
+        if self.profile_stages is None:
+            return False
+        return not self.profile_stages or name in self.profile_stages
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Times a block of work. Repeated stages with the same name (e.g. one
+        "plot" per file) are aggregated into one record with a call count.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = {"stage": name, "calls": 0, "seconds": 0.0, "status": "ok",
+                                          "peak_memory_bytes": None, "counters": dict.fromkeys(COUNTERS, 0)}
+        outer = self._stage
+        counters_before = dict(record["counters"])
+        self._stage = record
+        # One profiler per stage name, accumulated over all calls; a stage nested
+        # in a profiled stage is already covered by the outer profiler.
+        profiler = None
+        if self._profiling(name) and not self._profiling_active:
+            profiler = self._profilers.setdefault(name, cProfile.Profile())
+            self._profiling_active = True
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        except BaseException as e:
+            record["status"] = f"error: {type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling_active = False
+            record["calls"] += 1
+            record["seconds"] = round(record["seconds"] + time.perf_counter() - start, 6)
+            record["peak_memory_bytes"] = peak_memory_bytes()
+            self._stage = outer
+            if outer is not None:
+                for counter, value in record["counters"].items():
+                    outer["counters"][counter] += value - counters_before[counter]
+
+    @contextlib.contextmanager
+    def track_file(self, path: str, size: int = None):
+        """
+        Times one input file; the file counts as read when the block is entered.
+        `size` is given for inputs that are not plain files (e.g. archive members).
+        """
+        if not self.enabled:
+            yield
+            return
+
+        record = {"stage": self._stage["stage"] if self._stage else "", "path": path, "status": "ok",
+                  "error": "", **dict.fromkeys(COUNTERS[3:], 0)}
+        self._file = record
+        start = time.perf_counter()
+        try:
+            self.add("bytes_read", os.path.getsize(path) if size is None else size)
+        except OSError:
+            pass
+        try:
+            yield
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            self.record_error(path, e)
+            raise
+        finally:
+            self._file = None
+            record["seconds"] = round(time.perf_counter() - start, 6)
+            if record["status"] == "ok":
+                self.add("files_processed")
+            self._file_writer.writerow(record)
+
+    def record_written(self, path: str):
+        if not self.enabled:
+            return
+        self.add("files_written")
+        try:
+            self.add("bytes_written", os.path.getsize(path))
+        except OSError:
+            pass
+
+    def record_skipped(self, path: str, reason: str = ""):
+        if not self.enabled:
+            return
+        self.add("files_skipped")
+        if self._file is not None:
+            self._file["status"] = "skipped"
+            self._file["error"] = reason
+
+    def record_error(self, path: str, error: BaseException):
+        if not self.enabled:
+            return
+        if self._file is not None:
+            if self._file["status"] == "error":
+                return
+            self._file["status"] = "error"
+            self._file["error"] = f"{type(error).__name__}: {error}"
+        self.add("files_errored")
+
+    def _dump_profile(self, name: str, profiler: cProfile.Profile):
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        profile_path = os.path.join(self.metrics_dir, f"{self.pipeline}_{safe_name}.prof")
+        report_path = os.path.join(self.metrics_dir, f"{self.pipeline}_{safe_name}_hot_functions.txt")
+        profiler.dump_stats(profile_path)
+        with open(report_path, 'w') as report:
+            stats = pstats.Stats(profiler, stream=report)
+            stats.sort_stats("tottime").print_stats(self.profile_top)
+        print(f"--- Profile of stage '{name}' saved to '{profile_path}', top {self.profile_top} hot functions in '{report_path}' ---")
+
+    def finish(self) -> dict:
+        """Writes <pipeline>_metrics.json and <pipeline>_stages.csv and returns the summary."""
+        if self._summary is not None:
+            return self._summary
+        summary = {
+            "pipeline": self.pipeline,
+            "started": self.started,
+            "wall_seconds": round(time.time() - self.started, 6),
+            "peak_memory_bytes": peak_memory_bytes(),
+            "totals": self.totals,
+            "stages": list(self.stages.values())
+        }
+        self._summary = summary
+        if not self.enabled:
+            return summary
+
+        self._file_handle.close()
+        for name, profiler in self._profilers.items():
+            self._dump_profile(name, profiler)
+        with open(os.path.join(self.metrics_dir, f"{self.pipeline}_metrics.json"), 'w') as f:
+            json.dump(summary, f, indent=2)
+        with open(os.path.join(self.metrics_dir, f"{self.pipeline}_stages.csv"), 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["stage", "status", "calls", "seconds", "peak_memory_bytes"] + COUNTERS)
+            for record in self.stages.values():
+                writer.writerow([record["stage"], record["status"], record["calls"], record["seconds"], record["peak_memory_bytes"]]
+                                + [record["counters"][c] for c in COUNTERS])
+
+        print(f"\nTelemetry: {summary['wall_seconds']:.1f} s, {self.totals['files_processed']} files processed, "
+              f"{self.totals['files_skipped']} skipped, {self.totals['files_errored']} errored, "
+              f"{self.totals['bytes_read']} bytes read, {self.totals['bytes_written']} bytes written. "
+              f"Metrics saved in '{self.metrics_dir}'.")
+        return summary
+
+_current = Telemetry("disabled", enabled=False)
+_open_blocks = []
+
+def _option_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--metrics-dir", default=METRICS_DIR)
+    parser.add_argument("--no-metrics", action="store_true")
+    parser.add_argument("--profile", nargs="*", default=None)
+    parser.add_argument("--profile-top", type=int, default=PROFILE_TOP_FUNCTIONS)
+    return parser
+
+def strip_options(argv: list) -> list:
+    """Returns argv without the shared telemetry options, for scripts that parse before configure()."""
+    return _option_parser().parse_known_args(argv)[1]
+
+def configure(pipeline: str, argv: list = None) -> Telemetry:
+    """
+    Reads the shared telemetry options and removes them from sys.argv, so a
+    script's own argument parser never sees them:
+        --metrics-dir DIR        where metrics are exported (default: pipeline_metrics)
+        --no-metrics             disable telemetry for this run
+        --profile [STAGE ...]    cProfile the given stages (all stages if none given)
+        --profile-top N          number of hot functions to report
+    """
+    global _current
+    args, remaining = _option_parser().parse_known_args(sys.argv[1:] if argv is None else argv)
+    if argv is None:
+        sys.argv[1:] = remaining
+
+    _current = Telemetry(pipeline, args.metrics_dir, args.profile, args.profile_top, enabled=not args.no_metrics)
+    return _current
+
+@atexit.register
+def _finish_at_exit():
+    # Scripts that exit() on an error path still export what they measured.
+    if _current.enabled:
+        finish()
+
+def current() -> Telemetry:
+    return _current
+
+def stage(name: str):
+    return _current.stage(name)
+
+def track_file(path: str, size: int = None):
+    return _current.track_file(path, size)
+
+def begin(*blocks):
+    """Enters stage() / track_file() blocks until the matching end(), without a with-block."""
+    stack = contextlib.ExitStack()
+    for block in blocks:
+        stack.enter_context(block)
+    _open_blocks.append(stack)
+
+def end():
+    if _open_blocks:
+        _open_blocks.pop().close()
+
+def add(counter: str, value: int = 1):
+    _current.add(counter, value)
+
+def record_written(path: str):
+    _current.record_written(path)
+
+def record_skipped(path: str, reason: str = ""):
+    _current.record_skipped(path, reason)
+
+def record_error(path: str, error: BaseException):
+    _current.record_error(path, error)
+
+def finish() -> dict:
+    while _open_blocks:
+        end()
+    return _current.finish()
@@ -0,0 +1,108 @@
+import os
+import random
+import argparse
+
+# Writes a synthetic NR_HI_IU tree (superclass/class/family/subfamily.txt) in the
+# raw 8-column IUPred/ANCHOR layout, so the pipeline can be exercised without
+# the real data.
+
+RAW_HEADER: str = "POS\tRES\tSCORE\tFLAG\tPOS_IU\tRES_IU\tIU\tANCHOR\n"
+AMINO_ACIDS: str = "ACDEFGHIKLMNPQRSTVWY"
+# Rough background frequencies, so k-mer statistics are not perfectly uniform.
+AMINO_ACID_WEIGHTS = [8.3, 1.4, 5.5, 6.8, 3.9, 7.1, 2.3, 5.9, 5.8, 9.7,
+                      2.4, 4.1, 4.7, 3.9, 5.4, 6.6, 5.3, 6.9, 1.1, 2.9]
+SUPERCLASSES = ["1", "2", "4", "5", "6", "7", "8", "9"]
+# Longest run of positions a POS_IU gap skips (residues missing from the IUPred output).
+MAX_GAP_LENGTH: int = 5
+
+DEFAULT_SETTINGS = {
+    "superclasses": 4,
+    "classes_per_superclass": 2,
+    "families_per_class": 2,
+    "subfamilies_per_family": 2,
+    "factors_per_file": 3,
+    "min_length": 150,
+    "max_length": 600,
+    "dbd_fraction": 0.2,
+    "gaps_per_factor": 0,
+    "seed": 0
+}
+
+def generate_factor_lines(rng: random.Random, length: int, dbd_fraction: float, gaps: int = 0) -> list:
+    """
+    One factor: POS_IU restarts at 1, and a single contiguous stretch is the DBD.
+    With gaps > 0, POS_IU jumps forward before that many residues, so it is
+    no longer contiguous within the factor but never resets.
+    """
+    dbd_length = max(1, int(length * dbd_fraction))
+    dbd_start = rng.randint(0, length - dbd_length)
+    sequence = rng.choices(AMINO_ACIDS, weights=AMINO_ACID_WEIGHTS, k=length)
+    gap_starts = set(rng.sample(range(1, length), min(gaps, length - 1))) if gaps > 0 else set()
+
+    lines = []
+    iu_score = rng.random()
+    position = 0
+    for i, residue in enumerate(sequence):
+        # A bounded random walk gives contiguous ordered and disordered stretches.
+        iu_score = min(1.0, max(0.0, iu_score + rng.uniform(-0.08, 0.08)))
+        anchor = "Yes" if dbd_start <= i < dbd_start + dbd_length else "No"
+        position += 1 + (rng.randint(1, MAX_GAP_LENGTH) if i in gap_starts else 0)
+        lines.append(f"{position}\t{residue}\t{iu_score:.4f}\t{'D' if iu_score > 0.5 else 'O'}"
+                     f"\t{position}\t{residue}\t{iu_score:.4f}\t{anchor}\n")
+    return lines
+
+def generate_dataset(output_root: str, **settings) -> dict:
+    """Writes the tree and returns file, factor and residue totals."""
+    config = dict(DEFAULT_SETTINGS, **settings)
+    rng = random.Random(config["seed"])
+    totals = {"files": 0, "factors": 0, "residues": 0, "dbd_residues": 0}
+
+    for superclass in SUPERCLASSES[:config["superclasses"]]:
+        for c in range(1, config["classes_per_superclass"] + 1):
+            class_name = f"{superclass}.{c}"
+            for fam in range(1, config["families_per_class"] + 1):
+                family_name = f"{class_name}.{fam}"
+                family_dir = os.path.join(output_root, superclass, class_name, family_name)
+                os.makedirs(family_dir, exist_ok=True)
+                for sub in range(1, config["subfamilies_per_family"] + 1):
+                    subfamily_name = f"{family_name}.{sub}"
+                    with open(os.path.join(family_dir, f"{subfamily_name}.txt"), 'w') as out_file:
+                        out_file.write(RAW_HEADER)
+                        for _ in range(config["factors_per_file"]):
+                            length = rng.randint(config["min_length"], config["max_length"])
+                            lines = generate_factor_lines(rng, length, config["dbd_fraction"], config["gaps_per_factor"])
+                            out_file.writelines(lines)
+                            totals["factors"] += 1
+                            totals["residues"] += length
+                            totals["dbd_residues"] += max(1, int(length * config["dbd_fraction"]))
+                    totals["files"] += 1
+    return totals
+
+def generate_blast_table(output_path: str, sequence_count: int, seed: int = 0) -> int:
+    """Writes an all-vs-all table in the 12-column layout of similar_pairs_filtered.tsv."""
+    rng = random.Random(seed)
+    ids = [f"{rng.randint(1, 9)}{''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=3)).lower()}_{rng.choice('ABCD')}"
+           for _ in range(sequence_count)]
+    rows = 0
+    with open(output_path, 'w') as out_file:
+        for query in ids:
+            for subject in rng.sample(ids, min(len(ids), 10)):
+                length = rng.randint(30, 300)
+                identity = 100.0 if query == subject else rng.uniform(10.0, 100.0)
+                mismatches = int(length * (100.0 - identity) / 100.0)
+                out_file.write(f"{query}\t{subject}\t{identity:.3f}\t{length}\t{mismatches}\t0\t1\t{length}"
+                               f"\t1\t{length}\t{rng.uniform(1e-60, 1e-3):.2e}\t{rng.randint(20, 400)}\n")
+                rows += 1
+    return rows
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic NR_HI_IU dataset.")
+    parser.add_argument("output_root")
+    for name, default in DEFAULT_SETTINGS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+
+    settings = {name: getattr(args, name) for name in DEFAULT_SETTINGS}
+    totals = generate_dataset(args.output_root, **settings)
+    print(f"Wrote {totals['files']} files with {totals['factors']} factors ({totals['residues']} residues) to '{args.output_root}'.")
@@ -0,0 +1,36 @@
+import os
+
+import checkpoint
+
+def write_input(path, text: str):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def test_atomic_write_leaves_no_partial_file(tmp_path):
+    output_path = str(tmp_path / "out.txt")
+    with checkpoint.atomic_write(output_path) as f:
+        f.write("done\n")
+    assert open(output_path).read() == "done\n"
+    assert not os.path.exists(output_path + checkpoint.PARTIAL_SUFFIX)
+
+def test_resume_redoes_unit_whose_input_changed(tmp_path):
+    input_path = str(tmp_path / "input.txt")
+    output_path = str(tmp_path / "output.txt")
+    journal_path = str(tmp_path / "stage.journal")
+    write_input(input_path, "ACDE\n")
+    write_input(output_path, "result\n")
+    with checkpoint.Journal(journal_path) as journal:
+        journal.mark_done("unit", [output_path], checkpoint.file_fingerprint(input_path))
+
+    with checkpoint.Journal(journal_path, resume=True) as journal:
+        assert journal.is_done("unit", checkpoint.file_fingerprint(input_path))
+
+    write_input(input_path, "ACDEFGHIK\n")
+    with checkpoint.Journal(journal_path, resume=True) as journal:
+        assert not journal.is_done("unit", checkpoint.file_fingerprint(input_path))
+
+def test_fingerprint_of_several_files_changes_when_a_file_is_added(tmp_path):
+    paths = [str(tmp_path / f"{i}.txt") for i in range(3)]
+    for path in paths:
+        write_input(path, "ACDE\n")
+    assert checkpoint.file_fingerprint(*paths[:2]) != checkpoint.file_fingerprint(*paths)
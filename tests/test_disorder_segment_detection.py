@@ -0,0 +1,37 @@
+import numpy as np
+
+import pipeline_scripts
+
+segments_script = pipeline_scripts.load_script("Disorder-Segment-Detection.py")
+
+def gapped_factor(first: range, second: range, iu_score: float = 0.9) -> tuple:
+    positions = np.array(list(first) + list(second), dtype=np.int64)
+    return positions, np.full(len(positions), iu_score), np.array([0, len(positions)], dtype=np.int64)
+
+def test_pos_iu_gap_breaks_segment():
+    # Two 15-residue disordered stretches either side of a cut-out DBD: neither reaches 20.
+    positions, iu_scores, offsets = gapped_factor(range(1, 16), range(41, 56))
+    segments = segments_script.detect_segments(iu_scores, offsets, positions, min_length=20)
+    assert len(segments["start"]) == 0
+
+def test_pos_iu_gap_reports_each_side_separately():
+    positions, iu_scores, offsets = gapped_factor(range(1, 26), range(41, 66))
+    segments = segments_script.detect_segments(iu_scores, offsets, positions, min_length=20)
+    assert positions[segments["start"]].tolist() == [1, 41]
+    assert positions[segments["end"] - 1].tolist() == [25, 65]
+
+def test_smoothing_is_clipped_at_gap():
+    # Ordered residues right after the gap must not pull down the stretch before it.
+    positions = np.array(list(range(1, 21)) + list(range(41, 61)), dtype=np.int64)
+    iu_scores = np.array([0.9] * 20 + [0.0] * 20)
+    offsets = np.array([0, 40], dtype=np.int64)
+    segments = segments_script.detect_segments(iu_scores, offsets, positions, min_length=20, window=9)
+    assert segments["start"].tolist() == [0]
+    assert segments["end"].tolist() == [20]
+
+def test_contiguous_factor_unchanged():
+    positions = np.arange(1, 31, dtype=np.int64)
+    iu_scores = np.full(30, 0.9)
+    segments = segments_script.detect_segments(iu_scores, np.array([0, 30]), positions, min_length=20)
+    assert segments["start"].tolist() == [0]
+    assert segments["end"].tolist() == [30]
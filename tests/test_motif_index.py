@@ -0,0 +1,61 @@
+import os
+import re
+import random
+from collections import Counter
+
+import numpy as np
+
+import pipeline_scripts
+
+motif_script = pipeline_scripts.load_script("Motif-Index.py")
+
+def write_region(region_dir: str, filename: str, sequence: str):
+    os.makedirs(region_dir, exist_ok=True)
+    with open(os.path.join(region_dir, filename), 'w') as f:
+        f.write("POS_IU\tRES_IU\tIU\tANCHOR\n")
+        for position, residue in enumerate(sequence, start=1):
+            f.write(f"{position}\t{residue}\t0.5000\tYes\n")
+
+def build_tiny_index(tmp_path, sequences: dict) -> dict:
+    region_dir = str(tmp_path / "DBD-Region")
+    for filename, sequence in sequences.items():
+        write_region(region_dir, filename, sequence)
+    index_dir = str(tmp_path / "index")
+    motif_script.build_index({"DBD": region_dir}, index_dir)
+    return motif_script.load_index(index_dir)
+
+def random_sequences(seed: int) -> dict:
+    rng = random.Random(seed)
+    return {f"{rng.choice('12')}.1.1.{i}_TF_1.txt": "".join(rng.choices("ACDEP", k=rng.randint(1, 12)))
+            for i in range(1, rng.randint(2, 6))}
+
+def test_suffix_array_matches_sorted_suffixes():
+    rng = random.Random(0)
+    texts = [b"P$EPSFD$I$GEKHA$"] + [bytes(rng.choices(b"ACDE$", k=rng.randint(1, 40))) for _ in range(500)]
+    for text in texts:
+        sa = motif_script.suffix_array(np.frombuffer(text, dtype=np.uint8))
+        assert sa.tolist() == sorted(range(len(text)), key=lambda i: text[i:])
+
+def test_kmer_counts_match_counter(tmp_path):
+    for seed in range(10):
+        sequences = random_sequences(seed)
+        index = build_tiny_index(tmp_path / str(seed), sequences)
+        for window_size in (1, 2, 3):
+            kmers, superclasses, counts = motif_script.kmer_counts(index, window_size, "DBD")
+            expected = {}
+            for filename, sequence in sequences.items():
+                superclass = filename.split(".", 1)[0]
+                for i in range(len(sequence) - window_size + 1):
+                    expected.setdefault(sequence[i:i + window_size], Counter())[superclass] += 1
+            assert kmers == sorted(expected)
+            for kmer, row in zip(kmers, counts.tolist()):
+                assert row == [expected[kmer][superclass] for superclass in superclasses]
+
+def test_search_motif_matches_regex(tmp_path):
+    motifs = {"A": "A", "AC": "AC", "x-D": ".D", "[CD]-x(1,2)-P": "[CD].{1,2}?P", "{A}E": "[^A]E"}
+    for seed in range(10):
+        sequences = random_sequences(seed)
+        index = build_tiny_index(tmp_path / str(seed), sequences)
+        for motif, pattern in motifs.items():
+            expected = sum(len(re.findall(f"(?=({pattern}))", sequence)) for sequence in sequences.values())
+            assert motif_script.search_motif(index, motif, max_hits=0)["count"] == expected
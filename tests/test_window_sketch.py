@@ -0,0 +1,66 @@
+import os
+import re
+import csv
+import random
+from collections import Counter
+
+import pipeline_scripts
+
+window_script = pipeline_scripts.load_script("DBD-Non-DBD-Window-Code.py")
+
+def write_region(region_dir: str, filename: str, sequence: str):
+    os.makedirs(region_dir, exist_ok=True)
+    with open(os.path.join(region_dir, filename), 'w') as f:
+        f.write("POS_IU\tRES_IU\tIU\tANCHOR\n")
+        for position, residue in enumerate(sequence, start=1):
+            f.write(f"{position}\t{residue}\t0.5000\tYes\n")
+
+def random_region(region_dir: str, seed: int) -> Counter:
+    """Writes skewed random factors and returns their exact 3-mer counts."""
+    rng = random.Random(seed)
+    exact = Counter()
+    for i in range(1, 9):
+        sequence = "".join(rng.choices("ACDEFGPS", weights=[16, 8, 6, 4, 3, 2, 1, 1], k=rng.randint(100, 400)))
+        write_region(region_dir, f"{1 + i % 2}.1.1.{i}_TF_1.txt", sequence)
+        exact.update(sequence[j : j + 3] for j in range(len(sequence) - 2))
+    return exact
+
+def run_sketch(tmp_path, monkeypatch, budget_bytes: int) -> tuple:
+    region_dir = str(tmp_path / "DBD-Region")
+    exact = random_region(region_dir, seed=0)
+    output_dir = str(tmp_path / "sketches")
+    monkeypatch.setattr(window_script, "WINDOW_SIZES", [3])
+    monkeypatch.setattr(window_script, "SKETCH_HLL_PRECISION", 4)
+    monkeypatch.setattr(window_script, "SKETCH_MEMORY_BUDGET_BYTES", budget_bytes)
+    window_script.perform_sketch_analysis_on_directory(region_dir, output_dir)
+
+    with open(os.path.join(output_dir, "sketch_heavy_hitters_WS3.csv"), newline='') as f:
+        rows = list(csv.DictReader(f))
+    with open(os.path.join(output_dir, "sketch_report_WS3.txt")) as f:
+        admission = int(re.search(r"Every k-mer occurring at least (\d+) times", f.read()).group(1))
+    return exact, rows, admission
+
+def test_prune_keeps_at_most_keep_entries():
+    pruned, admission = window_script.prune_heavy_hitters({1: 9, 2: 7, 3: 7, 4: 4, 5: 3}, 2)
+    assert pruned == {1: 9}
+    assert admission == 8
+
+def test_heavy_hitters_match_exact_counts(tmp_path, monkeypatch):
+    exact, rows, admission = run_sketch(tmp_path, monkeypatch, budget_bytes=4 * 1024 * 1024)
+    assert admission == window_script.MINIMUM_OCCURRENCE_COUNT
+    assert {row["kmer"] for row in rows} == {kmer for kmer, count in exact.items() if count >= admission}
+    for row in rows:
+        overcount = int(row["estimated_count"]) - exact[row["kmer"]]
+        assert 0 <= overcount <= float(row["max_overcount"])
+
+def test_every_kmer_above_raised_threshold_is_listed(tmp_path, monkeypatch):
+    # 20000 bytes leaves room for 15 heavy hitters, far fewer than the frequent 3-mers.
+    exact, rows, admission = run_sketch(tmp_path, monkeypatch, budget_bytes=20000)
+    assert admission > window_script.MINIMUM_OCCURRENCE_COUNT
+    assert len(rows) <= 15
+    listed = {row["kmer"] for row in rows}
+    for kmer, count in exact.items():
+        if count >= admission:
+            assert kmer in listed
+    for row in rows:
+        assert int(row["estimated_count"]) >= exact[row["kmer"]]